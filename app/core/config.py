@@ -34,6 +34,76 @@ class Settings(BaseSettings):
     ONEC_BASE_URL: str = Field(..., env="ONEC_BASE_URL")
     LOG_ONEC_RAW: bool = Field(default=False, env="LOG_ONEC_RAW")
 
+    # Пул HTTP-соединений к внешним сервисам (общий на время жизни приложения)
+    HTTP_TIMEOUT: float = 30.0
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    MOYSKLAD_HTTP2: bool = False  # требует пакет h2 (httpx[http2])
+    # Лимит МойСклад — 45 запросов за 3 секунды на аккаунт
+    MOYSKLAD_RATE_LIMIT_PER_SEC: float = 15.0
+    MOYSKLAD_RATE_LIMIT_BURST: float = 5.0
+
+    # Повторы HTTP-вызовов (BaseApiClient): полный джиттер, сроки и общий бюджет повторов
+    HTTP_RETRY_ATTEMPTS: int = 4
+    HTTP_RETRY_BASE_DELAY: float = 0.5
+    HTTP_RETRY_MAX_DELAY: float = 10.0
+    HTTP_CALL_DEADLINE: float = 60.0  # секунд на один вызов со всеми повторами
+    HTTP_RUN_DEADLINE: float = 600.0  # секунд на все вызовы одного запуска пополнения / outbox-тика
+    HTTP_RETRY_BUDGET_RATIO: float = 0.2  # повторов на запрос в среднем
+    HTTP_RETRY_BUDGET_MIN_PER_SEC: float = 0.5
+    HTTP_RETRY_BUDGET_CAP: float = 20.0
+
+    # Повторное использование сеансов HTTP-сервиса 1С (IBSession); нужен reuseSessions в default.vrd
+    ONEC_SESSION_REUSE: bool = False
+    ONEC_SESSION_POOL_SIZE: int = 8  # сеансов (и лицензий) на базу; ограничивает параллельные запросы
+    ONEC_SESSION_MAX_IDLE: float = 15.0  # секунд; меньше sessionMaxAge веб-сервера (по умолчанию 20)
+
+    # Адаптивный (AIMD) лимит одновременных запросов к 1С
+    ONEC_ADAPTIVE_CONCURRENCY: bool = True
+    # Не меньше REPLENISH_CONCURRENCY / ONEC_STOCK_FALLBACK_CONCURRENCY, иначе лимит урежет их до разгона
+    ONEC_CONCURRENCY_INITIAL: int = 8
+    ONEC_CONCURRENCY_MIN: int = 1
+    ONEC_CONCURRENCY_MAX: int = 16
+    ONEC_CONCURRENCY_LATENCY_TARGET: float = 10.0  # секунд; ответ дольше — сигнал перегрузки
+
+    # Объединение одинаковых одновременных GET к одному upstream в один запрос
+    HTTP_COALESCE_GETS: bool = True
+
+    # Кэш ответов 1С (дефицит, остатки) с TTL, LRU по объему и условным GET (ETag / Last-Modified)
+    ONEC_RESPONSE_CACHE: bool = False
+    ONEC_RESPONSE_CACHE_TTL: float = 60.0  # секунд, в течение которых ответ отдается без запроса к 1С
+    ONEC_RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # по размеру тел ответов на базу
+
+    # Выключатель (circuit breaker) на upstream и маршрут
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # сбоев подряд до размыкания
+    CIRCUIT_RESET_TIMEOUT: float = 30.0  # секунд до пробного вызова
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = 1
+
+    # Потоковый разбор больших ответов 1С /deficit
+    ONEC_STREAM_DEFICIT: bool = False
+
+    # Нормализация ответов 1С вне event loop: на месте / пул потоков / пул процессов
+    ONEC_NORMALIZE_INLINE_MAX_BYTES: int = 64 * 1024
+    ONEC_NORMALIZE_PROCESS_MIN_BYTES: int = 8 * 1024 * 1024
+    ONEC_NORMALIZE_THREADS: int = 2
+    ONEC_NORMALIZE_PROCESSES: int = 2  # 0 — без пула процессов, крупные ответы тоже в потоках
+    ONEC_NORMALIZE_CHUNK_MIN_ITEMS: int = 5000
+
+    # Теневое сравнение нормализатора /deficit на живых ответах 1С
+    ONEC_SHADOW_NORMALIZER: str = ""  # tolerant|fast|stream|batch; пусто — выключено
+    ONEC_SHADOW_SAMPLE_RATE: float = 0.01
+    ONEC_SHADOW_MAX_PENDING: int = 1  # сравнений в очереди; лишние выборки пропускаются
+    ONEC_SHADOW_DIFF_EXAMPLES: int = 10
+
+    # Пакетные запросы остатков в 1С
+    ONEC_STOCK_BATCH_SIZE: int = 500
+    ONEC_STOCK_FALLBACK_CONCURRENCY: int = 8
+    REPLENISH_CONCURRENCY: int = 8  # одновременных запросов к 1С при опросе доноров
+    REPLENISH_ENQUEUE_BATCH_SIZE: int = 500  # строк pending_transfers/outbox_events в одной транзакции
+    MIN_DEFICIT: int = 1  # минимальный дефицит, который проходит фильтр пополнения
+
     MOYSKLAD_API_TOKEN: str
     MOYSKLAD_ORG_UUID: str
     MOYSKLAD_AGENT_UUID: str
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+# Нижняя граница паузы между снижениями лимита, если сглаженная задержка меньше
+_MIN_DECREASE_INTERVAL = 0.1
+
+
+class Slot:
+    """Место в лимитере на одну попытку запроса; `overloaded` выставляет вызывающий код."""
+
+    __slots__ = ("started", "saturated", "overloaded")
+
+    def __init__(self, saturated: bool):
+        self.started = time.monotonic()
+        self.saturated = saturated
+        self.overloaded: bool | None = None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD-лимит одновременных запросов к upstream.
+
+    Пока ответы быстрые (не дольше `latency_target`) и без ошибок, лимит растет
+    аддитивно — на `increase` за «окно» из `limit` успешных ответов, и только когда
+    лимит действительно выбирается. Таймаут, сетевая ошибка, 5xx или ответ дольше
+    цели умножают лимит на `decrease_factor`; следующее снижение возможно не раньше
+    чем через сглаженную задержку, чтобы одна волна сбоев не обнулила лимит.
+    Ожидающие получают места в порядке очереди.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int, latency_target: float,
+                 increase: float = 1.0, decrease_factor: float = 0.5):
+        self.name = name
+        self.min_limit = max(1, minimum)
+        self.max_limit = max(self.min_limit, maximum)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.latency_ewma: float | None = None
+        self.last_latency: float | None = None
+        self.increases = 0
+        self.decreases = 0
+        self.overloads = 0
+        self._last_decrease = float("-inf")
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def _grant(self):
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    async def _acquire(self):
+        with self._lock:
+            if self.in_flight < self.current_limit and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.done() and not waiter.cancelled():
+                    # Место уже выдано — возвращаем его следующему
+                    self.in_flight -= 1
+                    self._grant()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        await self._acquire()
+        slot = Slot(saturated=self.in_flight >= self.current_limit)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    def _release(self, slot: Slot):
+        latency = time.monotonic() - slot.started
+        with self._lock:
+            self.in_flight -= 1
+            if slot.overloaded is not None:
+                self._feedback(latency, slot.overloaded, slot.saturated)
+            self._grant()
+
+    def _feedback(self, latency: float, overloaded: bool, saturated: bool):
+        self.last_latency = latency
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        now = time.monotonic()
+        if overloaded or latency > self.latency_target:
+            self.overloads += 1
+            if now - self._last_decrease < max(self.latency_ewma, _MIN_DECREASE_INTERVAL):
+                return
+            previous = self.current_limit
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+            self._last_decrease = now
+            self.decreases += 1
+            log.warning("%s concurrency limit %d -> %d (%s, latency %.0f ms)", self.name, previous,
+                        self.current_limit, "error" if overloaded else "slow", latency * 1000)
+        elif saturated and self.limit < self.max_limit:
+            previous = self.current_limit
+            self.limit = min(float(self.max_limit), self.limit + self.increase / self.limit)
+            if self.current_limit > previous:
+                self.increases += 1
+                log.info("%s concurrency limit %d -> %d", self.name, previous, self.current_limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.current_limit,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "latency_target_ms": round(self.latency_target * 1000, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "overloads": self.overloads,
+        }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _settings_for(name: str) -> Dict[str, Any]:
+    if name == "onec":
+        return {
+            "initial": settings.ONEC_CONCURRENCY_INITIAL,
+            "minimum": settings.ONEC_CONCURRENCY_MIN,
+            "maximum": settings.ONEC_CONCURRENCY_MAX,
+            "latency_target": settings.ONEC_CONCURRENCY_LATENCY_TARGET,
+        }
+    raise KeyError(f"Unknown concurrency limiter {name!r}")
+
+
+def concurrency_limiter(name: str) -> AdaptiveConcurrencyLimiter:
+    """Адаптивный лимит upstream `name`, общий для всех клиентов процесса."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AdaptiveConcurrencyLimiter(name, **_settings_for(name))
+        return limiter
+
+
+def concurrency_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+def reset_concurrency_limiters():
+    with _limiters_lock:
+        _limiters.clear()
@@ -4,83 +4,267 @@ import httpx
 import logging
 import os
 import time
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
 
+from app.core.config import settings
 from app.core.logging import _redact
-
-
-def is_retryable_exception(exception: BaseException) -> bool:
-    """Определяет, является ли исключение основанием для повторной попытки."""
-    if isinstance(exception, (httpx.ConnectError, httpx.TimeoutException, httpx.ReadTimeout)):
-        return True
-    if isinstance(exception, httpx.HTTPStatusError):
-        # Повторяем только при серверных ошибках (5xx)
-        return 500 <= exception.response.status_code < 600
-    return False
+from app.services.logger_service import log_event
+from .adaptive_limit import concurrency_limiter
+from .circuit_breaker import CircuitBreaker, OPEN, circuit_breaker, route_of
+from .rate_limit import rate_limiter, retry_after_seconds
+from .singleflight import flights
+from .retry import (
+    DeadlineExceeded,
+    RetryPolicy,
+    is_retryable_exception,
+    is_retryable_status,
+    retry_budget,
+    run_deadline_var,
+)
 
 
 LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
 LOG_BODY_MAX = int(os.getenv("LOG_BODY_MAX", "2000"))
 
 class BaseApiClient:
-    def __init__(self, base_url: str):
-        self.client = httpx.AsyncClient(base_url=base_url, timeout=30.0)
+    # Система для integration_logs (переходы выключателя)
+    EXTERNAL_SYSTEM = "HTTP"
+    # Имя общего лимитера запросов (app.integrations.rate_limit) или None — без лимита
+    RATE_LIMITER: str | None = None
+    # Имя адаптивного лимита одновременных запросов (app.integrations.adaptive_limit) или None
+    CONCURRENCY_LIMITER: str | None = None
+
+    def __init__(self, base_url: str, client: httpx.AsyncClient | None = None):
+        # Общий клиент из реестра (app.integrations.http_pool) не закрываем в close():
+        # его пулом соединений владеет приложение
+        self._owns_client = client is None
+        # Ключ общего бюджета повторов и выключателей: все клиенты одного upstream делят их
+        self._upstream = base_url
+        self.client = client or httpx.AsyncClient(base_url=base_url, timeout=30.0)
         self._logger = logging.getLogger("http")
 
     def _maybe_hash(self, body: str) -> str:
         return hashlib.sha256(body.encode("utf-8", "ignore")).hexdigest()[:16]
 
-    async def _request_with_retry(self, method: str, url: str, tries: int = 5, **kwargs):
-        """Internal method with retry logic and detailed logging."""
+    def _attempt_timeout(self, remaining: float) -> float | None:
+        """Таймаут попытки: остаток срока, если он короче настроенного таймаута клиента."""
+        configured = getattr(self.client, "timeout", None)
+        if not isinstance(configured, httpx.Timeout):
+            return None
+        read = configured.read
+        return remaining if read is None or remaining < read else None
+
+    async def _send(self, method: str, url: str, *, tries: int | None = None, deadline: float | None = None,
+                    route: str | None = None, stream: bool = False, log_body: bool = False, raise_for_status: bool = False,
+                    **kwargs) -> httpx.Response:
+        """
+        Единый цикл повторов для всех вызовов клиента.
+
+        Повторяет сетевые ошибки, таймауты и ответы 5xx: не больше `tries` попыток
+        (по умолчанию HTTP_RETRY_ATTEMPTS), с полным джиттером между ними, в пределах
+        срока вызова `deadline` (секунд, по умолчанию HTTP_CALL_DEADLINE) и срока
+        запуска из run_deadline(). Каждый повтор тратит жетон общего бюджета повторов
+        upstream; пустой бюджет означает отказ без повтора. Ответ 5xx после последней
+        попытки возвращается вызывающему (или поднимается при raise_for_status=True).
+        При stream=True тело не читается — закрыть ответ должен вызывающий (см. _stream).
+
+        Перед каждой попыткой проверяется выключатель upstream и маршрута `route`
+        (по умолчанию — шаблон пути URL): пока он разомкнут, вызов сразу завершается
+        CircuitOpenError, а сбой, разомкнувший цепь, больше не повторяется.
+
+        Клиенты с RATE_LIMITER берут жетон общего лимитера перед каждой попыткой;
+        заголовки лимита в ответах подстраивают его, а на 429 повтор ждет Retry-After.
+        Клиенты с CONCURRENCY_LIMITER держат место адаптивного лимита на время
+        попытки (для stream — до получения заголовков ответа) и сообщают ему задержку
+        и перегрузку (таймаут, сетевая ошибка, 5xx).
+        """
+        breaker = None
+        if settings.CIRCUIT_BREAKER_ENABLED:
+            breaker = circuit_breaker(self._upstream, route or route_of(url))
+        limiter = rate_limiter(self.RATE_LIMITER) if self.RATE_LIMITER else None
+        concurrency = None
+        if self.CONCURRENCY_LIMITER and settings.ONEC_ADAPTIVE_CONCURRENCY:
+            concurrency = concurrency_limiter(self.CONCURRENCY_LIMITER)
+        policy = RetryPolicy.from_settings()
+        tries = policy.attempts if tries is None else max(1, tries)
+        until = policy.deadline(deadline)
+        budget = retry_budget(self._upstream)
+        budget.on_request()
         t0 = time.perf_counter()
-        last_exc = None
+        req_body = kwargs.get("content") or kwargs.get("data") or (kwargs.get("json") and str(kwargs["json"])) or ""
+        headers = _redact(dict(kwargs.get("headers") or {}))
 
-        for attempt in range(1, tries + 1):
-            try:
-                # Log request details
-                req_body = kwargs.get("content") or kwargs.get("data") or (kwargs.get("json") and str(kwargs["json"])) or ""
-                headers = _redact(dict(kwargs.get("headers") or {}))
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                exc = DeadlineExceeded(f"deadline exceeded before attempt {attempt} of {method} {url}")
+                self._fail(method, url, attempt - 1, t0, exc)
+                raise exc
+            if breaker is not None:
+                await self._circuit_transition(breaker, breaker.before_call())
+            if limiter is not None:
+                try:
+                    await limiter.acquire(until)
+                except TimeoutError:
+                    if breaker is not None:
+                        breaker.release()
+                    exc = DeadlineExceeded(f"rate limit wait exceeds deadline of {method} {url}")
+                    self._fail(method, url, attempt - 1, t0, exc)
+                    raise exc
+                remaining = until - time.monotonic()
+            timeout = self._attempt_timeout(remaining)
+            request_kwargs = {**kwargs, "timeout": timeout} if timeout is not None else kwargs
 
-                self._logger.debug("HTTP %s %s (attempt %d)", method, url, attempt,
-                                 extra={"extra": {"method": method, "url": url, "attempt": attempt,
+            self._logger.debug("HTTP %s %s (attempt %d)", method, url, attempt,
+                               extra={"extra": {"method": method, "url": url, "attempt": attempt,
                                                 "headers": headers, "body_preview": str(req_body)[:LOG_BODY_MAX]}})
+            try:
+                response, error = await self._attempt(method, url, stream, concurrency, request_kwargs)
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
 
-                response: httpx.Response = await self.client.request(method, url, **kwargs)
-                dt = round((time.perf_counter() - t0) * 1000)
+            dt = round((time.perf_counter() - t0) * 1000)
+            if response is not None:
+                self._log_response(method, url, response, dt, log_body and not stream)
+                retryable = is_retryable_status(response.status_code)
+                if limiter is not None:
+                    limiter.observe(response)
+            else:
+                retryable = is_retryable_exception(error)
+            if breaker is not None:
+                # 429 — upstream жив, просто ограничивает нас: выключатель не трогаем
+                if retryable and (response is None or response.status_code != 429):
+                    await self._circuit_transition(breaker, breaker.on_failure())
+                elif response is not None:
+                    await self._circuit_transition(breaker, breaker.on_success())
+                else:
+                    breaker.release()
 
-                # Log response details
-                body_text = response.text or ""
-                body_hash = self._maybe_hash(body_text)
+            if retryable and attempt < tries and (breaker is None or breaker.state != OPEN):
+                delay = policy.backoff(attempt)
+                if response is not None and response.status_code in (429, 503):
+                    asked = retry_after_seconds(response)
+                    if asked is not None:
+                        delay = asked
+                if time.monotonic() + delay < until and budget.try_spend():
+                    if response is not None and stream:
+                        await response.aclose()
+                    self._logger.debug("HTTP retry %s %s in %.2fs", method, url, delay)
+                    await asyncio.sleep(delay)
+                    continue
 
-                if LOG_SAMPLE_RATE >= 1.0:
-                    body_preview = body_text[:LOG_BODY_MAX]
-                else:
-                    body_preview = f"[sampled hash:{body_hash}]"
-
-                self._logger.info("HTTP %s %s -> %d in %dms", method, url, response.status_code, dt,
-                                extra={"extra": {"method": method, "url": url, "status_code": response.status_code,
-                                               "elapsed_ms": dt, "response_preview": body_preview,
-                                               "response_hash": body_hash}})
-
-                response.raise_for_status()
-                return self._parse_response(response)
-
-            except httpx.HTTPError as e:
-                last_exc = e
-                if attempt >= tries or not is_retryable_exception(e):
-                    dt = round((time.perf_counter() - t0) * 1000)
-                    self._logger.error("HTTP FAIL %s %s after %d tries: %s", method, url, attempt, repr(e),
-                                     extra={"extra": {"method": method, "url": url, "elapsed_ms": dt,
-                                                    "attempts": attempt}}, exc_info=True)
+            if error is not None:
+                self._fail(method, url, attempt, t0, error)
+                raise error
+            if raise_for_status:
+                try:
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    self._fail(method, url, attempt, t0, e)
                     raise
+            return response
+
+    async def _attempt(self, method: str, url: str, stream: bool, concurrency, request_kwargs: dict
+                       ) -> tuple[httpx.Response | None, httpx.HTTPError | None]:
+        """Одна попытка запроса; сетевые ошибки возвращаются, а не поднимаются."""
+        if concurrency is None:
+            return await self._issue(method, url, stream, request_kwargs)
+        async with concurrency.slot() as slot:
+            response, error = await self._issue(method, url, stream, request_kwargs)
+            if response is not None:
+                slot.overloaded = 500 <= response.status_code < 600
+            else:
+                slot.overloaded = isinstance(error, (httpx.TimeoutException, httpx.NetworkError))
+            return response, error
+
+    async def _issue(self, method: str, url: str, stream: bool, request_kwargs: dict
+                     ) -> tuple[httpx.Response | None, httpx.HTTPError | None]:
+        try:
+            if stream:
+                request = self.client.build_request(method, url, **request_kwargs)
+                return await self.client.send(request, stream=True), None
+            return await self.client.request(method, url, **request_kwargs), None
+        except httpx.HTTPError as e:
+            return None, e
+
+    async def _circuit_transition(self, breaker: CircuitBreaker, transition: tuple[str, str] | None):
+        """Пишет переход выключателя в лог и integration_logs."""
+        if transition is None:
+            return
+        previous, state = transition
+        details = {"upstream": breaker.upstream, "route": breaker.route, "from": previous,
+                   "failures": breaker.failures}
+        self._logger.warning("HTTP circuit %s %s: %s -> %s", breaker.upstream, breaker.route, previous, state,
+                             extra={"extra": details})
+        try:
+            await log_event(step="http.circuit", status=state, external_system=self.EXTERNAL_SYSTEM, details=details)
+        except Exception:
+            self._logger.warning("Failed to write circuit transition to integration_logs", exc_info=True)
+
+    def _log_response(self, method: str, url: str, response: httpx.Response, dt: int, log_body: bool):
+        extra = {"method": method, "url": url, "status_code": response.status_code, "elapsed_ms": dt}
+        if log_body:
+            body_text = response.text or ""
+            body_hash = self._maybe_hash(body_text)
+            if LOG_SAMPLE_RATE >= 1.0:
+                body_preview = body_text[:LOG_BODY_MAX]
+            else:
+                body_preview = f"[sampled hash:{body_hash}]"
+            extra.update(response_preview=body_preview, response_hash=body_hash)
+        self._logger.info("HTTP %s %s -> %d in %dms", method, url, response.status_code, dt,
+                          extra={"extra": extra})
+
+    def _fail(self, method: str, url: str, attempts: int, t0: float, exc: BaseException):
+        dt = round((time.perf_counter() - t0) * 1000)
+        self._logger.error("HTTP FAIL %s %s after %d tries: %s", method, url, attempts, repr(exc),
+                           extra={"extra": {"method": method, "url": url, "elapsed_ms": dt,
+                                            "attempts": attempts}}, exc_info=True)
+
+    @asynccontextmanager
+    async def _stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Потоковый ответ с теми же повторами, что и _send (до начала чтения тела)."""
+        response = await self._send(method, url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def _request_with_retry(self, method: str, url: str, tries: int | None = None, **kwargs):
+        """
+        Запрос с повторами, подробным логированием и разбором JSON-ответа.
+        Одинаковые одновременные GET разделяют один запрос (см. _coalesce).
+        """
+        async def call():
+            response = await self._send(method, url, tries=tries, log_body=True, raise_for_status=True, **kwargs)
+            return self._parse_response(response)
 
-                # Wait before retry
-                wait_time = min(2 ** (attempt - 1), 60)
-                self._logger.debug("HTTP retry %s %s in %ds", method, url, wait_time)
-                await asyncio.sleep(wait_time)
+        if method.upper() != "GET":
+            return await call()
+        return await self._coalesce(f"GET {url} {sorted(kwargs.items())!r}", call)
 
-        # Should not reach here, but just in case
-        raise last_exc
+    async def _coalesce(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Идемпотентное чтение `key` этого upstream: одновременные вызовы с тем же ключом
+        (из любых экземпляров клиента) ждут один запрос и получают один разобранный
+        результат (каждый — свою копию). Кэша между запросами нет. Общий запрос не
+        наследует срок run_deadline() первого вызывающего; каждый ждет его не дольше
+        своего срока. Отключается HTTP_COALESCE_GETS=false.
+        """
+        if not settings.HTTP_COALESCE_GETS:
+            return await fn()
+        flight = flights.do((self._upstream, key), fn)
+        deadline = run_deadline_var.get()
+        if deadline is None:
+            return await flight
+        try:
+            return await asyncio.wait_for(flight, max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            raise DeadlineExceeded(f"run deadline exceeded while waiting for {key}") from None
 
     def _parse_response(self, response: httpx.Response):
         """Parse HTTP response with safe JSON handling."""
@@ -100,15 +284,11 @@ class BaseApiClient:
         # Нежданный тип содержимого — возвращаем пустой словарь для безопасности
         return {}
 
-    @retry(
-        wait=wait_exponential(multiplier=1, min=2, max=60),
-        stop=stop_after_attempt(5),
-        retry=retry_if_exception(is_retryable_exception),
-    )
     async def _request(self, method: str, url: str, **kwargs):
         """Legacy method for backward compatibility - delegates to new logging method."""
-        tries = kwargs.pop("tries", 5)
+        tries = kwargs.pop("tries", None)
         return await self._request_with_retry(method, url, tries=tries, **kwargs)
 
     async def close(self):
-        await self.client.aclose()
+        if self._owns_client:
+            await self.client.aclose()
@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from app.core.config import settings
+from .onec_json_normalizer import IntegrationError
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+# Сегменты пути, похожие на идентификаторы (UUID, числа, коды с цифрами), сворачиваются в {id},
+# чтобы stock/{wh}/{pid} по тысячам товаров делил один выключатель
+_ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[\w.:-]+$")
+
+
+class CircuitOpenError(IntegrationError):
+    """Вызов отклонен без запроса: выключатель upstream/маршрута разомкнут."""
+
+    def __init__(self, upstream: str, route: str, retry_in: float):
+        self.upstream = upstream
+        self.route = route
+        self.retry_in = retry_in
+        super().__init__(f"Circuit open for {upstream} {route}, retry in {retry_in:.1f}s")
+
+
+def route_of(url: str) -> str:
+    """Шаблон маршрута по URL запроса: без query и с {id} вместо идентификаторов."""
+    path = str(url).split("?", 1)[0].strip("/")
+    return "/".join("{id}" if _ID_SEGMENT_RE.match(seg) else seg for seg in path.split("/"))
+
+
+class CircuitBreaker:
+    """
+    Выключатель одного маршрута upstream.
+
+    CLOSED: запросы идут, подряд идущие сбои (сеть, таймаут, 5xx) считаются; после
+    CIRCUIT_FAILURE_THRESHOLD — OPEN. OPEN: вызовы сразу отклоняются CircuitOpenError
+    в течение CIRCUIT_RESET_TIMEOUT. HALF_OPEN: пропускается не больше
+    CIRCUIT_HALF_OPEN_MAX_CALLS пробных вызовов; успех замыкает цепь, сбой снова
+    размыкает ее на тот же срок. Ответы 4xx — признак живого upstream, не сбой.
+    """
+
+    def __init__(self, upstream: str, route: str, failure_threshold: int, reset_timeout: float,
+                 half_open_max_calls: int):
+        self.upstream = upstream
+        self.route = route
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _set(self, state: str) -> Tuple[str, str] | None:
+        if state == self.state:
+            return None
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != CLOSED:
+            self.probes = 0
+        else:
+            self.failures = 0
+        return previous, state
+
+    def before_call(self) -> Tuple[str, str] | None:
+        """Пропускает вызов или поднимает CircuitOpenError; возвращает переход состояния, если он был."""
+        with self._lock:
+            transition = None
+            if self.state == OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.upstream, self.route, self.reset_timeout - elapsed)
+                transition = self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.upstream, self.route, 0.0)
+                self.probes += 1
+            return transition
+
+    def on_success(self) -> Tuple[str, str] | None:
+        with self._lock:
+            self.failures = 0
+            return self._set(CLOSED)
+
+    def on_failure(self) -> Tuple[str, str] | None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                transition = self._set(OPEN)
+                # Повторный сбой пробы продлевает срок размыкания
+                self.opened_at = time.monotonic()
+                return transition
+            return None
+
+    def release(self):
+        """Вызов прерван без результата (отмена): освобождает место пробы."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(upstream: str, route: str) -> CircuitBreaker:
+    """Выключатель маршрута `route` upstream `upstream` (общий для всех клиентов процесса)."""
+    key = (upstream, route)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(
+                upstream, route,
+                failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+                half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+            )
+        return breaker
+
+
+def circuit_stats() -> Dict[str, Dict[str, Any]]:
+    return {f"{upstream} {route}": breaker.stats() for (upstream, route), breaker in _breakers.items()}
+
+
+def reset_circuits():
+    with _breakers_lock:
+        _breakers.clear()
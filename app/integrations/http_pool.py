@@ -0,0 +1,151 @@
+import logging
+import time
+from typing import Any, Dict
+
+import httpx
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("http.pool")
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_limits() -> httpx.Limits:
+    """Лимиты пула соединений из настроек приложения."""
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _pool_usage(client: httpx.AsyncClient) -> Dict[str, Any]:
+    """
+    Занятость пула соединений клиента. httpx не дает публичного API для этого, поэтому
+    данные читаются из внутренностей транспорта httpcore; если в другой версии их нет
+    или они устроены иначе, поля равны None, а /health/http продолжает работать.
+    """
+    usage: Dict[str, Any] = {"connections": None, "idle_connections": None,
+                             "active_connections": None, "queued_requests": None}
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return usage
+    try:
+        connections = list(getattr(pool, "connections", None) or [])
+        idle = 0
+        for connection in connections:
+            is_idle = getattr(connection, "is_idle", False)
+            if bool(is_idle() if callable(is_idle) else is_idle):
+                idle += 1
+        usage.update(connections=len(connections), idle_connections=idle,
+                     active_connections=len(connections) - idle)
+    except Exception:
+        logger.debug("HTTP pool connections are not available", exc_info=True)
+    try:
+        queued = getattr(pool, "_requests", None)
+        if queued is not None:
+            usage["queued_requests"] = len(queued)
+    except Exception:
+        logger.debug("HTTP pool queue is not available", exc_info=True)
+    return usage
+
+
+class HttpClientRegistry:
+    """
+    Реестр общих httpx.AsyncClient на время жизни приложения.
+
+    Для каждого внешнего сервиса (1С, МойСклад) держится один keep-alive пул,
+    поэтому outbox-тик и запуск пополнения не платят за TCP/TLS-рукопожатие
+    и повторное открытие сеанса 1С. Реестр открывается в startup и закрывается
+    в shutdown FastAPI; вне приложения (скрипты, тесты) клиенты создают
+    собственные соединения как раньше.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._open = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def open(self):
+        self._open = True
+        logger.info("HTTP client registry opened", extra={"extra": {
+            "max_connections": settings.HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": settings.HTTP_KEEPALIVE_EXPIRY,
+        }})
+
+    def get(self, name: str, *, base_url: str, auth: Any = None,
+            headers: Dict[str, str] | None = None, http2: bool = False) -> httpx.AsyncClient:
+        """Возвращает общий клиент для upstream `name`, создавая его при первом обращении."""
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed:
+            return client
+
+        if http2 and not _h2_available():
+            logger.warning("HTTP/2 requested for %s but 'h2' is not installed, falling back to HTTP/1.1", name)
+            http2 = False
+
+        stats = {"requests": 0, "responses": 0, "server_errors": 0,
+                 "http2": http2, "created_at": time.time()}
+        self._stats[name] = stats
+
+        async def on_request(request: httpx.Request):
+            stats["requests"] += 1
+
+        async def on_response(response: httpx.Response):
+            stats["responses"] += 1
+            if response.status_code >= 500:
+                stats["server_errors"] += 1
+
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=auth,
+            headers=headers,
+            timeout=settings.HTTP_TIMEOUT,
+            limits=build_limits(),
+            http2=http2,
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+        self._clients[name] = client
+        logger.info("HTTP pool created for %s", name, extra={"extra": {"upstream": name, "base_url": base_url, "http2": http2}})
+        return client
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Статистика использования пулов: счетчики запросов реестра (надежны при любой
+        версии httpx) и, где доступно, занятые и простаивающие соединения.
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        for name, client in self._clients.items():
+            data = dict(self._stats.get(name, {}))
+            data.update(_pool_usage(client))
+            data["closed"] = client.is_closed
+            out[name] = data
+        return out
+
+    async def aclose(self):
+        for name, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Failed to close HTTP pool %s: %s", name, e)
+        self._clients.clear()
+        self._stats.clear()
+        self._open = False
+        logger.info("HTTP client registry closed")
+
+
+# Единый реестр приложения; открывается/закрывается в app.main
+http_clients = HttpClientRegistry()
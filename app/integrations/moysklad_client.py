@@ -1,16 +1,27 @@
 from .base_client import BaseApiClient
+from .http_pool import http_clients
 from app.core.config import settings
 from app.schemas.moy_sklad import CustomerOrderPayload, CustomerOrderResponse
 
 
 class MoySkladApiClient(BaseApiClient):
     BASE_API_URL = "https://api.moysklad.ru/api/remap/1.2/"
+    EXTERNAL_SYSTEM = "MOYSKLAD"
+    # Лимит запросов МойСклад считается на аккаунт: один лимитер на все экземпляры клиента
+    RATE_LIMITER = "moysklad"
 
     def __init__(self):
-        super().__init__(base_url=self.BASE_API_URL)
+        headers = {
+            "Authorization": f"Bearer {settings.MOYSKLAD_API_TOKEN}",
+            "Accept-Encoding": "gzip",
+        }
+        shared = None
+        if http_clients.is_open:
+            shared = http_clients.get("moysklad", base_url=self.BASE_API_URL,
+                                      headers=headers, http2=settings.MOYSKLAD_HTTP2)
+        super().__init__(base_url=self.BASE_API_URL, client=shared)
         # Устанавливаем заголовок авторизации для всех запросов
-        self.client.headers["Authorization"] = f"Bearer {settings.MOYSKLAD_API_TOKEN}"
-        self.client.headers["Accept-Encoding"] = "gzip"
+        self.client.headers.update(headers)
 
     async def get_stock_by_product_id(self, product_id_ms: str) -> float:
         """
@@ -1,49 +1,308 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List
+
+import httpx
 
 from .base_client import BaseApiClient
-from .onec_json_normalizer import normalize_deficit_payload, normalize_stock
+from .http_pool import http_clients
+from .onec_json_normalizer import normalize_stock_map
+from .onec_offload import normalization_executor
+from .onec_session import SESSION_COOKIE, SessionBoundStream, exclude_session_cookie, session_pool
+from .onec_shadow import shadow_normalizer
+from .onec_shape_cache import normalize_stock_learned
+from .onec_stream_parser import aiter_deficit_payload
+from .response_cache import response_cache
 from app.core.config import settings
 
 
+log = logging.getLogger(__name__)
+
+# HTTP-статусы, по которым считаем, что в сервисе 1С нет пакетного маршрута остатков
+_BULK_UNSUPPORTED_STATUSES = {404, 405, 501}
+# Ответы веб-сервера 1С на запрос с истекшим или неизвестным сеансом ibsession
+_SESSION_LOST_STATUSES = {400, 401}
+
+
 class OneSApiClient(BaseApiClient):
+    EXTERNAL_SYSTEM = "ONEC"
+    # Каждый запрос держит сеанс и лицензию 1С: параллелизм подбирается по задержке и ошибкам
+    CONCURRENCY_LIMITER = "onec"
+
+    # Базы 1С, где пакетный маршрут stock/{wh}/bulk отсутствует (запоминаем на время процесса)
+    _bulk_stock_unsupported: set[str] = set()
+    # Базы 1С, где нет выгрузки полного остатка склада stock/{wh}
+    _warehouse_stock_unsupported: set[str] = set()
+
     def __init__(self):
         # Базовый URL теперь ведет к нашему кастомному сервису
         base_url = f"{settings.API_1C_URL.rstrip('/')}/hs/integrationapi/"
-        super().__init__(base_url=base_url)
-        self.client.auth = (settings.API_1C_USER, settings.API_1C_PASSWORD)
+        auth = (settings.API_1C_USER, settings.API_1C_PASSWORD)
+        shared = None
+        if http_clients.is_open:
+            # Общий keep-alive пул: соединение и сеанс 1С переживают отдельные запуски
+            shared = http_clients.get("onec", base_url=base_url, auth=auth)
+        super().__init__(base_url=base_url, client=shared)
+        self.client.auth = auth
+        self._sessions = session_pool(base_url)
+        self._cache = response_cache(base_url)
+
+    async def _issue(self, method: str, url: str, stream: bool, request_kwargs: dict):
+        """
+        Попытка запроса в сеансе 1С из пула (ONEC_SESSION_REUSE): новый сеанс
+        открывается заголовком "IBSession: start", живой передается cookie ibsession.
+        Если веб-сервер не узнал сеанс (истек, перезапуск), запрос один раз прозрачно
+        повторяется в новом сеансе. Потоковый ответ держит сеанс, пока не будет закрыт:
+        тело еще читается в этом сеансе, и отдавать его другому запросу нельзя.
+        """
+        if not settings.ONEC_SESSION_REUSE:
+            return await super()._issue(method, url, stream, request_kwargs)
+        exclude_session_cookie(self.client)
+        session = await self._sessions.acquire()
+        keep = False
+        try:
+            for renew in (False, True):
+                headers = dict(request_kwargs.get("headers") or {})
+                if session.id is None:
+                    headers["IBSession"] = "start"
+                else:
+                    headers["Cookie"] = f"{SESSION_COOKIE}={session.id}"
+                started = session.id is None
+                response, error = await super()._issue(method, url, stream, {**request_kwargs, "headers": headers})
+                if response is None:
+                    return response, error
+                if not started and not renew and response.status_code in _SESSION_LOST_STATUSES:
+                    # Сеанс потерян на стороне 1С — повторяем в новом
+                    if stream:
+                        await response.aclose()
+                    session.id = None
+                    self._sessions.renewed += 1
+                    continue
+                session_id = response.cookies.get(SESSION_COOKIE)
+                if session_id and session_id != session.id:
+                    session.bind(session_id)
+                    self._sessions.started += 1
+                elif not started:
+                    self._sessions.reused += 1
+                session.requests += 1
+                keep = response.status_code < 500
+                if stream:
+                    response.stream = SessionBoundStream(response.stream, self._sessions, session, keep)
+                    session = None
+                return response, error
+        finally:
+            if session is not None:
+                self._sessions.release(session, keep)
+
+    async def finish_sessions(self):
+        """Завершает свободные сеансы пула ("IBSession: finish") и освобождает их лицензии."""
+        for session in self._sessions.drain_idle():
+            try:
+                await self.client.request("GET", "", headers={
+                    "IBSession": "finish", "Cookie": f"{SESSION_COOKIE}={session.id}",
+                })
+            except httpx.HTTPError:
+                log.warning("Failed to finish 1C session", exc_info=True)
+
+    async def _cached_get(self, key: tuple, url: str, route: str,
+                          parse: Callable[[httpx.Response], Awaitable[Any]], raise_for_status: bool = False) -> Any:
+        """
+        GET с разбором ответа `parse` через кэш ответов (ONEC_RESPONSE_CACHE).
+
+        Свежая запись отдается без запроса к 1С. Устаревшая перепроверяется условным
+        GET с ETag / Last-Modified, которые 1С прислала вместе с ней: на 304 запись
+        продлевается и отдается без повторной выгрузки и нормализации. Кэшируются только
+        ответы 200. Одновременные промахи по одному URL разделяют один запрос.
+        """
+        cache = self._cache if settings.ONEC_RESPONSE_CACHE else None
+        if cache is not None:
+            entry = cache.lookup(key)
+            if entry is not None and cache.is_fresh(entry):
+                cache.record(key, "hit")
+                return entry.copy()
+        return await self._coalesce(url, lambda: self._fetch_cached(cache, key, url, route, parse, raise_for_status))
+
+    async def _fetch_cached(self, cache, key: tuple, url: str, route: str,
+                            parse: Callable[[httpx.Response], Awaitable[Any]], raise_for_status: bool) -> Any:
+        entry = cache.lookup(key) if cache is not None else None
+        headers = entry.conditional_headers() if entry is not None else {}
+        kwargs = {"headers": headers} if headers else {}
+        # 304 — не ошибка условного GET: статус разбирает parse, а не _send
+        response = await self._send("GET", url, route=route, raise_for_status=raise_for_status and not headers, **kwargs)
+        if headers and response.status_code == 304:
+            cache.refresh(key)
+            cache.record(key, "revalidated")
+            return entry.copy()
+
+        value = await parse(response)
+        if cache is not None:
+            cache.record(key, "miss")
+            if response.status_code == 200:
+                cache.put(key, value, len(response.content),
+                          response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return value
 
     async def get_deficit_products(self, warehouse_id: str) -> List[Dict[str, Any]]:
         """
         Получает список дефицитных товаров через кастомный эндпоинт.
         Теперь принимает любые форматы ответов от 1С (JSON, XDTO, text) и нормализует их.
+        Одновременные вызовы по одному складу (плановый запуск, ручной триггер) разделяют
+        один запрос и один нормализованный список; при ONEC_RESPONSE_CACHE повторные
+        запуски в пределах TTL получают список из кэша.
         """
         url = f"deficit/{warehouse_id}"
-        response = await self.client.request("GET", url)
+        if settings.ONEC_STREAM_DEFICIT:
+            # Потоковый режим: в памяти только итоговый список, без промежуточных деревьев.
+            # Не кэшируется — режим нужен как раз тогда, когда список не стоит держать в памяти
+            return await self._coalesce(url, lambda: self._collect_deficit_products(warehouse_id))
+        return await self._cached_get(("deficit/{wh}", warehouse_id), url, "deficit/{wh}",
+                                      self._parse_deficit_products, raise_for_status=True)
+
+    async def _collect_deficit_products(self, warehouse_id: str) -> List[Dict[str, Any]]:
+        return [item async for item in self.iter_deficit_products(warehouse_id)]
+
+    async def _parse_deficit_products(self, response: httpx.Response) -> List[Dict[str, Any]]:
         response.raise_for_status()
 
         # Debug logging if detailed logging is enabled
         # Note: Actual debug logging is handled in the service layer where logger is available
 
-        # Используем нормализатор для обработки разных форматов ответов 1С
-        normalized_data = normalize_deficit_payload(response.text)
-
+        # Используем нормализатор для обработки разных форматов ответов 1С;
+        # форма ответа маршрута запоминается, большие ответы разбираются в пуле
+        # потоков/процессов, не блокируя event loop
+        started = time.perf_counter()
+        normalized_data = await normalization_executor.normalize_deficit(response.text, "deficit/{wh}")
+        # Теневое сравнение с нормализатором-кандидатом на доле ответов (в фоне)
+        shadow_normalizer.maybe_submit(response.text, normalized_data, time.perf_counter() - started, "deficit/{wh}")
 
         return normalized_data
 
+    async def iter_deficit_products(self, warehouse_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоково читает ответ deficit/{warehouse_id} (aiter_bytes) и отдает канонические
+        элементы по одному. Пиковая память не зависит от числа товаров в ответе.
+        """
+        url = f"deficit/{warehouse_id}"
+        async with self._stream("GET", url, route="deficit/{wh}") as response:
+            if response.is_error:
+                await response.aread()
+            response.raise_for_status()
+            async for item in aiter_deficit_payload(response.aiter_bytes()):
+                yield item
+
     async def get_stock_for_product(self, product_id: str, warehouse_id: str) -> float:
         """
         Получает остаток товара через кастомный эндпоинт.
         Теперь принимает любые форматы ответов от 1С (JSON, XDTO, text) и нормализует их.
         """
         url = f"stock/{warehouse_id}/{product_id}"
-        response = await self.client.request("GET", url)
+        return await self._cached_get(("stock/{wh}/{pid}", warehouse_id, product_id), url, "stock/{wh}/{pid}",
+                                      self._parse_stock_for_product, raise_for_status=True)
+
+    async def _parse_stock_for_product(self, response: httpx.Response) -> float:
         response.raise_for_status()
 
         # Debug logging if detailed logging is enabled
         # Note: Actual debug logging is handled in the service layer where logger is available
 
         # Используем нормализатор для обработки разных форматов ответов 1С
-        return normalize_stock(response.text)
+        return normalize_stock_learned(response.text, "stock/{wh}/{pid}")
+
+    async def get_warehouse_stock(self, warehouse_id: str) -> Dict[str, float] | None:
+        """
+        Получает полный снимок остатков склада: {product_id: остаток}.
+        Возвращает None, если в сервисе 1С нет маршрута stock/{warehouse_id} (404/405/501) —
+        тогда вызывающий код переходит на get_stocks_bulk по нужному списку товаров.
+        """
+        if str(self.client.base_url) in self._warehouse_stock_unsupported:
+            return None
+        return await self._cached_get(("stock/{wh}", warehouse_id), f"stock/{warehouse_id}", "stock/{wh}",
+                                      self._parse_warehouse_stock)
+
+    async def _parse_warehouse_stock(self, response: httpx.Response) -> Dict[str, float] | None:
+        if response.status_code in _BULK_UNSUPPORTED_STATUSES:
+            self._warehouse_stock_unsupported.add(str(self.client.base_url))
+            log.warning("1C warehouse stock snapshot route is not available",
+                        extra={"extra": {"url": str(response.request.url), "status_code": response.status_code}})
+            return None
+        response.raise_for_status()
+        return normalize_stock_map(response.text)
+
+    async def get_stocks_bulk(self, warehouse_id: str, product_ids: Iterable[str],
+                              semaphore: asyncio.Semaphore | None = None) -> Dict[str, float]:
+        """
+        Получает остатки набора товаров на складе пакетными запросами.
+
+        Отправляет POST stock/{warehouse_id}/bulk с телом {"products": [...]} порциями
+        по ONEC_STOCK_BATCH_SIZE и возвращает {product_id: остаток}. Товары, которых
+        нет в ответе, считаются с нулевым остатком. Если в сервисе 1С нет пакетного
+        маршрута (404/405/501), прозрачно переходит на поштучные вызовы
+        get_stock_for_product.
+
+        Число одновременных запросов ограничивает `semaphore`; вызывающий код может
+        передать общий семафор, чтобы держать единый лимит на несколько складов.
+        По умолчанию — ONEC_STOCK_FALLBACK_CONCURRENCY.
+        """
+        ids = list(dict.fromkeys(str(pid) for pid in product_ids if pid))
+        if not ids:
+            return {}
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(settings.ONEC_STOCK_FALLBACK_CONCURRENCY, 1))
+
+        base_url = str(self.client.base_url)
+        if base_url not in self._bulk_stock_unsupported:
+            batch_size = max(settings.ONEC_STOCK_BATCH_SIZE, 1)
+            chunks = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+            try:
+                # Первая порция — отдельно: так отсутствие маршрута выясняется до веерной рассылки
+                first = await self._post_stock_chunk(warehouse_id, chunks[0], semaphore)
+                rest = await asyncio.gather(
+                    *(self._post_stock_chunk(warehouse_id, chunk, semaphore) for chunk in chunks[1:])
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in _BULK_UNSUPPORTED_STATUSES:
+                    raise
+                self._bulk_stock_unsupported.add(base_url)
+                log.warning("1C bulk stock route is not available, falling back to per-item calls",
+                            extra={"extra": {"warehouse_id": warehouse_id, "status_code": e.response.status_code}})
+            else:
+                result: Dict[str, float] = {}
+                for chunk, stocks in zip(chunks, [first, *rest]):
+                    for pid in chunk:
+                        result[pid] = stocks.get(pid, 0.0)
+                return result
+
+        return await self._get_stocks_per_item(warehouse_id, ids, semaphore)
+
+    async def _post_stock_chunk(self, warehouse_id: str, chunk: List[str],
+                                semaphore: asyncio.Semaphore) -> Dict[str, float]:
+        async with semaphore:
+            response = await self._send("POST", f"stock/{warehouse_id}/bulk", route="stock/{wh}/bulk",
+                                        json={"products": chunk})
+        response.raise_for_status()
+        return normalize_stock_map(response.text)
+
+    async def _get_stocks_per_item(self, warehouse_id: str, product_ids: List[str],
+                                   semaphore: asyncio.Semaphore) -> Dict[str, float]:
+        """Поштучный запрос остатков с ограничением числа одновременных запросов к 1С."""
+        async def fetch(pid: str):
+            async with semaphore:
+                return await self.get_stock_for_product(pid, warehouse_id)
+
+        results = await asyncio.gather(*(fetch(pid) for pid in product_ids), return_exceptions=True)
+
+        stocks: Dict[str, float] = {}
+        failed = 0
+        for pid, res in zip(product_ids, results):
+            if isinstance(res, BaseException):
+                failed += 1
+                continue
+            stocks[pid] = res
+        if failed:
+            log.warning("Failed to fetch stock for some products",
+                        extra={"extra": {"warehouse_id": warehouse_id, "failed": failed, "total": len(product_ids)}})
+        return stocks
 
     async def create_transfer_order(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
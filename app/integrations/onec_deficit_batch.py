@@ -0,0 +1,140 @@
+# app/integrations/onec_deficit_batch.py
+# Columnar container for normalized /deficit items: ids/names/skus as lists, numeric fields
+# as array('d') (NaN = field absent). Row access goes through light __slots__ views that
+# behave like the canonical dicts, so code written for List[Dict] keeps working.
+
+import math
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+_NUMERIC_FIELDS = ("min_stock", "max_stock", "current_stock", "deficit")
+_NAN = float("nan")
+
+
+class DeficitRow(Mapping):
+    """Read-only view of one batch row with the keys of a canonical /deficit item."""
+
+    __slots__ = ("_batch", "_idx")
+
+    def __init__(self, batch: "DeficitBatch", idx: int):
+        self._batch = batch
+        self._idx = idx
+
+    def __getitem__(self, key: str) -> Any:
+        b, i = self._batch, self._idx
+        if key == "id":
+            return b.ids[i]
+        if key == "name":
+            return b.names[i]
+        if key == "sku":
+            v = b.skus[i]
+        elif key in _NUMERIC_FIELDS:
+            v = getattr(b, key)[i]
+            if math.isnan(v):
+                v = None
+        else:
+            raise KeyError(key)
+        if v is None:
+            raise KeyError(key)
+        return v
+
+    def __iter__(self) -> Iterator[str]:
+        b, i = self._batch, self._idx
+        yield "id"
+        yield "name"
+        if b.skus[i] is not None:
+            yield "sku"
+        for field in _NUMERIC_FIELDS:
+            if not math.isnan(getattr(b, field)[i]):
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: self[k] for k in self}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class DeficitBatch:
+    """
+    Нормализованный дефицит в колоночном виде.
+
+    Строка стоит ~60 байт (4 float64 + 3 ссылки) против ~260 байт у словаря
+    с его float-объектами; строки ID и наименований те же объекты, что и в словарях.
+    Отсутствующее числовое поле хранится как NaN.
+    """
+
+    __slots__ = ("ids", "names", "skus", "min_stock", "max_stock", "current_stock", "deficit")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.skus: List[str | None] = []
+        self.min_stock = array("d")
+        self.max_stock = array("d")
+        self.current_stock = array("d")
+        self.deficit = array("d")
+
+    @classmethod
+    def from_items(cls, items: Iterable[Mapping]) -> "DeficitBatch":
+        """Собирает пакет из канонических элементов (список или генератор — например, потоковый разбор)."""
+        batch = cls()
+        for item in items:
+            batch.append(item)
+        return batch
+
+    def append(self, item: Mapping):
+        get = item.get
+        self.ids.append(get("id"))
+        self.names.append(get("name"))
+        self.skus.append(get("sku"))
+        for field in _NUMERIC_FIELDS:
+            v = get(field)
+            getattr(self, field).append(_NAN if v is None else v)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, idx: int) -> DeficitRow:
+        n = len(self.ids)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("DeficitBatch index out of range")
+        return DeficitRow(self, idx)
+
+    def __iter__(self) -> Iterator[DeficitRow]:
+        for i in range(len(self.ids)):
+            yield DeficitRow(self, i)
+
+    def take(self, indices: Sequence[int]) -> "DeficitBatch":
+        """Новый пакет из строк с указанными индексами (в их порядке)."""
+        out = DeficitBatch()
+        ids, names, skus = self.ids, self.names, self.skus
+        out.ids = [ids[i] for i in indices]
+        out.names = [names[i] for i in indices]
+        out.skus = [skus[i] for i in indices]
+        for field in _NUMERIC_FIELDS:
+            col = getattr(self, field)
+            setattr(out, field, array("d", [col[i] for i in indices]))
+        return out
+
+    def to_dicts(self, start: int = 0, stop: int | None = None) -> List[Dict[str, Any]]:
+        """Строки [start:stop] как обычные словари — для выборок в логах и JSON."""
+        stop = len(self.ids) if stop is None else min(stop, len(self.ids))
+        return [DeficitRow(self, i).to_dict() for i in range(start, stop)]
+
+    def as_numpy(self, field: str):
+        """Числовая колонка как numpy.ndarray без копирования (NaN — поле отсутствует)."""
+        import numpy as np
+
+        return np.frombuffer(getattr(self, field), dtype=np.float64)
+
+    def nbytes(self) -> int:
+        """Объем колонок без учета самих строк ID/наименований."""
+        pointers = 8 * (len(self.ids) + len(self.names) + len(self.skus))
+        return pointers + sum(getattr(self, f).itemsize * len(getattr(self, f)) for f in _NUMERIC_FIELDS)
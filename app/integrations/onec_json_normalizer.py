@@ -1,15 +1,18 @@
 # app/integrations/onec_json_normalizer.py
 # Tolerant parser for 1C responses (plain JSON, XDTO JSON, string arrays, key=value text).
 # Guarantees id/name in normalize_deficit_payload (with surrogate id if needed).
-# No external deps.
+# JSON decoding uses orjson/msgspec when installed (ONEC_JSON_BACKEND), stdlib json otherwise.
 
 import hashlib
 import json
 import logging
 import os
 import re
+import sys
 from decimal import Decimal
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
+
+from .onec_deficit_batch import DeficitBatch
 
 log = logging.getLogger(__name__)
 
@@ -27,20 +30,64 @@ _UUID_RE = re.compile(
     r"[0-9a-fA-F]{12}"
 )
 
-def _try_json(s: str):
+_MISSING = object()  # "not JSON" marker, distinct from a decoded null
+
+def _select_json_backend() -> Tuple[str, Callable[[str], Any]]:
+    """Pick (name, loads) by ONEC_JSON_BACKEND=auto|orjson|msgspec|json."""
+    wanted = os.getenv("ONEC_JSON_BACKEND", "auto").lower()
+    if wanted in ("auto", "orjson"):
+        try:
+            import orjson
+            return "orjson", orjson.loads
+        except ImportError:
+            if wanted == "orjson":
+                log.warning("ONEC_JSON_BACKEND=orjson but 'orjson' is not installed, trying fallbacks")
+    if wanted in ("auto", "orjson", "msgspec"):
+        try:
+            import msgspec
+            return "msgspec", msgspec.json.decode
+        except ImportError:
+            if wanted == "msgspec":
+                log.warning("ONEC_JSON_BACKEND=msgspec but 'msgspec' is not installed, using stdlib json")
+    return "json", json.loads
+
+JSON_BACKEND, _fast_loads = _select_json_backend()
+
+# 19+ digits may not fit in 64 bits; orjson < 3.9 silently decodes such integers as float
+_WIDE_NUMBER_RE = re.compile(r"\d{19}")
+
+def _loads(s: str) -> Any:
+    """
+    Decode JSON with the selected backend. Stdlib json decodes what fast backends reject
+    (NaN/Infinity) and bodies with 19+ digit runs, so wide integers stay exact ints.
+    """
+    if JSON_BACKEND != "json" and not _WIDE_NUMBER_RE.search(s):
+        try:
+            return _fast_loads(s)
+        except Exception:
+            pass
+    return json.loads(s)
+
+def _loads_tolerant(s: str, loads: Callable[[str], Any] | None = None) -> Any:
+    """Like _try_json, but returns _MISSING for non-JSON so a decoded null is not parsed twice."""
     s = s.strip()
     if not s:
-        return None
+        return _MISSING
+    loads = loads or _loads
     try:
-        return json.loads(s)
+        return loads(s)
     except Exception:
         # Sometimes JSON is double-quoted: "\"{...}\""
         if (s[0] in "\"'" and s[-1] == s[0]):
             try:
-                return json.loads(s[1:-1])
+                return loads(s[1:-1])
             except Exception:
-                return None
-        return None
+                return _MISSING
+        return _MISSING
+
+def _try_json(s: str):
+    obj = _loads_tolerant(s)
+    return None if obj is _MISSING else obj
 
 def _parse_kv_string(s: str) -> Dict[str, Any]:
     """
@@ -53,7 +100,7 @@ def _parse_kv_string(s: str) -> Dict[str, Any]:
         k, v = m.group(1), m.group(2).strip()
         if v.startswith('"') and v.endswith('"'):
             try:
-                v = json.loads(v)
+                v = _loads(v)
             except Exception:
                 v = v[1:-1]
         else:
@@ -71,11 +118,15 @@ def _unwrap_xdto(node: Any) -> Any:
         if "name" in node and "Value" in node:
             key = _unwrap_xdto(node["name"])
             return {str(key): _unwrap_xdto(node["Value"])}
-        return {k: _unwrap_xdto(v) for k, v in node.items()}
+        # Flat object with scalar values is already plain — return as is, no copy
+        for v in node.values():
+            if isinstance(v, (dict, list)):
+                return {k: _unwrap_xdto(v) for k, v in node.items()}
+        return node
     if isinstance(node, list):
         items = [_unwrap_xdto(x) for x in node]
         # Merge list of single-key dicts into one dict (typical for XDTO)
-        if all(isinstance(x, dict) and len(x) == 1 for x in items):
+        if items and all(isinstance(x, dict) and len(x) == 1 for x in items):
             merged: Dict[str, Any] = {}
             for d in items:
                 for k, v in d.items():
@@ -98,17 +149,17 @@ def parse_1c_response(text: str) -> Any:
         if len(lines) > 1:
             return [_try_json(ln) or _parse_kv_string(ln) for ln in lines]
         return _parse_kv_string(text)
+    return _resolve_decoded(obj)
 
-    obj = _unwrap_xdto(obj)
+def _resolve_decoded(obj: Any) -> Any:
+    """Second half of parse_1c_response for an already decoded (non-null) JSON value."""
+    # Double-encoded JSON: the body is a JSON string holding another JSON document
+    if isinstance(obj, str):
+        nested = _try_json(obj)
+        if nested is not None:
+            obj = nested
 
-    # Some gateways return arrays as dict {"0":..., "1":...}
-    if isinstance(obj, dict) and obj and all(isinstance(k, str) and k.isdigit() for k in obj.keys()):
-        try:
-            return [obj[str(i)] for i in range(len(obj))]
-        except Exception:
-            pass
-
-    return obj
+    return _numeric_keys_to_list(_unwrap_xdto(obj))
 
 def _coerce_num(v: Any) -> float | None:
     try:
@@ -122,42 +173,81 @@ def _coerce_num(v: Any) -> float | None:
         return None
     return None
 
-def _first_uuid_from_value(v: Any) -> str | None:
-    """Try to extract UUID from arbitrary value."""
-    if v is None:
-        return None
-    if isinstance(v, (int, float)):
-        return None
-    # If dict, look for common keys
-    if isinstance(v, dict):
-        for key in ("id","productID","uuid","uid","guid","ref","reference","УникальныйИдентификатор","Ссылка","Номенклатура"):
-            if key in v:
-                u = _first_uuid_from_value(v[key])
-                if u:
-                    return u
-        # Scan all values
-        for vv in v.values():
-            u = _first_uuid_from_value(vv)
-            if u:
-                return u
-        return None
-    # If list, scan
-    if isinstance(v, list):
-        for vv in v:
-            u = _first_uuid_from_value(vv)
-            if u:
-                return u
-        return None
-    # str or other printable
-    s = str(v)
-    m = _UUID_RE.search(s)
-    return m.group(0) if m else None
+_UUID_PRIORITY_KEYS = ("id","productID","uuid","uid","guid","ref","reference","УникальныйИдентификатор","Ссылка","Номенклатура")
+_UUID_PRIORITY_SET = frozenset(_UUID_PRIORITY_KEYS)
+_UUID_SCAN_MAX_DEPTH = 8
+_UUID_LEN = 36
+
+def _uuid_children(node: Dict[str, Any] | List[Any]):
+    """Children in scan order: for dicts the priority keys first, then the remaining values."""
+    if isinstance(node, list):
+        return iter(node)
+    if node.keys().isdisjoint(_UUID_PRIORITY_SET):
+        return iter(node.values())
+    children = [node[k] for k in _UUID_PRIORITY_KEYS if k in node]
+    children.extend(vv for k, vv in node.items() if k not in _UUID_PRIORITY_SET)
+    return iter(children)
+
+def _first_uuid_from_value(v: Any, max_depth: int | None = None) -> str | None:
+    """
+    Try to extract UUID from arbitrary value.
+    Iterative depth-first scan (same order as a recursive walk, priority keys first);
+    containers deeper than max_depth are not expanded. By default the depth is bounded
+    only under the blake2b surrogate scheme: legacy keeps the unbounded scan, so items
+    with a deeply nested UUID do not get a surrogate id instead.
+    """
+    if max_depth is None:
+        max_depth = _UUID_SCAN_MAX_DEPTH if _surrogate_scheme() == "blake2b" else sys.maxsize
+    if not isinstance(v, (dict, list)):
+        v = [v]
+    stack = [_uuid_children(v)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, (dict, list)):
+                if len(stack) < max_depth:
+                    stack.append(_uuid_children(child))
+                    break
+            elif child is not None and not isinstance(child, (int, float)):
+                # str or other printable; shorter strings cannot hold a UUID
+                s = child if isinstance(child, str) else str(child)
+                if len(s) >= _UUID_LEN:
+                    m = _UUID_RE.search(s)
+                    if m:
+                        return m.group(0)
+        else:
+            stack.pop()
+    return None
+
+# Fields that identify an item without UUID (names, SKUs, codes) — stock numbers are left out,
+# so the surrogate id does not change when the deficit changes
+_SURROGATE_KEYS = ("name","productName","Наименование","товар","product","Номенклатура",
+                   "sku","article","art","артикул","Артикул","code","Код")
+
+def _surrogate_scheme() -> str:
+    return os.getenv("ONEC_SURROGATE_ID_SCHEME", "legacy").lower()
+
+def _stable_token(v: Any) -> str:
+    if isinstance(v, str):
+        return v
+    if v is None or isinstance(v, (bool, int, float)):
+        return repr(v)
+    return json.dumps(v, ensure_ascii=False, sort_keys=True, default=str)
 
 def _derive_surrogate_id(item: Dict[str, Any]) -> str:
-    """Deterministic surrogate id from stable hash of the item."""
-    raw = json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
-    h = hashlib.md5(raw.encode("utf-8")).hexdigest()
-    return f"SURR-{h[:12]}"
+    """
+    Deterministic surrogate id.
+    legacy: md5 over the whole item serialized with sorted keys (ids of existing records);
+    blake2b: blake2b over the tuple of identifying fields, whole item only if there are none.
+    """
+    if _surrogate_scheme() != "blake2b":
+        raw = json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
+        h = hashlib.md5(raw.encode("utf-8")).hexdigest()
+        return f"SURR-{h[:12]}"
+    fields = [(k, item[k]) for k in _SURROGATE_KEYS if k in item]
+    if not fields:
+        fields = sorted(item.items(), key=lambda kv: str(kv[0]))
+    raw = "\x1f".join(f"{k}\x1e{_stable_token(v)}" for k, v in fields)
+    return f"SURR-{hashlib.blake2b(raw.encode('utf-8'), digest_size=6).hexdigest()}"
 
 def _choose_name(item: Dict[str, Any], fallback_id: str | None) -> str:
     for k in ("name","productName","Наименование","товар","product","Номенклатура"):
@@ -171,102 +261,184 @@ def _choose_name(item: Dict[str, Any], fallback_id: str | None) -> str:
             return f"SKU-{item[k]}"
     return fallback_id or "UNKNOWN"
 
-def normalize_deficit_payload(text: str, lossy: bool | None = None) -> List[Dict[str, Any]]:
+_DEFICIT_CONTAINER_KEYS = ("items", "rows", "list", "value", "result", "#value")
+
+# Canonical field -> accepted 1C key aliases (lowercase)
+_DEFICIT_FIELD_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "id": ("productid", "id"),
+    "name": ("name", "productname", "наименование"),
+    "sku": ("sku", "article", "art", "артикул"),
+    "min_stock": ("min_stock", "minstock", "min", "minimum", "минимальныйзапас", "минимальноеколичествозапаса"),
+    "max_stock": ("max_stock", "maxstock", "max", "maximum", "максимальныйзапас", "максимальноеколичествозапаса"),
+    "current_stock": ("current_stock", "stock", "остаток", "текущийостаток", "вналичииостаток"),
+    "deficit": ("deficit", "need_to_order", "quantity_to_order", "количествокзаказу", "кколичествузаказа", "дефицит"),
+}
+_NUMERIC_FIELDS = frozenset(("min_stock", "max_stock", "current_stock", "deficit"))
+_ALIAS_MAP: Dict[str, str] = {
+    alias: field for field, aliases in _DEFICIT_FIELD_ALIASES.items() for alias in aliases
+}
+
+# Item layout (tuple of keys) -> compiled plan ((key, field, numeric), ...).
+# 1C returns thousands of items with the same keys, so the plan is built once per layout.
+_SHAPE_PLANS: Dict[Tuple[str, ...], Tuple[Tuple[str, str, bool], ...]] = {}
+_SHAPE_PLANS_MAX = 256
+
+def _strict_ids_enabled() -> bool:
+    return os.getenv("STRICT_IDS", "false").lower() in ("1","true","yes")
+
+def _fast_path_enabled() -> bool:
+    return os.getenv("ONEC_NORMALIZE_FAST_PATH", "true").lower() in ("1","true","yes")
+
+def _shape_plan(keys: Tuple[str, ...]) -> Tuple[Tuple[str, str, bool], ...]:
+    """Compiled field mapping for an item layout: one alias lookup per key, cached per layout."""
+    plan = _SHAPE_PLANS.get(keys)
+    if plan is None:
+        plan = tuple(
+            (k, field, field in _NUMERIC_FIELDS)
+            for k in keys
+            if (field := _ALIAS_MAP.get(k.lower())) is not None
+        )
+        if len(_SHAPE_PLANS) < _SHAPE_PLANS_MAX:
+            _SHAPE_PLANS[keys] = plan
+    return plan
+
+def _map_fields_fast(item: Dict[str, Any]) -> Dict[str, Any]:
+    canon: Dict[str, Any] = {}
+    for k, field, numeric in _shape_plan(tuple(item)):
+        v = item[k]
+        t = type(v)
+        if numeric:
+            # Canonical payloads already carry numbers — skip the string checks
+            n = float(v) if t is float or t is int else _coerce_num(v)
+            if n is not None:
+                canon[field] = n
+        else:
+            canon[field] = v if t is str else str(v)
+    return canon
+
+def _map_fields_tolerant(item: Dict[str, Any]) -> Dict[str, Any]:
+    canon: Dict[str, Any] = {}
+    for k, v in list(item.items()):
+        kl = k.lower()
+        if kl in ("productid", "id"):
+            canon["id"] = str(v)
+        elif kl in ("name", "productname", "наименование"):
+            canon["name"] = str(v)
+        elif kl in ("sku", "article", "art", "артикул"):
+            canon["sku"] = str(v)
+        elif kl in ("min_stock", "minstock", "min", "minimum", "минимальныйзапас", "минимальноеколичествозапаса"):
+            n = _coerce_num(v)
+            if n is not None:
+                canon["min_stock"] = n
+        elif kl in ("max_stock", "maxstock", "max", "maximum", "максимальныйзапас", "максимальноеколичествозапаса"):
+            n = _coerce_num(v)
+            if n is not None:
+                canon["max_stock"] = n
+        elif kl in ("current_stock", "stock", "остаток", "текущийостаток", "вналичииостаток"):
+            n = _coerce_num(v)
+            if n is not None:
+                canon["current_stock"] = n
+        elif kl in ("deficit", "need_to_order", "quantity_to_order", "количествокзаказу", "кколичествузаказа", "дефицит"):
+            n = _coerce_num(v)
+            if n is not None:
+                canon["deficit"] = n
+    return canon
+
+def _deficit_items(data: Any) -> List[Any]:
+    """Extract item list from parsed /deficit response."""
+    if isinstance(data, dict):
+        for k in _DEFICIT_CONTAINER_KEYS:
+            if isinstance(data.get(k), list):
+                data = data[k]
+                break
+    if not isinstance(data, list):
+        data = [data]
+    return data
+
+def _normalize_deficit_item(item: Any, strict_ids: bool, fast: bool = True) -> Dict[str, Any] | None:
+    """Bring one /deficit item to canonical form; None if dropped under STRICT_IDS."""
+    # Bring item to dict
+    if isinstance(item, dict):
+        pass
+    elif isinstance(item, str):
+        item = _try_json(item) or _parse_kv_string(item)
+    else:
+        item = {"value": item}
+
+    # Canonical fields: map known aliases
+    canon = _map_fields_fast(item) if fast else _map_fields_tolerant(item)
+
+    # Fill deficit if missing (mapped numeric fields are already floats)
+    if "deficit" not in canon:
+        ms = canon.get("min_stock") or 0.0
+        cs = canon.get("current_stock") or 0.0
+        canon["deficit"] = ms - cs if ms > cs else 0.0
+
+    # Ensure ID: try to extract from any value
+    if "id" not in canon or not canon["id"]:
+        u = _first_uuid_from_value(item)
+        if u:
+            canon["id"] = u
+        elif not strict_ids:
+            # Create deterministic surrogate
+            canon["id"] = _derive_surrogate_id(item)
+            log.debug("onec.normalize: generated surrogate id %s for item %s", canon["id"], item)
+        else:
+            log.warning("onec.normalize: dropping item without UUID under STRICT_IDS: %s", item)
+            return None  # drop item
+
+    # Ensure name
+    if "name" not in canon or not str(canon["name"]).strip():
+        canon["name"] = _choose_name(item, canon.get("id"))
+
+    return canon
+
+def normalize_deficit_payload(text: str, lossy: bool | None = None,
+                              as_batch: bool = False) -> List[Dict[str, Any]] | DeficitBatch:
     """
     Normalize /deficit to:
       [{"id": "...", "name": "...", "min_stock": <num>, "max_stock": <num>, "current_stock": <num>, "deficit": <num>}]
     Guarantees presence of 'id' and 'name' unless STRICT_IDS=true and no UUID can be found.
+    With as_batch=True returns the same rows as a columnar DeficitBatch (no per-item dicts kept).
     """
     lossy = os.getenv("ONEC_LOSSY_NORMALIZE", "true").lower() in ("1", "true", "yes") if lossy is None else lossy
-    strict_ids = os.getenv("STRICT_IDS", "false").lower() in ("1","true","yes")
+    return _normalize_deficit_items(_deficit_items(parse_1c_response(text)), as_batch)
 
-    data = parse_1c_response(text)
+def _normalize_deficit_items(data: List[Any], as_batch: bool = False) -> List[Dict[str, Any]] | DeficitBatch:
+    strict_ids = _strict_ids_enabled()
+    fast = _fast_path_enabled()
 
-    # Extract list from dict containers
-    if isinstance(data, dict):
-        for k in ("items", "rows", "list", "value", "result", "#value"):
-            if isinstance(data.get(k), list):
-                data = data[k]
-                break
-    if not isinstance(data, list):
-        data = [data]
-
-    out: List[Dict[str, Any]] = []
+    out: List[Dict[str, Any]] | DeficitBatch = DeficitBatch() if as_batch else []
     for item in data:
-        # Bring item to dict
-        if isinstance(item, str):
-            item = _try_json(item) or _parse_kv_string(item)
-        elif not isinstance(item, dict):
-            item = {"value": item}
-
-        # Canonical fields
-        canon: Dict[str, Any] = {}
-
-        # Map known fields
-        for k, v in list(item.items()):
-            kl = k.lower()
-            if kl in ("productid", "id"):
-                canon["id"] = str(v)
-            elif kl in ("name", "productname", "наименование"):
-                canon["name"] = str(v)
-            elif kl in ("sku", "article", "art", "артикул"):
-                canon["sku"] = str(v)
-            elif kl in ("min_stock", "minstock", "min", "minimum", "минимальныйзапас", "минимальноеколичествозапаса"):
-                n = _coerce_num(v)
-                if n is not None:
-                    canon["min_stock"] = n
-            elif kl in ("max_stock", "maxstock", "max", "maximum", "максимальныйзапас", "максимальноеколичествозапаса"):
-                n = _coerce_num(v)
-                if n is not None:
-                    canon["max_stock"] = n
-            elif kl in ("current_stock", "stock", "остаток", "текущийостаток", "вналичииостаток"):
-                n = _coerce_num(v)
-                if n is not None:
-                    canon["current_stock"] = n
-            elif kl in ("deficit", "need_to_order", "quantity_to_order", "количествокзаказу", "кколичествузаказа", "дефицит"):
-                n = _coerce_num(v)
-                if n is not None:
-                    canon["deficit"] = n
-
-        # Fill deficit if missing
-        if "deficit" not in canon:
-            ms = _coerce_num(canon.get("min_stock")) or 0.0
-            cs = _coerce_num(canon.get("current_stock")) or 0.0
-            canon["deficit"] = ms - cs if ms > cs else 0.0
-
-        # Ensure ID: try to extract from any value
-        if "id" not in canon or not canon["id"]:
-            u = _first_uuid_from_value(item)
-            if u:
-                canon["id"] = u
-            elif not strict_ids:
-                # Create deterministic surrogate
-                canon["id"] = _derive_surrogate_id(item)
-                log.debug("onec.normalize: generated surrogate id %s for item %s", canon["id"], item)
-            else:
-                log.warning("onec.normalize: dropping item without UUID under STRICT_IDS: %s", item)
-                continue  # drop item
-
-        # Ensure name
-        if "name" not in canon or not str(canon["name"]).strip():
-            canon["name"] = _choose_name(item, canon.get("id"))
-
-        out.append(canon)
+        canon = _normalize_deficit_item(item, strict_ids, fast)
+        if canon is not None:
+            out.append(canon)
 
     return out
 
-def normalize_stock(text: str) -> float:
-    """
-    Normalize /stock to float.
-    Accepts {"stock": 12.3}, {"Остаток":...}, raw number, XDTO etc.
-    """
-    data = parse_1c_response(text)
+def _stock_from_dict(data: Dict[str, Any]) -> float | None:
+    lowered = {str(k).lower(): v for k, v in data.items()}
+    for k in ("stock", "остаток", "current_stock", "вналичииостаток", "#value", "value"):
+        if k in lowered and not isinstance(lowered[k], (dict, list)):
+            n = _coerce_num(lowered[k])
+            if n is not None:
+                return n
+    return None
+
+def _numeric_keys_to_list(obj: Any) -> Any:
+    """Some gateways return arrays as dict {"0":..., "1":...}."""
+    if isinstance(obj, dict) and obj and all(isinstance(k, str) and k.isdigit() for k in obj.keys()):
+        try:
+            return [obj[str(i)] for i in range(len(obj))]
+        except Exception:
+            pass
+    return obj
+
+def _stock_value(data: Any) -> float | None:
     if isinstance(data, dict):
-        for k in ("stock", "остаток", "current_stock", "вналичииостаток", "#value", "value"):
-            if k in data and not isinstance(data[k], (dict, list)):
-                n = _coerce_num(data[k])
-                if n is not None:
-                    return n
+        n = _stock_from_dict(data)
+        if n is not None:
+            return n
     if isinstance(data, (int, float)):
         return float(data)
     if isinstance(data, str):
@@ -275,14 +447,68 @@ def normalize_stock(text: str) -> float:
         if n is not None:
             return n
     if isinstance(data, list) and data:
-        # try first element
-        try:
-            return normalize_stock(json.dumps(data[0]))
-        except Exception:
-            pass
+        # try first element (already decoded and unwrapped — no re-serialization)
+        return _stock_value(_numeric_keys_to_list(data[0]))
+    return None
+
+def normalize_stock(text: str) -> float:
+    """
+    Normalize /stock to float.
+    Accepts {"stock": 12.3}, {"Остаток":...}, raw number, XDTO etc.
+    """
+    data = parse_1c_response(text)
+    n = _stock_value(data)
+    if n is not None:
+        return n
     raise ValueError(f"Cannot interpret /stock response: {data!r}")
 
 
+def normalize_stock_map(text: str) -> Dict[str, float]:
+    """
+    Normalize bulk /stock response to {product_id: qty}.
+    Accepts [{"productID": ..., "stock": ...}], {"items": [...]}, {"<id>": <qty>} and XDTO forms.
+    """
+    data = parse_1c_response(text)
+
+    if isinstance(data, dict):
+        for k in ("items", "rows", "list", "value", "result", "#value", "products"):
+            if isinstance(data.get(k), list):
+                data = data[k]
+                break
+
+    if isinstance(data, dict) and any(k.lower() in ("productid", "id", "product_id") for k in data):
+        data = [data]  # single item
+
+    out: Dict[str, float] = {}
+    if isinstance(data, dict):
+        # Plain mapping {product_id: qty}
+        for pid, qty in data.items():
+            n = qty if isinstance(qty, (int, float)) else None
+            if n is None and isinstance(qty, dict):
+                n = _stock_from_dict(qty)
+            if n is None:
+                n = _coerce_num(qty)
+            if n is not None:
+                out[str(pid)] = float(n)
+        return out
+
+    if isinstance(data, list):
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            pid = None
+            for k, v in item.items():
+                if k.lower() in ("productid", "id", "product_id"):
+                    pid = str(v)
+                    break
+            if not pid:
+                pid = _first_uuid_from_value(item)
+            n = _stock_from_dict(item)
+            if pid and n is not None:
+                out[pid] = n
+    return out
+
+
 def parse_1c_json(text: str) -> dict | list:
     """
     Пытаемся распарсить ответ 1С в различных форматах:
@@ -301,14 +527,16 @@ def parse_1c_json(text: str) -> dict | list:
     5. Если структура не распознана — лог и IntегrationError
     """
     try:
-        # Используем существующий функционал для парсинга
-        result = _try_json(text)
-        if result is None:
-            # Попробуем стандартный json.loads для правильной обработки null
-            try:
-                result = json.loads(text)
-            except:
-                raise IntegrationError(f"Cannot parse JSON from 1C response: {text[:200]}...")
+        # Один проход декодера: числовые поля сразу в Decimal/float, null отличаем от «не JSON».
+        # XDTO-ответ декодируется без хука — типы расставляются при развороте.
+        if _looks_like_xdto(text):
+            result = _loads_tolerant(text, _loads_decimal)
+            if result is not _MISSING and not (isinstance(result, dict) and "#value" in result):
+                result = _loads_tolerant(text, _loads_typed)
+        else:
+            result = _loads_tolerant(text, _loads_typed)
+        if result is _MISSING:
+            raise IntegrationError(f"Cannot parse JSON from 1C response: {text[:200]}...")
 
         # Шаг 2: Проверяем XDTO-ошибку
         if isinstance(result, dict) and "#value" in result:
@@ -324,17 +552,18 @@ def parse_1c_json(text: str) -> dict | list:
                             error_message = str(item["Value"].get("#value", "Unknown error"))
                         raise IntegrationError(f"1C API error: {error_message}")
 
-            # Разворачиваем XDTO структуру
-            result = _unwrap_xdto(result)
+            # Разворачиваем XDTO структуру (значения типизируются по итоговым ключам)
+            result = _unwrap_xdto_typed(result)
+        else:
+            result = _floats(result)
 
         # Шаг 3: Если получили строку, пробуем ещё раз
         if isinstance(result, str):
-            nested_result = _try_json(result)
-            if nested_result is not None:
-                result = _unwrap_xdto(nested_result)
+            nested_result = _loads_tolerant(result, _loads_decimal)
+            if nested_result is not _MISSING and nested_result is not None:
+                result = _unwrap_xdto_typed(nested_result)
 
-        # Шаг 4: Приводим числовые поля к Decimal/float
-        result = _convert_numeric_fields(result)
+        # Шаг 4: числовые поля уже приведены к Decimal/float при декодировании
 
         # Шаг 5: Проверяем что получили валидную структуру
         if result is None:
@@ -353,22 +582,130 @@ def parse_1c_json(text: str) -> dict | list:
         raise IntegrationError(f"Failed to parse 1C response: {str(e)}")
 
 
-def _convert_numeric_fields(obj: Any) -> Any:
-    """Рекурсивно конвертирует числовые поля в Decimal/float."""
-    if isinstance(obj, dict):
-        result = {}
-        for key, value in obj.items():
-            # Специальные поля которые должны быть числовыми
-            if key.lower() in ('min_stock', 'max_stock', 'current_stock', 'deficit', 'stock', 'остаток'):
-                numeric_value = _coerce_num(value)
-                if numeric_value is not None:
-                    result[key] = Decimal(str(numeric_value))
-                else:
-                    result[key] = value
-            else:
-                result[key] = _convert_numeric_fields(value)
-        return result
-    elif isinstance(obj, list):
-        return [_convert_numeric_fields(item) for item in obj]
-    else:
-        return obj
\ No newline at end of file
+_DECIMAL_FIELDS = frozenset(('min_stock', 'max_stock', 'current_stock', 'deficit', 'stock', 'остаток'))
+
+def _to_decimal(value: Any) -> Any:
+    """Точное Decimal-значение без промежуточного float; нечисловое значение возвращается как есть."""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, int):
+        return Decimal(int(value))
+    if isinstance(value, str):
+        s = value.strip()
+        return Decimal(s) if _NUM_RE.fullmatch(s) else value
+    if isinstance(value, float):
+        return Decimal(str(value))  # только NaN/Infinity — дробные числа уже Decimal
+    return value
+
+
+def _is_xdto_pair_node(obj: Dict[str, Any]) -> bool:
+    """Узлы, которые _unwrap_xdto сворачивает: их значения типизируются по ключу, под которым окажутся."""
+    if "#value" in obj and (len(obj) == 1 or (len(obj) == 2 and "#type" in obj)):
+        return True
+    return "name" in obj and "Value" in obj
+
+
+_XDTO_NODE_KEYS = frozenset(("name", "Value", "#value", "#type"))
+
+def _floats(value: Any) -> Any:
+    """
+    Decimal вне специальных полей -> float в списках и несвернутых XDTO-узлах.
+    Меняет только что декодированные контейнеры на месте; обычные объекты уже типизированы хуком.
+    """
+    t = type(value)
+    if t is Decimal:
+        return float(value)
+    if t is list:
+        for i, v in enumerate(value):
+            tv = type(v)
+            if tv is Decimal:
+                value[i] = float(v)
+            elif tv is list or tv is dict:
+                _floats(v)
+    elif t is dict and ("#value" in value or "Value" in value) and _is_xdto_pair_node(value):
+        for k, v in value.items():
+            tv = type(v)
+            if k not in _XDTO_NODE_KEYS and k.lower() in _DECIMAL_FIELDS:
+                value[k] = _to_decimal(v)
+            elif tv is Decimal:
+                value[k] = float(v)
+            elif tv is list or tv is dict:
+                _floats(v)
+    return value
+
+
+def _typed_object(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    object_hook для parse_1c_json: числовые поля приводятся к Decimal/float
+    прямо при декодировании, без второго обхода дерева.
+    """
+    if "#value" in obj:
+        if len(obj) == 1 or (len(obj) == 2 and "#type" in obj) or ("Value" in obj and "name" in obj):
+            return obj  # XDTO-узел: тип значения зависит от ключа после разворота
+    elif "Value" in obj and "name" in obj:
+        return obj
+    for k, v in obj.items():
+        t = type(v)
+        if t is str or t is int or t is Decimal or t is list or t is float or t is bool:
+            if k.lower() in _DECIMAL_FIELDS:
+                obj[k] = _to_decimal(v)
+            elif t is Decimal:
+                obj[k] = float(v)
+            elif t is list:
+                _floats(v)
+        elif t is dict and ("#value" in v or "Value" in v) and k.lower() not in _DECIMAL_FIELDS:
+            _floats(v)
+    return obj
+
+
+def _loads_typed(s: str) -> Any:
+    """
+    Декодер parse_1c_json для ответов без разворота XDTO: дробные числа сразу в Decimal,
+    затем по ключу — специальные поля Decimal, прочие float. Верхний уровень и несвернутые
+    XDTO-узлы типизирует _floats.
+    """
+    return json.loads(s, parse_float=Decimal, object_hook=_typed_object)
+
+
+def _loads_decimal(s: str) -> Any:
+    """Декодер для XDTO-ответов: типы расставляет _unwrap_xdto_typed за тот же проход, что и разворот."""
+    return json.loads(s, parse_float=Decimal)
+
+
+def _looks_like_xdto(text: str) -> bool:
+    """{"#type": ..., "#value": ...} на верхнем уровне — такой ответ будет развернут целиком."""
+    head = text[:256].lstrip("\ufeff \t\r\n")
+    return head.startswith("{") and '"#value"' in head
+
+
+def _unwrap_xdto_typed(node: Any) -> Any:
+    """
+    _unwrap_xdto с типизацией числовых полей по ключам развернутого результата
+    (специальные поля — Decimal, прочие дробные — float) за один проход.
+    """
+    if isinstance(node, dict):
+        if "#value" in node and (len(node) == 1 or (len(node) == 2 and "#type" in node)):
+            return _unwrap_xdto_typed(node["#value"])
+        if "name" in node and "Value" in node:
+            name = node["name"]
+            if type(name) is dict and "#value" in name and (len(name) == 1 or (len(name) == 2 and "#type" in name)):
+                name = name["#value"]
+            name = str(_unwrap_xdto(name))
+            value = node["Value"]
+            if name.lower() in _DECIMAL_FIELDS:
+                return {name: _to_decimal(_unwrap_xdto(value))}
+            return {name: _unwrap_xdto_typed(value)}
+        return {
+            k: _to_decimal(_unwrap_xdto(v)) if k.lower() in _DECIMAL_FIELDS else _unwrap_xdto_typed(v)
+            for k, v in node.items()
+        }
+    if isinstance(node, list):
+        items = [_unwrap_xdto_typed(x) for x in node]
+        if items and all(isinstance(x, dict) and len(x) == 1 for x in items):
+            merged: Dict[str, Any] = {}
+            for d in items:
+                for k, v in d.items():
+                    merged[str(k)] = v
+            return merged
+        return items
+    return float(node) if type(node) is Decimal else node
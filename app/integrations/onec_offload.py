@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+from .onec_json_normalizer import (
+    _MISSING,
+    _deficit_items,
+    _loads_tolerant,
+    _normalize_deficit_items,
+    _parse_kv_string,
+    _resolve_decoded,
+    _try_json,
+    normalize_deficit_payload,
+)
+from .onec_shape_cache import normalize_deficit_learned
+
+logger = logging.getLogger(__name__)
+
+MODES = ("inline", "thread", "process")
+
+
+# -- функции процессов-воркеров (должны импортироваться по имени модуля) ----
+
+def _normalize_lines_chunk(lines: List[str]) -> List[Dict[str, Any]]:
+    """Порция строк key=value / JSON-строк — так же, как parse_1c_response разбирает многострочный ответ."""
+    return _normalize_deficit_items([_try_json(ln) or _parse_kv_string(ln) for ln in lines])
+
+
+def _normalize_items_chunk(items: List[Any]) -> List[Dict[str, Any]]:
+    """Порция уже декодированных и развернутых элементов массива."""
+    return _normalize_deficit_items(items)
+
+
+def _split_payload(text: str) -> Tuple[str, List[Any]]:
+    """
+    Разбивает большой ответ на независимые элементы без нормализации:
+    ("items", элементы JSON-массива), ("lines", непустые строки) или ("whole", []).
+    """
+    obj = _loads_tolerant(text)
+    if obj is _MISSING:
+        lines = [ln for ln in text.splitlines() if ln.strip()]
+        return ("lines", lines) if len(lines) > 1 else ("whole", [])
+    if obj is None:
+        return "whole", []
+    return "items", _deficit_items(_resolve_decoded(obj))
+
+
+class NormalizationExecutor:
+    """
+    Нормализация ответов 1С вне event loop.
+
+    До ONEC_NORMALIZE_INLINE_MAX_BYTES ответ разбирается на месте (накладные расходы
+    пула больше самой работы), до ONEC_NORMALIZE_PROCESS_MIN_BYTES — в небольшом пуле
+    потоков, крупнее — порциями в пуле процессов: элементы массива или строки делятся
+    на порции не меньше ONEC_NORMALIZE_CHUNK_MIN_ITEMS и нормализуются параллельно.
+    Время по каждому режиму копится в stats().
+    """
+
+    def __init__(self):
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: ProcessPoolExecutor | None = None
+        self._stats: Dict[str, Dict[str, float]] = {
+            mode: {"calls": 0, "seconds": 0.0, "bytes": 0, "items": 0} for mode in MODES
+        }
+
+    def _thread_pool(self) -> Executor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=max(1, settings.ONEC_NORMALIZE_THREADS), thread_name_prefix="onec-normalize"
+            )
+        return self._threads
+
+    def _process_pool(self) -> Executor:
+        if self._processes is None:
+            # spawn: fork процесса с работающим event loop и потоками небезопасен
+            self._processes = ProcessPoolExecutor(
+                max_workers=settings.ONEC_NORMALIZE_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._processes
+
+    def mode_for(self, size: int) -> str:
+        if size <= settings.ONEC_NORMALIZE_INLINE_MAX_BYTES:
+            return "inline"
+        if settings.ONEC_NORMALIZE_PROCESSES > 0 and size >= settings.ONEC_NORMALIZE_PROCESS_MIN_BYTES:
+            return "process"
+        return "thread"
+
+    async def normalize_deficit(self, text: str, endpoint: str) -> List[Dict[str, Any]]:
+        """Аналог normalize_deficit_learned, не блокирующий event loop на больших ответах."""
+        size = len(text)
+        mode = self.mode_for(size)
+        started = time.perf_counter()
+        if mode == "inline":
+            result = normalize_deficit_learned(text, endpoint)
+        elif mode == "thread":
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._thread_pool(), normalize_deficit_learned, text, endpoint)
+        else:
+            result = await self._normalize_in_processes(text)
+        elapsed = time.perf_counter() - started
+
+        stats = self._stats[mode]
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        stats["bytes"] += size
+        stats["items"] += len(result)
+        logger.info("onec.normalize: %s mode, %d bytes, %d items in %.1f ms",
+                    mode, size, len(result), elapsed * 1000)
+        return result
+
+    async def _normalize_in_processes(self, text: str) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        # Декодирование и разбиение — в потоке, чтобы не держать event loop
+        kind, parts = await loop.run_in_executor(self._thread_pool(), _split_payload, text)
+        if kind == "whole":
+            return await loop.run_in_executor(self._thread_pool(), normalize_deficit_payload, text)
+
+        worker = _normalize_lines_chunk if kind == "lines" else _normalize_items_chunk
+        workers = max(1, settings.ONEC_NORMALIZE_PROCESSES)
+        chunk = max(settings.ONEC_NORMALIZE_CHUNK_MIN_ITEMS, math.ceil(len(parts) / workers))
+        pool = self._process_pool()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, worker, parts[i:i + chunk]) for i in range(0, len(parts), chunk)
+        ))
+        return [item for part in results for item in part]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            mode: {**values, "avg_ms": round(values["seconds"] * 1000 / values["calls"], 2) if values["calls"] else 0.0}
+            for mode, values in self._stats.items()
+        }
+
+    def shutdown(self):
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+
+normalization_executor = NormalizationExecutor()
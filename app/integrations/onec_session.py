@@ -0,0 +1,197 @@
+# app/integrations/onec_session.py
+# Reuse of 1C:Enterprise HTTP-service sessions. A request with "IBSession: start" makes the
+# web server keep the infobase session (and its license) alive and return its id in the
+# "ibsession" cookie; later requests that send the cookie skip session start-up and
+# authentication. One session serves one request at a time, so sessions live in a small
+# pool and each attempt borrows one exclusively. The web server ends a session after
+# sessionMaxAge seconds of inactivity (default.vrd, 20 by default), so a session idle
+# longer than max_idle is not handed out again. A streamed response keeps its session until
+# the response is closed (SessionBoundStream), not just until its headers arrive.
+
+import asyncio
+import threading
+import time
+from collections import deque
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Deque, Dict, List
+
+import httpx
+
+from app.core.config import settings
+
+SESSION_COOKIE = "ibsession"
+
+
+class RejectSessionCookie(DefaultCookiePolicy):
+    """Cookie policy for the shared httpx client: the pool, not the jar, owns session ids."""
+
+    def set_ok(self, cookie, request):
+        if cookie.name == SESSION_COOKIE:
+            return False
+        return super().set_ok(cookie, request)
+
+
+def exclude_session_cookie(client: httpx.AsyncClient):
+    """Stops the client's cookie jar from storing ibsession (idempotent)."""
+    jar = client.cookies.jar
+    if not isinstance(getattr(jar, "_policy", None), RejectSessionCookie):
+        jar.set_policy(RejectSessionCookie())
+
+
+class OneCSession:
+    __slots__ = ("id", "last_used", "requests")
+
+    def __init__(self):
+        self.id: str | None = None
+        self.last_used = 0.0
+        self.requests = 0
+
+    def bind(self, session_id: str):
+        self.id = session_id
+        self.requests = 0
+
+
+class SessionBoundStream(httpx.AsyncByteStream):
+    """Body of a streamed response that holds its pool session until the response is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, pool: "OneCSessionPool", session: OneCSession, keep: bool):
+        self._stream = stream
+        self._pool = pool
+        self._session = session
+        self._keep = keep
+        self._released = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except Exception:
+            # Body broke off mid-way: the session state on the 1C side is unknown
+            self._keep = False
+            raise
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._pool.release(self._session, self._keep)
+
+
+class OneCSessionPool:
+    """
+    Пул сеансов HTTP-сервиса 1С.
+
+    acquire() отдает свободный живой сеанс, заготовку нового (id=None — запрос
+    начнется с "IBSession: start"), пока сеансов меньше `size`, или ждет освобождения.
+    Сеанс, простаивавший дольше `max_idle`, не выдается повторно — его заменяет новый,
+    не дожидаясь, пока веб-сервер 1С закроет его по sessionMaxAge.
+    """
+
+    def __init__(self, size: int, max_idle: float):
+        self.size = max(1, size)
+        self.max_idle = max_idle
+        self._idle: Deque[OneCSession] = deque()
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.started = 0
+        self.reused = 0
+        self.expired = 0
+        self.renewed = 0
+
+    def _fresh(self, session: OneCSession) -> bool:
+        return session.id is not None and time.monotonic() - session.last_used < self.max_idle
+
+    def _take(self) -> OneCSession | None:
+        while self._idle:
+            session = self._idle.popleft()
+            if self._fresh(session):
+                return session
+            self.expired += 1
+            self._total -= 1
+        if self._total < self.size:
+            self._total += 1
+            return OneCSession()
+        return None
+
+    async def acquire(self) -> OneCSession:
+        with self._lock:
+            session = None if self._waiters else self._take()
+            if session is not None:
+                return session
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.done() and not waiter.cancelled():
+                    self._put(waiter.result(), keep=True)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self, session: OneCSession, keep: bool = True):
+        """Возвращает сеанс; keep=False — сеанс сломан (ошибка, 5xx) и больше не используется."""
+        with self._lock:
+            self._put(session, keep)
+
+    def _put(self, session: OneCSession, keep: bool):
+        session.last_used = time.monotonic()
+        if keep and self._fresh(session):
+            self._idle.append(session)
+        else:
+            self._total -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            session = self._take()
+            if session is None:
+                self._waiters.appendleft(waiter)
+                break
+            waiter.set_result(session)
+
+    def drain_idle(self) -> List[OneCSession]:
+        """Забирает все свободные сеансы (например, чтобы завершить их при остановке)."""
+        with self._lock:
+            sessions = [s for s in self._idle if s.id is not None]
+            self._total -= len(self._idle)
+            self._idle.clear()
+            return sessions
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "open": self._total,
+            "idle": len(self._idle),
+            "waiting": len(self._waiters),
+            "started": self.started,
+            "reused": self.reused,
+            "expired": self.expired,
+            "renewed": self.renewed,
+        }
+
+
+_pools: Dict[str, OneCSessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def session_pool(base_url: str) -> OneCSessionPool:
+    """Пул сеансов базы 1С по базовому URL HTTP-сервиса (общий для всех OneSApiClient)."""
+    with _pools_lock:
+        pool = _pools.get(base_url)
+        if pool is None:
+            pool = _pools[base_url] = OneCSessionPool(settings.ONEC_SESSION_POOL_SIZE, settings.ONEC_SESSION_MAX_IDLE)
+        return pool
+
+
+def session_stats() -> Dict[str, Dict[str, Any]]:
+    return {base_url: pool.stats() for base_url, pool in _pools.items()}
+
+
+def reset_session_pools():
+    with _pools_lock:
+        _pools.clear()
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+
+from app.core.config import settings
+from app.services.logger_service import log_event
+from .onec_json_normalizer import (
+    _deficit_items,
+    _normalize_deficit_item,
+    _strict_ids_enabled,
+    normalize_deficit_payload,
+    parse_1c_response,
+)
+from .onec_stream_parser import iter_deficit_payload
+
+logger = logging.getLogger(__name__)
+
+
+def _candidate_tolerant(text: str) -> List[Dict[str, Any]]:
+    strict_ids = _strict_ids_enabled()
+    items = (_normalize_deficit_item(item, strict_ids, False) for item in _deficit_items(parse_1c_response(text)))
+    return [canon for canon in items if canon is not None]
+
+
+def _candidate_batch(text: str) -> List[Dict[str, Any]]:
+    return normalize_deficit_payload(text, as_batch=True).to_dicts()
+
+
+# Кандидаты, которые можно сравнить с основным путем (normalization_executor)
+SHADOW_CANDIDATES: Dict[str, Callable[[str], List[Dict[str, Any]]]] = {
+    "tolerant": _candidate_tolerant,                    # цепочка сравнений без карты алиасов
+    "fast": normalize_deficit_payload,                  # карта алиасов без выученной формы
+    "stream": lambda text: list(iter_deficit_payload([text])),
+    "batch": _candidate_batch,                          # колоночный DeficitBatch
+}
+
+
+def diff_outputs(primary: Sequence[Mapping[str, Any]], candidate: Sequence[Mapping[str, Any]],
+                 limit: int) -> Dict[str, Any]:
+    """
+    Поэлементное сравнение двух нормализованных списков: число расхождений и до `limit`
+    примеров {idx, id, fields: {поле: [основной, кандидат]}}; при разной длине — лишние ID.
+    """
+    mismatched = 0
+    examples: List[Dict[str, Any]] = []
+    for idx, (a, b) in enumerate(zip(primary, candidate)):
+        if a == b:
+            continue
+        mismatched += 1
+        if len(examples) < limit:
+            fields = {k: [a.get(k), b.get(k)] for k in sorted(set(a) | set(b)) if a.get(k) != b.get(k)}
+            examples.append({"idx": idx, "id": a.get("id"), "fields": fields})
+    result: Dict[str, Any] = {
+        "primary_items": len(primary),
+        "candidate_items": len(candidate),
+        "mismatched": mismatched + abs(len(primary) - len(candidate)),
+        "examples": examples,
+    }
+    if len(primary) != len(candidate):
+        primary_ids = {item.get("id") for item in primary}
+        candidate_ids = {item.get("id") for item in candidate}
+        result["only_primary_ids"] = sorted(map(str, primary_ids - candidate_ids))[:limit]
+        result["only_candidate_ids"] = sorted(map(str, candidate_ids - primary_ids))[:limit]
+    return result
+
+
+class ShadowNormalizer:
+    """
+    Теневой запуск нормализатора-кандидата на доле живых ответов /deficit.
+
+    Основной путь только бросает жребий и ставит задачу: копия результата основного пути,
+    хэш ответа, кандидат, его замер и сравнение выполняются в отдельном потоке, итог пишется в
+    integration_logs (step="onec.shadow_normalize"). Если предыдущие сравнения еще идут
+    (ONEC_SHADOW_MAX_PENDING), выборка пропускается — теневой режим никогда не ждет.
+    """
+
+    def __init__(self):
+        self._executor: ThreadPoolExecutor | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._warned_unknown = False
+        self._stats: Dict[str, float] = {
+            "sampled": 0, "matched": 0, "diverged": 0, "errors": 0, "dropped": 0,
+            "primary_seconds": 0.0, "candidate_seconds": 0.0,
+        }
+
+    def _candidate(self) -> Callable[[str], List[Dict[str, Any]]] | None:
+        name = settings.ONEC_SHADOW_NORMALIZER
+        if not name or settings.ONEC_SHADOW_SAMPLE_RATE <= 0:
+            return None
+        candidate = SHADOW_CANDIDATES.get(name)
+        if candidate is None and not self._warned_unknown:
+            self._warned_unknown = True
+            logger.warning("onec.shadow: unknown candidate %r, expected one of %s", name, sorted(SHADOW_CANDIDATES))
+        return candidate
+
+    def maybe_submit(self, text: str, primary: List[Dict[str, Any]], primary_seconds: float, endpoint: str):
+        """Ставит теневое сравнение для выбранной доли ответов; сам вызов не блокирует."""
+        candidate = self._candidate()
+        if candidate is None or random.random() >= settings.ONEC_SHADOW_SAMPLE_RATE:
+            return
+        if len(self._tasks) >= max(1, settings.ONEC_SHADOW_MAX_PENDING):
+            self._stats["dropped"] += 1
+            return
+        self._stats["sampled"] += 1
+        task = asyncio.get_running_loop().create_task(
+            self._compare(candidate, text, primary, primary_seconds, endpoint)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compare(self, candidate: Callable[[str], List[Dict[str, Any]]], text: str,
+                       primary: List[Dict[str, Any]], primary_seconds: float, endpoint: str):
+        name = settings.ONEC_SHADOW_NORMALIZER
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="onec-shadow")
+
+        def run():
+            # Хэш и копия многомегабайтного ответа — тоже вне event loop основного пути
+            payload_hash = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+            try:
+                expected = list(primary)
+                started = time.perf_counter()
+                output = candidate(text)
+                elapsed = time.perf_counter() - started
+                return payload_hash, elapsed, diff_outputs(expected, output, settings.ONEC_SHADOW_DIFF_EXAMPLES), None
+            except Exception as e:
+                return payload_hash, None, None, e
+
+        details: Dict[str, Any] = {
+            "endpoint": endpoint,
+            "candidate": name,
+            "bytes": len(text),
+            "primary_ms": round(primary_seconds * 1000, 2),
+        }
+        payload_hash, candidate_seconds, diff, error = await asyncio.get_running_loop().run_in_executor(self._executor, run)
+        if error is not None:
+            self._stats["errors"] += 1
+            status = "ERROR"
+            details["error"] = f"{type(error).__name__}: {error}"
+        else:
+            status = "MATCH" if diff["mismatched"] == 0 else "DIFF"
+            self._stats["matched" if status == "MATCH" else "diverged"] += 1
+            self._stats["primary_seconds"] += primary_seconds
+            self._stats["candidate_seconds"] += candidate_seconds
+            details["candidate_ms"] = round(candidate_seconds * 1000, 2)
+            details["speedup"] = round(primary_seconds / candidate_seconds, 2) if candidate_seconds else None
+            details.update(diff)
+        if status != "MATCH":
+            logger.warning("onec.shadow: %s %s on %s: %s", name, status, endpoint,
+                           details.get("error") or f"{details['mismatched']} mismatched items")
+        try:
+            await log_event(
+                step="onec.shadow_normalize",
+                status=status,
+                external_system="ONEC",
+                elapsed_ms=int(candidate_seconds * 1000) if candidate_seconds is not None else None,
+                payload_hash=payload_hash,
+                details=details,
+            )
+        except Exception as e:
+            logger.warning("onec.shadow: failed to write integration log: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        compared = self._stats["matched"] + self._stats["diverged"]
+        return {
+            "candidate": settings.ONEC_SHADOW_NORMALIZER or None,
+            "sample_rate": settings.ONEC_SHADOW_SAMPLE_RATE,
+            **self._stats,
+            "pending": len(self._tasks),
+            "speedup": round(self._stats["primary_seconds"] / self._stats["candidate_seconds"], 2)
+            if compared and self._stats["candidate_seconds"] else None,
+        }
+
+    async def drain(self):
+        """Дождаться идущих сравнений (тесты, остановка приложения)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+shadow_normalizer = ShadowNormalizer()
@@ -0,0 +1,289 @@
+# app/integrations/onec_shape_cache.py
+# Learned response shapes per 1C endpoint. The first response of a given structure
+# (endpoint + structural fingerprint) compiles a specialized extractor; later responses
+# with the same fingerprint skip XDTO unwrapping, numeric-key detection, container probing
+# and per-item layout detection. Anything the extractor does not expect falls back to the
+# tolerant normalizer, and a changed fingerprint is logged. A shape whose mapped fields hold
+# XDTO-typed values is remembered with no extractor, so it goes straight to the tolerant path.
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Tuple
+
+from .onec_deficit_batch import DeficitBatch
+from .onec_json_normalizer import (
+    _DEFICIT_CONTAINER_KEYS,
+    _MISSING,
+    _coerce_num,
+    _deficit_items,
+    _fast_path_enabled,
+    _loads_tolerant,
+    _normalize_deficit_item,
+    _normalize_deficit_items,
+    _resolve_decoded,
+    _shape_plan,
+    _stock_value,
+    _strict_ids_enabled,
+    _unwrap_xdto,
+    normalize_deficit_payload,
+    normalize_stock,
+)
+
+log = logging.getLogger(__name__)
+
+_STOCK_KEYS = ("stock", "остаток", "current_stock", "вналичииостаток", "#value", "value")
+_DIGITS = "#digits"  # container marker for {"0": ..., "1": ...} arrays
+
+
+class _ShapeMismatch(Exception):
+    pass
+
+
+def _shape_cache_enabled() -> bool:
+    return os.getenv("ONEC_SHAPE_CACHE", "true").lower() in ("1", "true", "yes")
+
+
+def _is_xdto_node(obj: Dict[str, Any]) -> bool:
+    """Nodes that _unwrap_xdto collapses instead of copying."""
+    if "#value" in obj and (len(obj) == 1 or (len(obj) == 2 and "#type" in obj)):
+        return True
+    return "name" in obj and "Value" in obj
+
+
+def _flat_layout(item: Any) -> Tuple[str, ...] | None:
+    """Key layout of a plain multi-key object; None for XDTO nodes and single-key objects (merged by unwrap)."""
+    if type(item) is not dict or len(item) < 2 or "#value" in item or "#type" in item or _is_xdto_node(item):
+        return None
+    return tuple(item)
+
+
+def _nested_keys(obj: Dict[str, Any]) -> Tuple[str, ...]:
+    """Keys holding objects or arrays (e.g. {"#type": "jxs:decimal", "#value": 5}) — part of the fingerprint."""
+    return tuple(k for k, v in obj.items() if type(v) is dict or type(v) is list)
+
+
+# -- /deficit ---------------------------------------------------------------
+
+def _deficit_fingerprint(obj: Any) -> Tuple[Tuple[Any, ...], List[Any]] | None:
+    """
+    ((container, item layout, nested keys), items) for a list of flat objects — plain, inside a container
+    key or keyed by "0", "1", ...; None if the shape is not compilable.
+    """
+    if isinstance(obj, list):
+        container, items = None, obj
+    elif isinstance(obj, dict) and obj:
+        if all(isinstance(k, str) and k.isdigit() for k in obj):
+            try:
+                container, items = _DIGITS, [obj[str(i)] for i in range(len(obj))]
+            except KeyError:
+                return None
+        elif "#value" in obj and (len(obj) == 1 or (len(obj) == 2 and "#type" in obj)):
+            # {"#type": "jv8:Array", "#value": [...]}
+            container, items = "#value", obj["#value"]
+        elif "name" in obj and "Value" in obj:
+            return None
+        else:
+            container = next((k for k in _DEFICIT_CONTAINER_KEYS if isinstance(obj.get(k), list)), None)
+            if container is None:
+                return None
+            # Unwrapping could turn another container value into a list that wins the probe
+            if any(isinstance(obj.get(k), (dict, list)) for k in _DEFICIT_CONTAINER_KEYS if k != container):
+                return None
+            items = obj[container]
+        if not isinstance(items, list):
+            return None
+    else:
+        return None
+    if not items:
+        return None
+    layout = _flat_layout(items[0])
+    if layout is None:
+        return None
+    return (container, layout, _nested_keys(items[0])), items
+
+
+def _compile_deficit_extractor(layout: Tuple[str, ...],
+                               nested: Tuple[str, ...] = ()) -> Callable[..., List[Dict[str, Any]] | DeficitBatch] | None:
+    """Extractor for items that all share `layout`; None if a mapped field holds a nested value."""
+    plan = _shape_plan(layout)
+    if any(k in nested for k, _, _ in plan):
+        return None
+    has_id = any(field == "id" for _, field, _ in plan)
+
+    def extract(items: List[Any], strict_ids: bool, as_batch: bool = False) -> List[Dict[str, Any]] | DeficitBatch:
+        out: List[Dict[str, Any]] | DeficitBatch = DeficitBatch() if as_batch else []
+        append = out.append
+        for item in items:
+            if type(item) is not dict or tuple(item) != layout:
+                raise _ShapeMismatch()
+            canon: Dict[str, Any] = {}
+            for k, field, numeric in plan:
+                v = item[k]
+                t = type(v)
+                if t is dict or t is list:
+                    raise _ShapeMismatch()
+                if numeric:
+                    n = float(v) if t is float or t is int else _coerce_num(v)
+                    if n is not None:
+                        canon[field] = n
+                else:
+                    canon[field] = v if t is str else str(v)
+            if "deficit" not in canon:
+                ms = canon.get("min_stock") or 0.0
+                cs = canon.get("current_stock") or 0.0
+                canon["deficit"] = ms - cs if ms > cs else 0.0
+            if not has_id or not canon.get("id") or not canon.get("name", "").strip():
+                # Rare per-item fallback (UUID search, surrogate id, name guess) on the unwrapped item
+                canon = _normalize_deficit_item(_unwrap_xdto(item), strict_ids, True)
+                if canon is None:
+                    continue
+            append(canon)
+        return out
+
+    return extract
+
+
+# -- /stock -----------------------------------------------------------------
+
+def _stock_fingerprint(obj: Any) -> Tuple[Tuple[str, ...], Tuple[str, ...]] | None:
+    """(layout, nested keys) of a plain /stock object; None if the shape is not compilable."""
+    if type(obj) is not dict or not obj or "#value" in obj or "#type" in obj or _is_xdto_node(obj):
+        return None
+    return tuple(obj), _nested_keys(obj)
+
+
+def _compile_stock_extractor(layout: Tuple[str, ...],
+                             nested: Tuple[str, ...] = ()) -> Callable[[Dict[str, Any]], float] | None:
+    """
+    Candidate keys in _stock_from_dict priority order (last duplicate by case wins, as there);
+    None if a candidate holds a nested value.
+    """
+    by_lower: Dict[str, str] = {}
+    for k in layout:
+        by_lower[str(k).lower()] = k
+    candidates = tuple(by_lower[p] for p in _STOCK_KEYS if p in by_lower)
+    if any(k in nested for k in candidates):
+        return None
+
+    def extract(data: Dict[str, Any]) -> float:
+        for k in candidates:
+            v = data[k]
+            t = type(v)
+            if t is dict or t is list:
+                raise _ShapeMismatch()
+            n = float(v) if t is float or t is int else _coerce_num(v)
+            if n is not None:
+                return n
+        raise _ShapeMismatch()
+
+    return extract
+
+
+# -- cache ------------------------------------------------------------------
+
+class ShapeCache:
+    """
+    Выученные формы ответов 1С: endpoint -> (отпечаток структуры, скомпилированный извлекатель).
+
+    Извлекатель None — форма известна, но не компилируется (например, XDTO-значения в полях):
+    такие ответы сразу идут толерантным путем, без повторной компиляции и предупреждений.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, Callable | None]] = {}
+        self.hits = 0
+        self.compiled = 0
+        self.changes = 0
+        self.fallbacks = 0
+
+    def lookup(self, endpoint: str, fingerprint: Any, compile_fn: Callable[[], Callable | None]) -> Callable | None:
+        """Extractor for a known shape; None means: use the tolerant path for this response."""
+        entry = self._entries.get(endpoint)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        if fingerprint is None:
+            self.forget(endpoint, "shape is not compilable")
+            return None
+        extractor = compile_fn()
+        self._entries[endpoint] = (fingerprint, extractor)
+        self.compiled += 1
+        if entry is not None:
+            self.changes += 1
+            log.warning("onec.shape: %s response shape changed %s -> %s, using tolerant path",
+                        endpoint, entry[0], fingerprint)
+            return None
+        if extractor is None:
+            log.info("onec.shape: %s learned shape %s, not compilable, using tolerant path", endpoint, fingerprint)
+        else:
+            log.info("onec.shape: %s learned shape %s", endpoint, fingerprint)
+        return extractor
+
+    def forget(self, endpoint: str, reason: str):
+        entry = self._entries.pop(endpoint, None)
+        if entry is not None:
+            self.changes += 1
+            log.warning("onec.shape: %s dropped learned shape %s: %s", endpoint, entry[0], reason)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.compiled = self.changes = self.fallbacks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoints": sorted(self._entries),
+            "hits": self.hits,
+            "compiled": self.compiled,
+            "changes": self.changes,
+            "fallbacks": self.fallbacks,
+        }
+
+
+shape_cache = ShapeCache()
+
+
+def normalize_deficit_learned(text: str, endpoint: str,
+                              as_batch: bool = False) -> List[Dict[str, Any]] | DeficitBatch:
+    """
+    normalize_deficit_payload с выученной формой ответа endpoint (например "deficit/{wh}").
+    Результат совпадает с толерантным разбором; отличается только путь к нему.
+    """
+    if not _shape_cache_enabled() or not _fast_path_enabled():
+        return normalize_deficit_payload(text, as_batch=as_batch)
+    obj = _loads_tolerant(text)
+    if obj is _MISSING or obj is None:
+        return normalize_deficit_payload(text, as_batch=as_batch)
+
+    found = _deficit_fingerprint(obj)
+    fingerprint, items = found if found is not None else (None, None)
+    extractor = shape_cache.lookup(endpoint, fingerprint, lambda: _compile_deficit_extractor(*fingerprint[1:]))
+    if extractor is not None:
+        try:
+            return extractor(items, _strict_ids_enabled(), as_batch)
+        except _ShapeMismatch:
+            shape_cache.forget(endpoint, "item does not match learned layout")
+            shape_cache.fallbacks += 1
+    return _normalize_deficit_items(_deficit_items(_resolve_decoded(obj)), as_batch)
+
+
+def normalize_stock_learned(text: str, endpoint: str) -> float:
+    """normalize_stock с выученной формой ответа endpoint (например "stock/{wh}/{pid}")."""
+    if not _shape_cache_enabled():
+        return normalize_stock(text)
+    obj = _loads_tolerant(text)
+    if obj is _MISSING or obj is None:
+        return normalize_stock(text)
+
+    fingerprint = _stock_fingerprint(obj)
+    extractor = shape_cache.lookup(endpoint, fingerprint, lambda: _compile_stock_extractor(*fingerprint))
+    if extractor is not None:
+        try:
+            return extractor(obj)
+        except _ShapeMismatch:
+            shape_cache.forget(endpoint, "stock value does not match learned layout")
+            shape_cache.fallbacks += 1
+    data = _resolve_decoded(obj)
+    n = _stock_value(data)
+    if n is not None:
+        return n
+    raise ValueError(f"Cannot interpret /stock response: {data!r}")
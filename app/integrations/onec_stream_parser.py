@@ -0,0 +1,252 @@
+# app/integrations/onec_stream_parser.py
+# Incremental /deficit parser: reads the body chunk by chunk and yields canonical items
+# one at a time, so peak memory does not depend on the number of items.
+# Streams plain JSON arrays, {"items": [...]} and XDTO {"#type": ..., "#value": [...]};
+# other containers are decoded whole and picked by the tolerant key priority. Falls back to the tolerant normalizer for shapes that cannot be streamed (key=value text,
+# double-encoded JSON, numeric-key dicts).
+
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List
+
+from .onec_json_normalizer import (
+    _DEFICIT_CONTAINER_KEYS,
+    _deficit_items,
+    _fast_path_enabled,
+    _normalize_deficit_item,
+    _strict_ids_enabled,
+    _unwrap_xdto,
+    normalize_deficit_payload,
+)
+
+_WS = " \t\r\n"
+_DECODER = json.JSONDecoder()
+_END = object()  # end-of-array marker
+
+
+class _NeedMoreData(Exception):
+    pass
+
+
+class DeficitStreamParser:
+    """
+    Push-парсер ответа /deficit: feed(chunk) отдает готовые канонические элементы,
+    close() — хвост. В памяти держится только необработанный остаток буфера
+    и текущий элемент.
+    """
+
+    def __init__(self, strict_ids: bool | None = None):
+        self._strict_ids = _strict_ids_enabled() if strict_ids is None else strict_ids
+        self._fast = _fast_path_enabled()
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        # seek -> [object_key -> object_colon -> object_value]* -> array -> done | fallback
+        self._state = "seek"
+        self._head: Dict[str, Any] = {}   # skipped members of a top-level object
+        self._key: str | None = None
+        self._xdto_struct: Dict[str, Any] | None = None
+        self._fallback: List[str] = []
+        self.items = 0
+
+    # -- public API -------------------------------------------------------
+
+    def feed(self, data: bytes | str) -> Iterator[Dict[str, Any]]:
+        text = data if isinstance(data, str) else self._decoder.decode(data)
+        if self._state == "fallback":
+            self._fallback.append(text)
+            return iter(())
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return self._drain()
+
+    def close(self) -> Iterator[Dict[str, Any]]:
+        tail = self._decoder.decode(b"", final=True)
+        self._eof = True
+        if self._state == "fallback":
+            self._fallback.append(tail)
+            yield from self._emit_all(normalize_deficit_payload("".join(self._fallback)))
+            return
+        self._buf = self._buf[self._pos:] + tail
+        self._pos = 0
+        yield from self._drain()
+        if self._xdto_struct is not None:
+            yield from self._finish_parsed(self._xdto_struct)
+        elif self._state in ("object_key", "object_colon", "object_value") and self._head:
+            # Truncated object — normalize what we have, as the tolerant path would
+            yield from self._finish_parsed(self._head)
+
+    # -- state machine ----------------------------------------------------
+
+    def _drain(self) -> Iterator[Dict[str, Any]]:
+        try:
+            while True:
+                if self._state == "seek":
+                    self._seek()
+                elif self._state == "object_key":
+                    self._object_key()
+                elif self._state == "object_colon":
+                    self._object_colon()
+                elif self._state == "object_value":
+                    self._object_value()
+                elif self._state == "array":
+                    element = self._next_element()
+                    if element is _END:
+                        self._state = "done"
+                        continue
+                    yield from self._handle_element(element)
+                elif self._state == "object_done":
+                    self._state = "done"
+                    yield from self._finish_parsed(self._head)
+                else:  # done / fallback
+                    return
+        except _NeedMoreData:
+            return
+
+    def _skip_ws(self):
+        buf, pos = self._buf, self._pos
+        n = len(buf)
+        while pos < n and buf[pos] in _WS:
+            pos += 1
+        self._pos = pos
+        if pos >= n:
+            raise _NeedMoreData()
+
+    def _seek(self):
+        if self._pos == 0 and self._buf.startswith("\ufeff"):
+            self._pos = 1
+        self._skip_ws()
+        ch = self._buf[self._pos]
+        if ch == "[":
+            self._pos += 1
+            self._state = "array"
+        elif ch == "{":
+            self._pos += 1
+            self._state = "object_key"
+        else:
+            # Text lines, double-encoded JSON etc. — buffer and use the tolerant path
+            self._fallback.append(self._buf[self._pos:])
+            self._buf, self._pos = "", 0
+            self._state = "fallback"
+
+    def _decode_value(self) -> Any:
+        try:
+            value, end = _DECODER.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            raise _NeedMoreData()
+        if end >= len(self._buf) and not self._eof and not isinstance(value, (dict, list, str)):
+            # A number or literal at the end of the buffer may continue in the next chunk
+            raise _NeedMoreData()
+        self._pos = end
+        return value
+
+    def _object_key(self):
+        self._skip_ws()
+        ch = self._buf[self._pos]
+        if ch == ",":
+            self._pos += 1
+            self._skip_ws()
+            ch = self._buf[self._pos]
+        if ch == "}":
+            self._pos += 1
+            self._state = "object_done"
+            return
+        self._key = str(self._decode_value())
+        self._state = "object_colon"
+
+    def _object_colon(self):
+        self._skip_ws()
+        if self._buf[self._pos] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", self._buf, self._pos)
+        self._pos += 1
+        self._state = "object_value"
+
+    def _object_value(self):
+        self._skip_ws()
+        if self._buf[self._pos] == "[" and self._streams_container():
+            self._pos += 1
+            self._state = "array"
+            return
+        self._head[self._key] = self._decode_value()
+        self._state = "object_key"
+
+    def _streams_container(self) -> bool:
+        """
+        Stream the array only if the tolerant parser picks it whatever follows: "items" outranks
+        every other container key, and "#value" after at most "#type" is an XDTO array node
+        unwrapped as a whole. Other containers go to the head, and _deficit_items picks one
+        by priority when the object closes.
+        """
+        if self._key == _DEFICIT_CONTAINER_KEYS[0]:
+            return True
+        return self._key == "#value" and self._head.keys() <= {"#type"}
+
+    def _next_element(self) -> Any:
+        self._skip_ws()
+        ch = self._buf[self._pos]
+        if ch == ",":
+            self._pos += 1
+            self._skip_ws()
+            ch = self._buf[self._pos]
+        if ch == "]":
+            self._pos += 1
+            return _END
+        return self._decode_value()
+
+    # -- normalization ----------------------------------------------------
+
+    def _handle_element(self, element: Any) -> Iterator[Dict[str, Any]]:
+        if self._xdto_struct is not None or (
+            isinstance(element, dict) and "name" in element and "Value" in element and self._key == "#value"
+        ):
+            # {"#value": [{"name":..,"Value":..}, ...]} is one XDTO structure, not an item list
+            if self._xdto_struct is None:
+                self._xdto_struct = {}
+            unwrapped = _unwrap_xdto(element)
+            if isinstance(unwrapped, dict):
+                self._xdto_struct.update(unwrapped)
+            return
+        yield from self._emit(_unwrap_xdto(element))
+
+    def _finish_parsed(self, data: Any) -> Iterator[Dict[str, Any]]:
+        data = _unwrap_xdto(data)
+        # Same numeric-key array handling as parse_1c_response
+        if isinstance(data, dict) and data and all(isinstance(k, str) and k.isdigit() for k in data.keys()):
+            try:
+                data = [data[str(i)] for i in range(len(data))]
+            except Exception:
+                pass
+        for item in _deficit_items(data):
+            yield from self._emit(item)
+
+    def _emit(self, item: Any) -> Iterator[Dict[str, Any]]:
+        canon = _normalize_deficit_item(item, self._strict_ids, self._fast)
+        if canon is not None:
+            self.items += 1
+            yield canon
+
+    def _emit_all(self, items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for canon in items:
+            self.items += 1
+            yield canon
+
+
+def iter_deficit_payload(chunks: Iterable[bytes | str], strict_ids: bool | None = None) -> Iterator[Dict[str, Any]]:
+    """Синхронный генератор канонических элементов /deficit из последовательности чанков."""
+    parser = DeficitStreamParser(strict_ids=strict_ids)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_deficit_payload(chunks: AsyncIterable[bytes], strict_ids: bool | None = None) -> AsyncIterator[Dict[str, Any]]:
+    """Асинхронный вариант для httpx.Response.aiter_bytes()."""
+    parser = DeficitStreamParser(strict_ids=strict_ids)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
@@ -0,0 +1,149 @@
+import asyncio
+import email.utils
+import threading
+import time
+from typing import Any, Dict
+
+import httpx
+
+from app.core.config import settings
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """
+    Пауза, которую просит upstream: Retry-After (секунды или HTTP-дата)
+    или X-Lognex-Retry-After МойСклад (миллисекунды).
+    """
+    headers = response.headers
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            return max(0.0, parsed.timestamp() - time.time())
+    value = headers.get("X-Lognex-Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            return None
+    return None
+
+
+class AsyncTokenBucket:
+    """
+    Асинхронный token bucket: `rate` запросов в секунду со всплеском до `capacity`.
+
+    acquire() резервирует жетон сразу (баланс может уйти в минус) и ждет своей
+    очереди — ожидающие обслуживаются по порядку без блокировок. Заголовки ответа
+    подстраивают ведро под фактический остаток лимита на стороне upstream:
+    X-RateLimit-Remaining урезает баланс, Retry-After/X-Lognex-Retry-After и 429
+    приостанавливают выдачу жетонов всем пользователям ведра.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _reserve(self) -> float:
+        """Забирает жетон и возвращает, сколько секунд ждать до него."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            self.acquired += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    async def acquire(self, until: float | None = None) -> float:
+        """
+        Ждет жетон; возвращает время ожидания. Если ждать пришлось бы дольше
+        абсолютного срока `until` (time.monotonic()), жетон возвращается и
+        поднимается TimeoutError.
+        """
+        wait = self._reserve()
+        if wait <= 0:
+            return 0.0
+        if until is not None and time.monotonic() + wait > until:
+            with self._lock:
+                self._tokens += 1.0
+                self.acquired -= 1
+            raise TimeoutError(f"rate limit wait {wait:.2f}s exceeds deadline")
+        self.waited += wait
+        await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, response: httpx.Response):
+        """Подстраивает ведро под заголовки лимита в ответе upstream."""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            try:
+                remaining_n = float(remaining)
+            except ValueError:
+                remaining_n = None
+            if remaining_n is not None:
+                with self._lock:
+                    self._tokens = min(self._tokens, remaining_n)
+        if response.status_code == 429:
+            self.throttled += 1
+            delay = retry_after_seconds(response)
+            self.pause(1.0 / self.rate if delay is None else delay)
+        else:
+            delay = retry_after_seconds(response)
+            if delay:
+                self.pause(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self._tokens, 2),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "waited_s": round(self.waited, 3),
+        }
+
+
+_limiters: Dict[str, AsyncTokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits(name: str) -> tuple[float, float]:
+    if name == "moysklad":
+        return settings.MOYSKLAD_RATE_LIMIT_PER_SEC, settings.MOYSKLAD_RATE_LIMIT_BURST
+    raise KeyError(f"Unknown rate limiter {name!r}")
+
+
+def rate_limiter(name: str) -> AsyncTokenBucket:
+    """Лимитер upstream `name`, общий для всех клиентов процесса (например, всех MoySkladApiClient)."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            rate, burst = _limits(name)
+            limiter = _limiters[name] = AsyncTokenBucket(rate, burst)
+        return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+def reset_rate_limiters():
+    with _limiters_lock:
+        _limiters.clear()
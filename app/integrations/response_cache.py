@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+from app.core.config import settings
+from .singleflight import detached
+
+log = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "stored_at", "etag", "last_modified")
+
+    def __init__(self, value: Any, size: int, etag: str | None, last_modified: str | None):
+        self.value = value
+        self.size = size
+        self.stored_at = time.monotonic()
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def copy(self) -> Any:
+        """Копия значения для вызывающего: изменения не портят запись для следующих."""
+        return detached(self.value)
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Заголовки условного GET — только те, что поддержал сам ответ 1С."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Кэш разобранных ответов с TTL и LRU-вытеснением по объему.
+
+    Запись хранит собственную копию значения, а вызывающим отдается CacheEntry.copy(),
+    поэтому изменение полученного списка или словаря не портит кэш.
+
+    Объем считается по размеру тела ответа: записи вытесняются с самой давно
+    использованной, пока сумма не уложится в `max_bytes`; ответ больше лимита не
+    кэшируется. Устаревшая запись (старше `ttl`) не отдается как есть, но остается
+    для условного GET: если 1С ответит 304, запись продлевается без повторной
+    нормализации.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def lookup(self, key: Hashable) -> CacheEntry | None:
+        """Запись по ключу (свежая или устаревшая) или None; отмечает ее использование."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.age() < self.ttl
+
+    def record(self, key: Hashable, outcome: str):
+        """Учитывает исход обращения (hit / miss / revalidated) и пишет долю попаданий в DEBUG-лог."""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+        log.debug("response cache %s: %s, hit ratio %.2f (%d entries, %d bytes)", outcome,
+                 "/".join(map(str, key)) if isinstance(key, tuple) else key, self.hit_ratio(),
+                 len(self._entries), self._bytes)
+
+    def put(self, key: Hashable, value: Any, size: int, etag: str | None = None,
+            last_modified: str | None = None):
+        with self._lock:
+            self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = CacheEntry(detached(value), size, etag, last_modified)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def refresh(self, key: Hashable):
+        """Продлевает запись после 304 Not Modified."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.stored_at = time.monotonic()
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.revalidated = self.evictions = 0
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses + self.revalidated
+        # 304 тоже экономит выгрузку и нормализацию — считаем его попаданием
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hit_ratio(), 3),
+        }
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def response_cache(base_url: str) -> ResponseCache:
+    """Кэш ответов базы 1С по базовому URL HTTP-сервиса (общий для всех OneSApiClient)."""
+    with _caches_lock:
+        cache = _caches.get(base_url)
+        if cache is None:
+            cache = _caches[base_url] = ResponseCache(settings.ONEC_RESPONSE_CACHE_TTL,
+                                                      settings.ONEC_RESPONSE_CACHE_MAX_BYTES)
+        return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {base_url: cache.stats() for base_url, cache in _caches.items()}
+
+
+def reset_response_caches():
+    with _caches_lock:
+        _caches.clear()
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator
+
+import httpx
+
+from app.core.config import settings
+
+
+# Абсолютный срок (time.monotonic()) всех HTTP-вызовов текущего запуска; задачи
+# asyncio наследуют его вместе с контекстом
+run_deadline_var: ContextVar[float | None] = ContextVar("http_run_deadline", default=None)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Срок вызова или запуска истек до очередной попытки."""
+
+
+def is_retryable_exception(exception: BaseException) -> bool:
+    """Определяет, является ли исключение основанием для повторной попытки."""
+    if isinstance(exception, DeadlineExceeded):
+        return False
+    if isinstance(exception, (httpx.ConnectError, httpx.TimeoutException, httpx.ReadTimeout)):
+        return True
+    if isinstance(exception, httpx.HTTPStatusError):
+        # Повторяем при серверных ошибках (5xx) и превышении лимита (429)
+        return is_retryable_status(exception.response.status_code)
+    return False
+
+
+def is_retryable_status(status_code: int) -> bool:
+    # 429 — превышен лимит запросов: повторяем после паузы из Retry-After
+    return status_code == 429 or 500 <= status_code < 600
+
+
+@contextmanager
+def run_deadline(seconds: float | None = None) -> Iterator[float]:
+    """
+    Ограничивает все HTTP-вызовы с повторами внутри блока общим сроком
+    (по умолчанию HTTP_RUN_DEADLINE). Вложенный блок не продлевает внешний срок.
+    """
+    seconds = settings.HTTP_RUN_DEADLINE if seconds is None else seconds
+    deadline = time.monotonic() + seconds
+    outer = run_deadline_var.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = run_deadline_var.set(deadline)
+    try:
+        yield deadline
+    finally:
+        run_deadline_var.reset(token)
+
+
+class RetryBudget:
+    """
+    Общий бюджет повторов upstream: каждый запрос добавляет `ratio` жетона,
+    повтор тратит один; плюс `min_per_second` жетонов в секунду, чтобы редкие
+    запросы тоже могли повторяться. Когда upstream лежит, повторы быстро
+    исчерпывают бюджет и не умножают нагрузку на него.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, cap: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self._tokens = cap
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.cap, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+            self._refill(time.monotonic())
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1.0:
+                self.denied += 1
+                return False
+            self._tokens -= 1.0
+            self.retries += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "retries": self.retries, "denied": self.denied,
+                "tokens": round(self._tokens, 2)}
+
+
+class RetryPolicy:
+    """Число попыток, срок одного вызова и полный джиттер: пауза ~ U(0, min(max_delay, base * 2**n))."""
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float, call_deadline: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.call_deadline = call_deadline
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            attempts=settings.HTTP_RETRY_ATTEMPTS,
+            base_delay=settings.HTTP_RETRY_BASE_DELAY,
+            max_delay=settings.HTTP_RETRY_MAX_DELAY,
+            call_deadline=settings.HTTP_CALL_DEADLINE,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Пауза после неудачной попытки номер `attempt` (с 1)."""
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def deadline(self, call_deadline: float | None = None) -> float:
+        """Абсолютный срок вызова: свой срок или срок запуска — что наступит раньше."""
+        deadline = time.monotonic() + (self.call_deadline if call_deadline is None else call_deadline)
+        run = run_deadline_var.get()
+        return deadline if run is None else min(deadline, run)
+
+
+_budgets: Dict[str, RetryBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def retry_budget(upstream: str) -> RetryBudget:
+    """Бюджет повторов, общий для всех клиентов одного upstream (базового URL)."""
+    with _budgets_lock:
+        budget = _budgets.get(upstream)
+        if budget is None:
+            budget = _budgets[upstream] = RetryBudget(
+                ratio=settings.HTTP_RETRY_BUDGET_RATIO,
+                min_per_second=settings.HTTP_RETRY_BUDGET_MIN_PER_SEC,
+                cap=settings.HTTP_RETRY_BUDGET_CAP,
+            )
+        return budget
+
+
+def retry_budget_stats() -> Dict[str, Dict[str, Any]]:
+    return {upstream: budget.stats() for upstream, budget in _budgets.items()}
+
+
+def reset_retry_budgets():
+    with _budgets_lock:
+        _budgets.clear()
@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .retry import run_deadline_var
+
+
+def detached(value: Any) -> Any:
+    """
+    Независимая копия разобранного ответа (списки и словари на любой глубине;
+    скаляры неизменяемы и не копируются) — чтобы изменения одного вызывающего
+    не видели другие.
+    """
+    if isinstance(value, list):
+        return [detached(v) if isinstance(v, (list, dict)) else v for v in value]
+    if isinstance(value, dict):
+        return {k: detached(v) if isinstance(v, (list, dict)) else v for k, v in value.items()}
+    return value
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вызовов: пока вызов с ключом `key` выполняется,
+    остальные вызовы с тем же ключом ждут его и получают тот же результат или ту же
+    ошибку. После завершения ключ забывается — между «полетами» ничего не кэшируется.
+
+    Вызов выполняется отдельной задачей в копии контекста первого вызывающего
+    (run_id, job_id, request_id попадают в его логи и integration_logs), но без срока
+    run_deadline: срок одного ожидающего не обрывает вызов для остальных — свой срок
+    каждый ожидающий соблюдает сам (см. BaseApiClient._coalesce). Отмена одного из ожидающих не
+    прерывает вызов; задача отменяется, только когда отказались все. Первый вызывающий
+    получает сам результат, остальные — его копию (detached).
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        follower = flight is not None and flight.task.get_loop() is loop
+        if follower:
+            self.shared += 1
+        else:
+            context = contextvars.copy_context()
+            context.run(run_deadline_var.set, None)
+            flight = self._flights[key] = _Flight(loop.create_task(fn(), context=context))
+            flight.task.add_done_callback(lambda task, key=key, flight=flight: self._forget(key, flight))
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+            return detached(result) if follower else result
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Ошибку забирают ожидающие; без них — не даем asyncio ругаться на необработанную
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "calls": self.calls, "shared": self.shared}
+
+
+# Общий для всех клиентов процесса: плановый запуск, ручной триггер и outbox создают
+# собственные экземпляры OneSApiClient/MoySkladApiClient
+flights = SingleFlight()
@@ -9,6 +9,16 @@ from app.api import debug_onec
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from app.background.jobs import process_outbox_events_job, run_internal_replenishment_job
+from app.integrations.adaptive_limit import concurrency_stats
+from app.integrations.circuit_breaker import circuit_stats
+from app.integrations.http_pool import http_clients
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.onec_session import session_stats
+from app.integrations.rate_limit import rate_limit_stats
+from app.integrations.response_cache import cache_stats
+from app.integrations.singleflight import flights
+from app.integrations.onec_offload import normalization_executor
+from app.integrations.onec_shadow import shadow_normalizer
 
 # Initialize logging before anything else
 configure_logging()
@@ -24,6 +34,8 @@ assert_single_head_or_explain()
 scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 
 async def startup_event():
+    # Общие пулы HTTP-соединений к 1С и МойСклад на время жизни приложения
+    http_clients.open()
     print("Starting scheduler...")
     scheduler.add_job(
         process_outbox_events_job,
@@ -42,6 +54,12 @@ async def startup_event():
 async def shutdown_event():
     print("Shutting down scheduler...")
     scheduler.shutdown()
+    if settings.ONEC_SESSION_REUSE:
+        # Свободные сеансы 1С завершаем явно, чтобы лицензии не ждали sessionMaxAge
+        await OneSApiClient().finish_sessions()
+    await http_clients.aclose()
+    normalization_executor.shutdown()
+    shadow_normalizer.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -71,6 +89,18 @@ async def health_db():
         from fastapi import HTTPException
         raise HTTPException(status_code=503, detail={"db": "error", "message": str(e)})
 
+@app.get("/health/http", tags=["Health Check"])
+async def health_http():
+    """Статистика общих пулов HTTP-соединений к внешним сервисам, выключателей и лимитеров запросов."""
+    return {"open": http_clients.is_open, "pools": http_clients.stats(), "circuits": circuit_stats(),
+            "rate_limits": rate_limit_stats(), "concurrency": concurrency_stats(), "onec_sessions": session_stats(),
+            "coalesced_gets": flights.stats(), "onec_response_cache": cache_stats()}
+
+@app.get("/health/normalizer", tags=["Health Check"])
+async def health_normalizer():
+    """Время нормализации ответов 1С по режимам (на месте / потоки / процессы) и теневое сравнение."""
+    return {**normalization_executor.stats(), "shadow": shadow_normalizer.stats()}
+
 app.include_router(replenishment.router, prefix="/api/v1", tags=["Triggers"])
 app.include_router(admin.router, tags=["Admin"])
 app.include_router(debug_onec.router) 
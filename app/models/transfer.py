@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import String, DECIMAL
+from sqlalchemy import String, DECIMAL, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base_class import Base, TimestampMixin
@@ -7,6 +7,10 @@ from app.db.base_class import Base, TimestampMixin
 
 class PendingTransfer(Base, TimestampMixin):
     __tablename__ = "pending_transfers"
+    __table_args__ = (
+        # Товары в пути на запуск: WHERE status IN (...) -> product_id_1c (index-only scan)
+        Index("ix_pending_transfers_status_product_id_1c", "status", "product_id_1c"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_id_1c: Mapped[str] = mapped_column(String, index=True, comment="UUID товара в 1С")
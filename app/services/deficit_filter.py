@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Mapping, Sequence
+
+from app.integrations.onec_deficit_batch import DeficitBatch
+
+try:
+    import numpy as np
+except ImportError:  # numpy приходит вместе с pandas; без него работает построчный вариант
+    np = None
+
+
+# Причины отбраковки в порядке проверки: элемент получает первую сработавшую
+REJECTION_REASONS = (
+    "missing_or_non_string_id",
+    "deficit_not_number",
+    "deficit_below_threshold",
+    "missing_name",
+    "missing_min_stock",
+    "missing_current_stock",
+)
+
+REJECTIONS_SAMPLE_SIZE = 20
+
+
+class DeficitFilterResult:
+    """
+    Результат фильтра дефицита: индексы оставленных элементов (в исходном порядке),
+    код причины для каждого элемента (0 — оставлен, иначе номер в REJECTION_REASONS + 1)
+    и полная гистограмма отбраковки по причинам.
+    """
+
+    __slots__ = ("kept", "codes", "ids", "histogram")
+
+    def __init__(self, kept: List[int], codes: Sequence[int], ids: Sequence[Any]):
+        self.kept = kept
+        self.codes = codes
+        self.ids = ids
+        counts = [0] * (len(REJECTION_REASONS) + 1)
+        if np is not None and isinstance(codes, np.ndarray):
+            counts = np.bincount(codes, minlength=len(counts)).tolist()
+        else:
+            for code in codes:
+                counts[code] += 1
+        self.histogram: Dict[str, int] = {
+            reason: counts[i + 1] for i, reason in enumerate(REJECTION_REASONS) if counts[i + 1]
+        }
+
+    @property
+    def rejected(self) -> int:
+        return len(self.codes) - len(self.kept)
+
+    def rejections_sample(self, limit: int = REJECTIONS_SAMPLE_SIZE) -> List[Dict[str, Any]]:
+        """Первые отбракованные элементы в формате прежнего лога filter_summary."""
+        if np is not None and isinstance(self.codes, np.ndarray):
+            rejected_idx = np.flatnonzero(self.codes)[:limit].tolist()
+        else:
+            rejected_idx = [i for i, code in enumerate(self.codes) if code][:limit]
+        return [
+            {"idx": i, "id": self.ids[i], "reason": REJECTION_REASONS[int(self.codes[i]) - 1]}
+            for i in rejected_idx
+        ]
+
+
+def _columns(items: Sequence[Mapping] | DeficitBatch):
+    """(ids, id_ok, deficit, deficit_is_number, name_ok, has_min, has_current) одним проходом."""
+    if isinstance(items, DeficitBatch):
+        ids = items.ids
+        id_ok = [bool(pid) and isinstance(pid, str) for pid in ids]
+        name_ok = [bool(name) for name in items.names]
+        if np is not None:
+            deficit = items.as_numpy("deficit")
+            return (ids, np.array(id_ok, dtype=bool), deficit, ~np.isnan(deficit), np.array(name_ok, dtype=bool),
+                    ~np.isnan(items.as_numpy("min_stock")), ~np.isnan(items.as_numpy("current_stock")))
+        deficit = items.deficit
+        is_number = [d == d for d in deficit]  # NaN — поля нет
+        return (ids, id_ok, deficit, is_number, name_ok,
+                [v == v for v in items.min_stock], [v == v for v in items.current_stock])
+
+    ids = [it.get("id") for it in items]
+    id_ok = [bool(pid) and isinstance(pid, str) for pid in ids]
+    raw_deficit = [it.get("deficit") for it in items]
+    is_number = [isinstance(d, (int, float)) for d in raw_deficit]
+    deficit = [float(d) if ok else 0.0 for d, ok in zip(raw_deficit, is_number)]
+    name_ok = [bool(it.get("name")) for it in items]
+    has_min = ["min_stock" in it for it in items]
+    has_current = ["current_stock" in it for it in items]
+    if np is not None:
+        return (ids, np.array(id_ok, dtype=bool), np.array(deficit, dtype=np.float64),
+                np.array(is_number, dtype=bool), np.array(name_ok, dtype=bool),
+                np.array(has_min, dtype=bool), np.array(has_current, dtype=bool))
+    return ids, id_ok, deficit, is_number, name_ok, has_min, has_current
+
+
+def filter_deficit(items: Sequence[Mapping] | DeficitBatch, min_deficit: float) -> DeficitFilterResult:
+    """
+    Проверяет все элементы разом: строковый ID, числовой дефицит, порог min_deficit,
+    наименование, наличие min_stock и current_stock. С numpy — векторно по колонкам,
+    без него — один построчный проход с теми же правилами.
+    """
+    ids, id_ok, deficit, is_number, name_ok, has_min, has_current = _columns(items)
+
+    if np is not None:
+        codes = np.zeros(len(ids), dtype=np.int64)
+        # Назначаем с конца: более ранняя проверка перекрывает более позднюю
+        codes[~has_current] = 6
+        codes[~has_min] = 5
+        codes[~name_ok] = 4
+        with np.errstate(invalid="ignore"):
+            codes[deficit < min_deficit] = 3
+        codes[~is_number] = 2
+        codes[~id_ok] = 1
+        return DeficitFilterResult(np.flatnonzero(codes == 0).tolist(), codes, ids)
+
+    codes = []
+    kept = []
+    for i in range(len(ids)):
+        if not id_ok[i]:
+            code = 1
+        elif not is_number[i]:
+            code = 2
+        elif deficit[i] < min_deficit:
+            code = 3
+        elif not name_ok[i]:
+            code = 4
+        elif not has_min[i]:
+            code = 5
+        elif not has_current[i]:
+            code = 6
+        else:
+            code = 0
+            kept.append(i)
+        codes.append(code)
+    return DeficitFilterResult(kept, codes, ids)
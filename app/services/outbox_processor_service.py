@@ -3,6 +3,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from app.models.outbox import OutboxEvent
 from app.models.transfer import PendingTransfer
+from app.core.config import settings
+from app.integrations.circuit_breaker import CircuitOpenError
+from app.integrations.retry import DeadlineExceeded, run_deadline
 from app.integrations.one_s_client import OneSApiClient
 from app.integrations.moysklad_client import MoySkladApiClient
 from app.schemas.one_s import TransferOrderPayload, TransferOrderResponse
@@ -38,27 +41,36 @@ class OutboxProcessorService:
 
         one_s_client = OneSApiClient()
         ms_client = MoySkladApiClient()
-        for event in events_to_process:
-            try:
-                # Роутинг по типам событий
-                if event.event_type == "CREATE_1C_TRANSFER":
-                    await self.handle_create_1c_transfer(event, one_s_client)
-                elif event.event_type == "CREATE_MS_CUSTOMER_ORDER":
-                    await self.handle_create_ms_customer_order(event, ms_client)
-                else:
+        # Общий срок HTTP-вызовов тика: повторы к лежащему upstream не растягивают его без конца
+        with run_deadline(settings.HTTP_RUN_DEADLINE):
+            for event in events_to_process:
+                try:
+                    # Роутинг по типам событий
+                    if event.event_type == "CREATE_1C_TRANSFER":
+                        await self.handle_create_1c_transfer(event, one_s_client)
+                    elif event.event_type == "CREATE_MS_CUSTOMER_ORDER":
+                        await self.handle_create_ms_customer_order(event, ms_client)
+                    else:
+                        await self.logger.warning(
+                            f"Неизвестный тип события: {event.event_type}",
+                            payload={"event_id": str(event.id)},
+                        )
+                        await self.mark_event_as_failed(event.id)
+
+                except (CircuitOpenError, DeadlineExceeded) as e:
+                    # Upstream недоступен или срок тика исчерпан: событие остается PENDING до следующего тика
                     await self.logger.warning(
-                        f"Неизвестный тип события: {event.event_type}",
+                        f"Событие {event.id} отложено: {e}",
                         payload={"event_id": str(event.id)},
                     )
-                    await self.mark_event_as_failed(event.id)
 
-            except Exception as e:
-                # В случае ошибки, помечаем событие как FAILED и логируем
-                await self.mark_event_as_failed(event.id)
-                await self.logger.error(
-                    f"Ошибка при обработке события {event.id}: {e}",
-                    payload={"event_id": str(event.id)},
-                )
+                except Exception as e:
+                    # В случае ошибки, помечаем событие как FAILED и логируем
+                    await self.mark_event_as_failed(event.id)
+                    await self.logger.error(
+                        f"Ошибка при обработке события {event.id}: {e}",
+                        payload={"event_id": str(event.id)},
+                    )
 
         await one_s_client.close()
         await ms_client.close()
@@ -1,15 +1,17 @@
+import asyncio
 import httpx
 import logging
-import os
 import uuid
-from tenacity import RetryError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert
 
 from app.integrations.one_s_client import OneSApiClient
 from app.integrations.moysklad_client import MoySkladApiClient
 from app.integrations.onec_json_normalizer import IntegrationError
+from app.integrations.retry import run_deadline
 from .logger_service import LoggerService, log_event
+from .deficit_filter import filter_deficit
+from .stock_snapshot import DonorStockSnapshot, ReservationLedger
 from app.models.transfer import PendingTransfer
 from app.models.outbox import OutboxEvent
 from app.core.config import settings
@@ -31,20 +33,18 @@ class ReplenishmentService:
         "СВАО Контейнер": "b8c4c555-49b7-11e6-8a7c-0025903e6d16",
     }
 
+    # Статусы pending_transfers, по которым товар еще в пути
+    ACTIVE_TRANSFER_STATUSES = ("INITIATED", "CREATED_IN_1C")
+
     def __init__(self, session: AsyncSession):
         self.session = session
         self.logger = LoggerService(session, self.PROCESS_NAME)
         self.one_s_client = OneSApiClient()
         self.ms_client = MoySkladApiClient()
-
-    async def check_is_pending(self, product_id: str) -> bool:
-        """Проверяет, есть ли для товара активное, незавершенное перемещение."""
-        stmt = select(PendingTransfer).where(
-            PendingTransfer.product_id_1c == product_id,
-            PendingTransfer.status.in_(["INITIATED", "CREATED_IN_1C"]),
-        )
-        result = await self.session.execute(stmt)
-        return result.scalars().first() is not None
+        self._donor_snapshot: DonorStockSnapshot | None = None
+        self._ledger: ReservationLedger | None = None
+        self._queued_transfers: list[dict] = []
+        self._queued_orders: list[dict] = []
 
     @log_step("replenishment.run")
     async def run_internal_replenishment(self, warehouse_id: str = None, bypass_filter: bool = False):
@@ -52,32 +52,50 @@ class ReplenishmentService:
         warehouse_id = warehouse_id or self.YURLOVSKIY_WAREHOUSE_ID
         logger.info("START replenishment", extra={"extra": {"warehouse_id": warehouse_id, "bypass_filter": bypass_filter}})
 
-        try:
-            # 1) Получаем дефицит
-            items = await self._fetch_and_filter_deficit(warehouse_id, bypass_filter)
-            if not items:
-                logger.info("No items to process", extra={"extra": {"warehouse_id": warehouse_id}})
-                await log_event(step="replenishment", status="END", details={"reason": "no_deficit", "warehouse_id": warehouse_id})
-                return {"status": "success", "message": "No deficit found."}
-
-            # 2) Ищем доноров и формируем outbox/events
-            await self._plan_transfers_or_orders(warehouse_id, items)
-            logger.info("END replenishment", extra={"extra": {"warehouse_id": warehouse_id}})
-            await log_event(step="replenishment", status="END", details={"warehouse_id": warehouse_id, "processed_items": len(items)})
-            return {"status": "success", "message": "Replenishment process finished."}
-
-        except Exception as e:
-            logger.error("Replenishment failed", extra={"extra": {"error": str(e), "warehouse_id": warehouse_id}}, exc_info=True)
-            await log_event(step="replenishment", status="ERROR", details={"error": str(e), "warehouse_id": warehouse_id})
-            return {"status": "error", "message": str(e)}
-        finally:
-            await self.one_s_client.close()
-            await self.ms_client.close()
+        # Общий срок всех HTTP-вызовов запуска: повторы к лежащему upstream не растягивают его без конца
+        with run_deadline(settings.HTTP_RUN_DEADLINE):
+            # 0) Снимок остатков доноров грузится параллельно с получением дефицита
+            snapshot_task = asyncio.create_task(self._load_donor_snapshot())
+            try:
+                # 1) Получаем дефицит
+                items = await self._fetch_and_filter_deficit(warehouse_id, bypass_filter)
+                if not items:
+                    logger.info("No items to process", extra={"extra": {"warehouse_id": warehouse_id}})
+                    await log_event(step="replenishment", status="END", details={"reason": "no_deficit", "warehouse_id": warehouse_id})
+                    return {"status": "success", "message": "No deficit found."}
+
+                # 2) Отсекаем товары, которые уже в пути, — до любых запросов к 1С по донорам
+                pending_ids = await self._load_pending_product_ids()
+                items = await self._exclude_pending(items, pending_ids)
+                if not items:
+                    logger.info("All deficit items already in transit", extra={"extra": {"warehouse_id": warehouse_id}})
+                    await log_event(step="replenishment", status="END", details={"reason": "all_pending", "warehouse_id": warehouse_id})
+                    return {"status": "success", "message": "All deficit items already have pending transfers."}
+
+                # 3) Ищем доноров и формируем outbox/events
+                self._donor_snapshot = await snapshot_task
+                await self._plan_transfers_or_orders(warehouse_id, items)
+                logger.info("END replenishment", extra={"extra": {"warehouse_id": warehouse_id}})
+                await log_event(step="replenishment", status="END", details={"warehouse_id": warehouse_id, "processed_items": len(items)})
+                return {"status": "success", "message": "Replenishment process finished."}
+
+            except Exception as e:
+                logger.error("Replenishment failed", extra={"extra": {"error": str(e), "warehouse_id": warehouse_id}}, exc_info=True)
+                await log_event(step="replenishment", status="ERROR", details={"error": str(e), "warehouse_id": warehouse_id})
+                return {"status": "error", "message": str(e)}
+            finally:
+                if not snapshot_task.done():
+                    snapshot_task.cancel()
+                self._donor_snapshot = None
+                self._ledger = None
+                self._queued_transfers, self._queued_orders = [], []
+                await self.one_s_client.close()
+                await self.ms_client.close()
 
     @log_step("replenishment.fetch_deficit")
     async def _fetch_and_filter_deficit(self, warehouse_id: str, bypass_filter: bool = False):
-        # Get MIN_DEFICIT threshold from environment
-        MIN_DEFICIT = int(os.getenv("MIN_DEFICIT", 1))
+        # Порог дефицита читается из настроек один раз при старте процесса
+        MIN_DEFICIT = settings.MIN_DEFICIT
         try:
             raw_items = await self.one_s_client.get_deficit_products(warehouse_id)
         except IntegrationError as e:
@@ -133,37 +151,9 @@ class ReplenishmentService:
             )
             return raw_items
 
-        # Enhanced filter tracking with detailed rejection reasons
-        rejections = []
-        kept = []
-
-        for idx, it in enumerate(raw_items):
-            reason = None
-            pid = it.get("id")
-            deficit = it.get("deficit")
-
-            # Check for missing or non-string ID
-            if not pid or not isinstance(pid, str):
-                reason = "missing_or_non_string_id"
-            # Check deficit is a number
-            elif not isinstance(deficit, (int, float)):
-                reason = "deficit_not_number"
-            # Check deficit meets minimum threshold
-            elif deficit < MIN_DEFICIT:
-                reason = "deficit_below_threshold"
-            # Additional domain validation checks
-            elif not it.get("name"):
-                reason = "missing_name"
-            elif "min_stock" not in it:
-                reason = "missing_min_stock"
-            elif "current_stock" not in it:
-                reason = "missing_current_stock"
-
-            if reason:
-                rejections.append({"idx": idx, "id": pid, "reason": reason})
-                continue
-
-            kept.append(it)
+        # Векторный фильтр: индексы оставленных элементов и полная гистограмма причин отбраковки
+        result = filter_deficit(raw_items, MIN_DEFICIT)
+        kept = [raw_items[i] for i in result.kept]
 
         # Quick tracing: log output after filtering
         await log_event(step="replenishment.filter_output", status="INFO",
@@ -176,26 +166,39 @@ class ReplenishmentService:
             details={
                 "total": len(raw_items),
                 "kept": len(kept),
-                "rejected": len(rejections),
+                "rejected": result.rejected,
                 "min_deficit": MIN_DEFICIT,
                 "mode": "normal",
-                "rejections_sample": rejections[:20],
+                "rejections_sample": result.rejections_sample(),
+                "rejections_by_reason": result.histogram,
             },
             message="Filter breakdown"
         )
 
         logger.info("Filter summary", extra={"extra": {
-            "total": len(raw_items), "kept": len(kept), "rejected": len(rejections)}})
+            "total": len(raw_items), "kept": len(kept), "rejected": result.rejected}})
         return kept
 
     @log_step("replenishment.plan")
     async def _plan_transfers_or_orders(self, warehouse_id: str, items: list[dict]):
+        # Фаза 1: остатки доноров — из снимка запуска; склады без полного снимка
+        # опрашиваются параллельно по списку дефицита.
+        # Фаза 2 (ниже): решения и постановка в очередь строго в порядке items.
+        snapshot = self._donor_snapshot or DonorStockSnapshot(self.DONOR_WAREHOUSES)
+        if self._ledger is None:
+            self._ledger = ReservationLedger()
+        missing = snapshot.missing()
+        if missing:
+            donor_stocks = await self._fetch_donor_stocks([it["id"] for it in items], missing)
+            for warehouse_name, stocks in donor_stocks.items():
+                snapshot.load(warehouse_name, stocks)
+
         for it in items:
             pid, need = it["id"], float(it["deficit"])
             logger.debug("plan:item", extra={"extra": {"product_id": pid, "need": need}})
 
             # 2.1 Проверка внутренних складов-доноров
-            donors = await self._check_internal_donors(pid, need)
+            donors = await self._check_internal_donors(pid, need, snapshot)
             if donors:
                 logger.info("plan:internal_transfer", extra={"extra": {"product_id": pid, "donors": donors}})
                 await self._enqueue_transfer_order(warehouse_id, pid, donors, need)
@@ -205,47 +208,239 @@ class ReplenishmentService:
             logger.info("plan:external_order", extra={"extra": {"product_id": pid, "quantity": need}})
             await self._enqueue_moysklad_order(pid, need)
 
-    @log_step("replenishment.check_donors")
-    async def _check_internal_donors(self, product_id: str, needed_qty: float):
-        # Проверка internal stockov
-        for warehouse_name, warehouse_id in self.DONOR_WAREHOUSES.items():
+        # Остаток пачек — в БД
+        await self._flush_enqueued()
+
+    @log_step("replenishment.load_active_transfers")
+    async def _load_pending_product_ids(self) -> set[str]:
+        """
+        Товары с активными перемещениями — одним запросом на запуск (для дедупликации).
+        Резервы доноров по ним не нужны: такие товары целиком отсекаются из дефицита.
+        """
+        stmt = (
+            select(PendingTransfer.product_id_1c)
+            .where(PendingTransfer.status.in_(self.ACTIVE_TRANSFER_STATUSES))
+            .distinct()
+        )
+        async with self.session.begin():
+            pending_ids = set((await self.session.execute(stmt)).scalars().all())
+
+        await log_event(step="replenishment.pending_loaded", status="INFO",
+                       details={"pending_products": len(pending_ids)})
+        return pending_ids
+
+    async def _exclude_pending(self, items: list[dict], pending_ids: set[str]) -> list[dict]:
+        """Убирает из дефицита товары с активным перемещением (проверка по множеству, без запросов)."""
+        if not pending_ids:
+            return items
+        kept = [it for it in items if it["id"] not in pending_ids]
+        skipped = len(items) - len(kept)
+        if skipped:
+            await log_event(step="replenishment.pending_filtered", status="INFO",
+                           details={"total": len(items), "skipped": skipped, "kept": len(kept),
+                                    "sample": [it["id"] for it in items if it["id"] in pending_ids][:20]})
+        return kept
+
+    @log_step("replenishment.donor_snapshot")
+    async def _load_donor_snapshot(self) -> DonorStockSnapshot:
+        """
+        Полный снимок остатков всех складов-доноров — один запрос к 1С на склад
+        за запуск, независимо от размера каталога. Склады, для которых 1С не отдает
+        полный остаток, остаются в snapshot.missing() и дозапрашиваются по списку дефицита.
+        """
+        snapshot = DonorStockSnapshot(self.DONOR_WAREHOUSES)
+
+        async def fetch(warehouse_name: str, warehouse_id: str):
+            try:
+                return await self.one_s_client.get_warehouse_stock(warehouse_id)
+            except (IntegrationError, httpx.HTTPError, ValueError) as e:
+                logger.warning("Failed to load donor stock snapshot",
+                               extra={"extra": {"warehouse": warehouse_name, "error": str(e)}})
+                return None
+
+        results = await asyncio.gather(*(fetch(name, wh_id) for name, wh_id in self.DONOR_WAREHOUSES.items()))
+        for warehouse_name, stocks in zip(self.DONOR_WAREHOUSES.keys(), results):
+            if stocks is not None:
+                snapshot.load(warehouse_name, stocks, complete=True)
+
+        await log_event(step="replenishment.donor_snapshot", status="INFO", external_system="ONEC",
+                       details=snapshot.summary())
+        return snapshot
+
+    @log_step("replenishment.fetch_donor_stocks")
+    async def _fetch_donor_stocks(self, product_ids: list[str],
+                                  warehouses: list[tuple[str, str]] | None = None) -> dict[str, dict[str, float]]:
+        """
+        Остатки товаров на складах-донорах: {имя склада: {product_id: остаток}}.
+
+        Все склады и порции товаров опрашиваются параллельно под общим семафором
+        REPLENISH_CONCURRENCY. Порядок ключей результата совпадает с порядком складов,
+        поэтому выбор донора не зависит от того, какой ответ пришел раньше.
+        """
+        warehouses = warehouses if warehouses is not None else list(self.DONOR_WAREHOUSES.items())
+        semaphore = asyncio.Semaphore(max(settings.REPLENISH_CONCURRENCY, 1))
+
+        async def probe(warehouse_name: str, warehouse_id: str) -> dict[str, float]:
             try:
-                available_stock = await self.one_s_client.get_stock_for_product(product_id, warehouse_id)
-                if available_stock >= needed_qty:
-                    await log_event(step="replenishment.donor_found", status="INFO", external_system="ONEC",
-                                   details={"product_id": product_id, "warehouse": warehouse_name, "available": available_stock})
-                    return [(warehouse_name, warehouse_id)]
-            except IntegrationError as e:
-                logger.error("Failed to check stock in donor warehouse",
-                           extra={"extra": {"product_id": product_id, "warehouse": warehouse_name, "error": str(e)}})
+                return await self.one_s_client.get_stocks_bulk(warehouse_id, product_ids, semaphore=semaphore)
+            except (IntegrationError, httpx.HTTPError, ValueError) as e:
+                logger.error("Failed to fetch stock in donor warehouse",
+                           extra={"extra": {"warehouse": warehouse_name, "products": len(product_ids), "error": str(e)}})
                 await log_event(step="replenishment.donor_check_failed", status="ERROR", external_system="ONEC",
-                               details={"product_id": product_id, "warehouse": warehouse_name, "error": str(e)})
-                # Продолжаем проверку следующих складов
+                               details={"warehouse": warehouse_name, "products": len(product_ids), "error": str(e)})
+                return {}
+
+        results = await asyncio.gather(*(probe(name, wh_id) for name, wh_id in warehouses))
+        return dict(zip((name for name, _ in warehouses), results))
+
+    @log_step("replenishment.check_donors")
+    async def _check_internal_donors(self, product_id: str, needed_qty: float, snapshot: DonorStockSnapshot):
+        # Проверка internal stockov — в порядке приоритета DONOR_WAREHOUSES
+        for warehouse_name, warehouse_id in self.DONOR_WAREHOUSES.items():
+            stock = snapshot.stock(product_id, warehouse_name)
+            if stock is None:
+                # Остаток по этому складу получить не удалось — переходим к следующему
                 continue
+            # За вычетом уже обещанного предыдущим позициям этого запуска
+            available_stock = self._ledger.available(stock, warehouse_id, product_id) if self._ledger else stock
+            if available_stock >= needed_qty:
+                await log_event(step="replenishment.donor_found", status="INFO", external_system="ONEC",
+                               details={"product_id": product_id, "warehouse": warehouse_name, "available": available_stock})
+                return [(warehouse_name, warehouse_id)]
         return []
 
     @log_step("replenishment.enqueue_transfer")
     async def _enqueue_transfer_order(self, target_warehouse_id: str, product_id: str, donors: list, quantity: float):
-        # Existing create_transfer_and_outbox_event logic but with enhanced logging
+        # Резервируем количество сразу, а запись в БД — пачками (см. _flush_transfers)
         warehouse_name, warehouse_id = donors[0]
-        await log_event(step="replenishment.transfer_queued", status="INFO", external_system="ONEC",
-                       details={"product_id": product_id, "source_warehouse": warehouse_name, "quantity": quantity})
-
-        # Call existing method
-        product = {"id": product_id, "name": f"Product-{product_id}"}  # Simplified for this step
-        await self.create_transfer_and_outbox_event(
-            product=product, quantity=quantity,
-            source_warehouse_id=warehouse_id, source_warehouse_name=warehouse_name
-        )
+        if self._ledger is not None:
+            self._ledger.reserve(warehouse_id, product_id, quantity)
+
+        self._queued_transfers.append({
+            "product": {"id": product_id, "name": f"Product-{product_id}"},  # Simplified for this step
+            "quantity": quantity,
+            "source_warehouse_id": warehouse_id,
+            "source_warehouse_name": warehouse_name,
+        })
+        if len(self._queued_transfers) >= self._enqueue_batch_size():
+            await self._flush_transfers()
 
     @log_step("replenishment.enqueue_moysklad_order")
     async def _enqueue_moysklad_order(self, product_id: str, quantity: float):
+        self._queued_orders.append({
+            "product": {"id": product_id, "name": f"Product-{product_id}"},  # Simplified for this step
+            "quantity": quantity,
+        })
+        if len(self._queued_orders) >= self._enqueue_batch_size():
+            await self._flush_orders()
+
+    @staticmethod
+    def _enqueue_batch_size() -> int:
+        return max(settings.REPLENISH_ENQUEUE_BATCH_SIZE, 1)
+
+    async def _flush_enqueued(self):
+        """Записывает все накопленные перемещения и внешние заказы."""
+        await self._flush_transfers()
+        await self._flush_orders()
+
+    async def _flush_transfers(self):
+        batch, self._queued_transfers = self._queued_transfers, []
+        if batch:
+            await self._write_transfer_batch(batch)
+
+    async def _flush_orders(self):
+        batch, self._queued_orders = self._queued_orders, []
+        if batch:
+            await self._write_order_batch(batch)
+
+    async def _write_transfer_batch(self, batch: list[dict]):
+        """
+        Одной транзакцией создает пачку записей pending_transfers и событий outbox_events.
+        ID генерируются на стороне клиента, поэтому flush для получения ID не нужен,
+        а строки уходят многострочными INSERT.
+        """
+        transfer_rows = []
+        event_rows = []
+        for entry in batch:
+            product = entry["product"]
+            transfer_id = uuid.uuid4()
+            transfer_rows.append({
+                "id": transfer_id,
+                "product_id_1c": product["id"],
+                "product_name": product["name"],
+                "quantity_requested": entry["quantity"],
+                "source_warehouse_id_1c": entry["source_warehouse_id"],
+                "source_warehouse_name": entry["source_warehouse_name"],
+                "status": "INITIATED",
+            })
+            event_rows.append({
+                "id": uuid.uuid4(),
+                "event_type": "CREATE_1C_TRANSFER",
+                "payload": {
+                    "fromWarehouseID": entry["source_warehouse_id"],
+                    "toWarehouseID": self.YURLOVSKIY_WAREHOUSE_ID,
+                    "products": [
+                        {"productID": product["id"], "quantity": float(entry["quantity"])}
+                    ],
+                },
+                "status": "PENDING",
+                "related_entity_id": str(transfer_id),
+            })
+
+        async with self.session.begin():
+            await self.session.execute(insert(PendingTransfer), transfer_rows)
+            await self.session.execute(insert(OutboxEvent), event_rows)
+
+        await log_event(step="replenishment.transfer_queued", status="INFO", external_system="ONEC",
+                       details={"count": len(batch),
+                                "product_ids": [entry["product"]["id"] for entry in batch],
+                                "quantity": sum(float(entry["quantity"]) for entry in batch)})
+
+    async def _write_order_batch(self, batch: list[dict]):
+        """Одной транзакцией создает пачку событий CREATE_MS_CUSTOMER_ORDER в outbox."""
+        event_rows = []
+        for entry in batch:
+            product = entry["product"]
+            product_id_ms = await self.one_s_client.get_moysklad_id_for_product(product["id"])
+            if not product_id_ms:
+                await self.logger.error(
+                    f"Для товара '{product['name']}' (1C ID: {product['id']}) не найден ID в МойСклад. Внешний заказ невозможен."
+                )
+                continue
+            event_rows.append({
+                "id": uuid.uuid4(),
+                "event_type": "CREATE_MS_CUSTOMER_ORDER",
+                "payload": self._customer_order_payload(product_id_ms, entry["quantity"]),
+                "status": "PENDING",
+                "related_entity_id": product["id"],  # В будущем заменим на ID из pending_supplier_orders
+            })
+
+        if not event_rows:
+            return
+        async with self.session.begin():
+            await self.session.execute(insert(OutboxEvent), event_rows)
+
         await log_event(step="replenishment.external_order_queued", status="INFO", external_system="MOYSKLAD",
-                       details={"product_id": product_id, "quantity": quantity})
+                       details={"count": len(event_rows),
+                                "product_ids": [row["related_entity_id"] for row in event_rows]})
 
-        # Call existing method
-        product = {"id": product_id, "name": f"Product-{product_id}"}  # Simplified for this step
-        await self.initiate_external_order(product=product, quantity_to_order=quantity)
+    def _customer_order_payload(self, product_id_ms: str, quantity) -> dict:
+        """Payload "Заказа покупателя" МойСклад для одного товара."""
+        product_meta_href = f"{self.ms_client.BASE_API_URL}entity/product/{product_id_ms}"
+        org_meta_href = f"{self.ms_client.BASE_API_URL}entity/organization/{settings.MOYSKLAD_ORG_UUID}"
+        agent_meta_href = f"{self.ms_client.BASE_API_URL}entity/counterparty/{settings.MOYSKLAD_AGENT_UUID}"
+
+        return {
+            "organization": {"meta": {"href": org_meta_href, "type": "organization"}},
+            "agent": {"meta": {"href": agent_meta_href, "type": "counterparty"}},
+            "positions": [
+                {
+                    "quantity": quantity,
+                    "price": 0,
+                    "assortment": {"meta": {"href": product_meta_href, "type": "product"}},
+                }
+            ],
+        }
 
     async def create_transfer_and_outbox_event(
         self, product, quantity, source_warehouse_id, source_warehouse_name
@@ -253,35 +448,12 @@ class ReplenishmentService:
         """
         В одной транзакции создает запись в pending_transfers и событие в outbox_events.
         """
-        async with self.session.begin():  # Начинаем транзакцию
-            # 1. Создаем запись о будущем перемещении
-            new_transfer = PendingTransfer(
-                product_id_1c=product["id"],
-                product_name=product["name"],
-                quantity_requested=quantity,
-                source_warehouse_id_1c=source_warehouse_id,
-                source_warehouse_name=source_warehouse_name,
-                status="INITIATED",
-            )
-            self.session.add(new_transfer)
-            await self.session.flush()  # Получаем ID для new_transfer
-
-            # 2. Создаем событие для отправки в 1С
-            outbox_payload = {
-                "fromWarehouseID": source_warehouse_id,
-                "toWarehouseID": self.YURLOVSKIY_WAREHOUSE_ID,
-                "products": [
-                    {"productID": product["id"], "quantity": float(quantity)}
-                ],
-            }
-
-            new_event = OutboxEvent(
-                event_type="CREATE_1C_TRANSFER",
-                payload=outbox_payload,
-                related_entity_id=str(new_transfer.id),
-            )
-            self.session.add(new_event)
-        # Транзакция коммитится автоматически при выходе из `async with`
+        await self._write_transfer_batch([{
+            "product": product,
+            "quantity": quantity,
+            "source_warehouse_id": source_warehouse_id,
+            "source_warehouse_name": source_warehouse_name,
+        }])
 
     async def initiate_external_order(self, product, quantity_to_order):
         """
@@ -296,24 +468,10 @@ class ReplenishmentService:
             )
             return
 
-        # Шаг 3: Формируем payload для "Заказа покупателя"
-        product_meta_href = f"{self.ms_client.BASE_API_URL}entity/product/{product_id_ms}"
-        org_meta_href = f"{self.ms_client.BASE_API_URL}entity/organization/{settings.MOYSKLAD_ORG_UUID}"
-        agent_meta_href = f"{self.ms_client.BASE_API_URL}entity/counterparty/{settings.MOYSKLAD_AGENT_UUID}"
-
-        outbox_payload = {
-            "organization": {"meta": {"href": org_meta_href, "type": "organization"}},
-            "agent": {"meta": {"href": agent_meta_href, "type": "counterparty"}},
-            "positions": [
-                {
-                    "quantity": quantity_to_order,
-                    "price": 0,
-                    "assortment": {"meta": {"href": product_meta_href, "type": "product"}},
-                }
-            ],
-        }
+        # Шаг 2: Формируем payload для "Заказа покупателя"
+        outbox_payload = self._customer_order_payload(product_id_ms, quantity_to_order)
 
-        # Шаг 4: Атомарно создаем событие в outbox
+        # Шаг 3: Атомарно создаем событие в outbox
         async with self.session.begin():
             new_event = OutboxEvent(
                 event_type="CREATE_MS_CUSTOMER_ORDER",
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, Tuple
+
+
+class DonorStockSnapshot:
+    """
+    Снимок остатков складов-доноров на время одного запуска пополнения.
+
+    Индекс `product_id -> [остаток по каждому донору]` хранит одну строку на товар,
+    столбцы идут в порядке приоритета складов. Поиск донора для товара — одна
+    операция со словарем вместо HTTP-запросов к 1С.
+
+    Склад, загруженный полным снимком (`complete=True`), считает отсутствующий
+    товар нулевым остатком. Для склада, по которому загружена только часть товаров
+    (пакетный запрос по списку дефицита), отсутствующий товар — неизвестный остаток.
+    """
+
+    __slots__ = ("warehouses", "_columns", "_index", "_loaded", "_complete")
+
+    def __init__(self, warehouses: Dict[str, str]):
+        self.warehouses: Tuple[Tuple[str, str], ...] = tuple(warehouses.items())
+        self._columns = {name: i for i, (name, _) in enumerate(self.warehouses)}
+        self._index: Dict[str, List[float | None]] = {}
+        self._loaded: set[str] = set()
+        self._complete: set[str] = set()
+
+    def load(self, warehouse_name: str, stocks: Dict[str, float], complete: bool = False):
+        """Загружает остатки одного склада в индекс."""
+        col = self._columns[warehouse_name]
+        width = len(self.warehouses)
+        for product_id, qty in stocks.items():
+            row = self._index.get(product_id)
+            if row is None:
+                row = self._index[product_id] = [None] * width
+            row[col] = float(qty)
+        self._loaded.add(warehouse_name)
+        if complete:
+            self._complete.add(warehouse_name)
+
+    def missing(self) -> List[Tuple[str, str]]:
+        """Склады без полного снимка — по ним нужен запрос по списку товаров."""
+        return [(name, wh_id) for name, wh_id in self.warehouses if name not in self._complete]
+
+    def stock(self, product_id: str, warehouse_name: str) -> float | None:
+        """Остаток товара на складе; None — если остаток неизвестен."""
+        row = self._index.get(product_id)
+        qty = row[self._columns[warehouse_name]] if row is not None else None
+        if qty is None and warehouse_name in self._complete:
+            return 0.0
+        return qty
+
+    def product_ids(self) -> Iterable[str]:
+        return self._index.keys()
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "products": len(self._index),
+            "complete": sorted(self._complete),
+            "partial": sorted(self._loaded - self._complete),
+        }
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class ReservationLedger:
+    """
+    Учет количества, уже обещанного со складов-доноров за один запуск.
+
+    Пополняется по мере того, как запуск назначает количества товарам. Доступный
+    остаток донора = остаток из снимка минус резерв, поэтому товар, который встречается
+    в дефиците несколько раз, не получает одну и ту же единицу дважды, а повторных
+    запросов к 1С не нужно. Товары с активными перемещениями сюда не попадают —
+    они отсекаются из дефицита до планирования.
+    """
+
+    __slots__ = ("_reserved",)
+
+    def __init__(self):
+        self._reserved: Dict[Tuple[str, str], float] = {}
+
+    def reserve(self, warehouse_id: str, product_id: str, quantity: float):
+        key = (warehouse_id, product_id)
+        self._reserved[key] = self._reserved.get(key, 0.0) + float(quantity)
+
+    def reserved(self, warehouse_id: str, product_id: str) -> float:
+        return self._reserved.get((warehouse_id, product_id), 0.0)
+
+    def available(self, stock: float, warehouse_id: str, product_id: str) -> float:
+        return stock - self.reserved(warehouse_id, product_id)
+
+    def total(self) -> float:
+        return sum(self._reserved.values())
+
+    def __len__(self) -> int:
+        return len(self._reserved)
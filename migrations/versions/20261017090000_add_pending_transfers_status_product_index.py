@@ -0,0 +1,26 @@
+"""add composite (status, product_id_1c) index to pending_transfers
+
+Revision ID: 20261017090000
+Revises: 20250923140000
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017090000"
+down_revision = "20250923140000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Dedup of active transfers filters on status and reads only product_id_1c
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_pending_transfers_status_product_id_1c "
+        "ON pending_transfers (status, product_id_1c);"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_pending_transfers_status_product_id_1c", table_name="pending_transfers")
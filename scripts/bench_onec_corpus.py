@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Базовый замер нормализатора 1С на сгенерированном корпусе (tests/benchmarks/onec_corpus.py):
+пропускная способность (лучший из --repeat проходов, gc выключен) и пиковая память
+прохода (tracemalloc) для parse_1c_response, normalize_deficit_payload, parse_1c_json
+и normalize_stock по всем формам ответов.
+
+Запуск:
+  python scripts/bench_onec_corpus.py --save              # записать базовый замер
+  python scripts/bench_onec_corpus.py --compare           # сравнить с сохраненным
+  python scripts/bench_onec_corpus.py --sizes 1000000     # полный корпус (нужно несколько ГБ памяти)
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.integrations.onec_json_normalizer import JSON_BACKEND
+from tests.benchmarks.onec_corpus import benchmark_cases, payload_bytes
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = ROOT / "tests" / "benchmarks" / "onec_normalizer_baseline.json"
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def peak_memory(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, repeat: int) -> dict:
+    results = {}
+    for name, n, payload, fn in benchmark_cases(sizes):
+        seconds = best_of(fn, repeat if n < 100_000 else 1)
+        key = f"{name}-{n}"
+        results[key] = {
+            "items": n,
+            "bytes": payload_bytes(payload),
+            "seconds": round(seconds, 6),
+            "items_per_second": round(n / seconds),
+            "peak_memory_bytes": peak_memory(fn),
+        }
+        print(f"{key:<48} {seconds * 1000:>10.1f} ms {n / seconds:>12,.0f} items/s "
+              f"{results[key]['peak_memory_bytes'] / 2**20:>9.1f} MiB peak", flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    regressions = 0
+    print(f"\nvs baseline {baseline['meta']['created']} (tolerance {tolerance:.0%}):")
+    for key, cur in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        t = cur["seconds"] / base["seconds"]
+        m = cur["peak_memory_bytes"] / base["peak_memory_bytes"] if base["peak_memory_bytes"] else 1.0
+        slow = t > 1 + tolerance or m > 1 + tolerance
+        regressions += slow
+        print(f"{key:<48} time x{t:.2f}  memory x{m:.2f}{'  REGRESSION' if slow else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="записать результат как базовый замер")
+    parser.add_argument("--compare", action="store_true", help="сравнить с базовым замером")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление/рост памяти")
+    args = parser.parse_args()
+
+    results = run(tuple(int(s) for s in args.sizes.split(",")), args.repeat)
+
+    if args.save:
+        args.baseline.write_text(json.dumps({
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "json_backend": JSON_BACKEND,
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nbaseline saved to {args.baseline}")
+    if args.compare:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
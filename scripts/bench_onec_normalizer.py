@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Замер скорости normalize_deficit_payload на больших ответах 1С /deficit:
+быстрый путь (скомпилированная карта алиасов по форме элемента) против
+толерантного разбора (цепочка сравнений k.lower() на каждый ключ), а также
+разбор с выученной формой ответа маршрута (normalize_deficit_learned).
+
+Запуск: python scripts/bench_onec_normalizer.py [--items 100000] [--repeat 3]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.integrations.onec_json_normalizer import (
+    _deficit_items,
+    _normalize_deficit_item,
+    normalize_deficit_payload,
+    parse_1c_response,
+)
+from app.integrations.onec_shape_cache import normalize_deficit_learned
+
+
+def build_payloads(n: int) -> dict[str, str]:
+    canonical = [
+        {"id": f"00000000-0000-4000-8000-{i:012d}", "name": f"Товар {i}", "sku": f"AV-{i:05d}",
+         "min_stock": 10, "max_stock": 20, "current_stock": i % 12}
+        for i in range(n)
+    ]
+    russian = [
+        {"productID": f"00000000-0000-4000-8000-{i:012d}", "Наименование": f"Товар {i}",
+         "Артикул": f"AV-{i:05d}", "МинимальныйЗапас": "10", "Остаток": str(i % 12)}
+        for i in range(n)
+    ]
+    return {
+        "canonical": json.dumps(canonical, ensure_ascii=False),
+        "aliases": json.dumps({"items": russian}, ensure_ascii=False),
+    }
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def map_items(items: list, fast: bool) -> list:
+    return [_normalize_deficit_item(item, False, fast) for item in items]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for shape, text in build_payloads(args.items).items():
+        items = _deficit_items(parse_1c_response(text))
+        for stage in ("mapping", "total"):
+            timings = {}
+            for mode, fast in (("tolerant", False), ("fast", True)):
+                if stage == "mapping":
+                    fn = partial(map_items, items, fast)
+                else:
+                    os.environ["ONEC_NORMALIZE_FAST_PATH"] = "true" if fast else "false"
+                    fn = partial(normalize_deficit_payload, text)
+                timings[mode] = best_of(fn, args.repeat)
+            print(
+                f"{shape:>10} {stage:>7}: {args.items} items  tolerant {timings['tolerant']:.3f}s  "
+                f"fast {timings['fast']:.3f}s  speedup x{timings['tolerant'] / timings['fast']:.2f}"
+            )
+
+        normalize_deficit_learned(text, shape)  # learn the shape
+        learned = best_of(partial(normalize_deficit_learned, text, shape), args.repeat)
+        print(f"{shape:>10} learned: {args.items} items  {learned:.3f}s  "
+              f"vs fast x{timings['fast'] / learned:.2f}")
+
+if __name__ == "__main__":
+    main()
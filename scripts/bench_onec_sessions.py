@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Замер задержки запросов к HTTP-сервису 1С без сеансов (каждый запрос открывает
+и закрывает сеанс информационной базы с лицензией) и с повторным использованием
+сеансов IBSession (ONEC_SESSION_REUSE). Работает против реальной базы из .env
+(API_1C_URL, API_1C_USER, API_1C_PASSWORD); для режима сеансов в default.vrd
+публикации должно быть <httpServices reuseSessions="use" .../>.
+
+Запуск: python scripts/bench_onec_sessions.py --warehouse <uuid> --product <id> [--requests 200] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings
+from app.integrations import adaptive_limit, onec_session
+from app.integrations.one_s_client import OneSApiClient
+
+
+async def run_mode(reuse: bool, args) -> list[float]:
+    settings.ONEC_SESSION_REUSE = reuse
+    settings.ONEC_SESSION_POOL_SIZE = args.concurrency
+    onec_session.reset_session_pools()
+    adaptive_limit.reset_concurrency_limiters()
+    client = OneSApiClient()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await client.get_stock_for_product(args.product, args.warehouse)
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        await one()  # прогрев: соединение и (в режиме сеансов) первый сеанс
+        latencies.clear()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        if reuse:
+            print(f"  sessions: {client._sessions.stats()}")
+            await client.finish_sessions()
+    finally:
+        await client.close()
+    return latencies
+
+
+def summary(name: str, latencies: list[float], wall: float) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"{name:>9}: {len(latencies)} requests  mean {statistics.mean(latencies) * 1000:.1f} ms  "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms  "
+            f"{len(latencies) / wall:.1f} req/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--warehouse", required=True)
+    parser.add_argument("--product", required=True)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    for name, reuse in (("stateless", False), ("sessions", True)):
+        started = time.perf_counter()
+        latencies = await run_mode(reuse, args)
+        print(summary(name, latencies, time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,11 @@
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+    """Бенчмарки не входят в обычный прогон тестов — только с --benchmark-only."""
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
@@ -0,0 +1,114 @@
+# tests/benchmarks/onec_corpus.py
+# Generated 1C response corpus for normalizer benchmarks: the same deficit rows rendered
+# in every shape the normalizer accepts. Deterministic for a given size, so timings
+# from different versions are comparable.
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+DEFICIT_SHAPES = ("plain", "xdto", "name_value", "numeric_keys", "kv_lines", "double_encoded")
+# parse_1c_json expects JSON; key=value text is not part of its contract
+JSON_SHAPES = tuple(s for s in DEFICIT_SHAPES if s != "kv_lines")
+STOCK_SHAPES = ("number", "plain", "russian", "xdto", "list", "kv")
+
+
+def _row(i: int) -> Dict[str, Any]:
+    return {
+        "id": f"00000000-0000-4000-8000-{i:012d}",
+        "name": f"Товар {i}",
+        "sku": f"AV-{i:05d}",
+        "min_stock": 10 + i % 5,
+        "max_stock": 30,
+        "current_stock": round((i % 17) * 0.5, 1),
+    }
+
+
+def _xdto_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, str):
+        return {"#type": "jxs:string", "#value": v}
+    return {"#type": "jxs:decimal", "#value": v}
+
+
+def _render(shape: str, rows: List[Dict[str, Any]]) -> str:
+    if shape == "plain":
+        return json.dumps(rows, ensure_ascii=False)
+    if shape == "xdto":
+        return json.dumps({"#type": "jv8:Array", "#value": [
+            {"#type": "jv8:Structure", "#value": [
+                {"name": {"#type": "jxs:string", "#value": k}, "Value": _xdto_value(v)} for k, v in row.items()
+            ]} for row in rows
+        ]}, ensure_ascii=False)
+    if shape == "name_value":
+        return json.dumps([[{"name": k, "Value": v} for k, v in row.items()] for row in rows], ensure_ascii=False)
+    if shape == "numeric_keys":
+        return json.dumps({str(i): row for i, row in enumerate(rows)}, ensure_ascii=False)
+    if shape == "kv_lines":
+        return "\n".join(", ".join(f"{k}={v}" for k, v in row.items()) for row in rows)
+    if shape == "double_encoded":
+        return json.dumps(json.dumps(rows, ensure_ascii=False), ensure_ascii=False)
+    raise ValueError(f"unknown deficit shape: {shape}")
+
+
+@lru_cache(maxsize=8)
+def deficit_payload(shape: str, n: int) -> str:
+    """Тело ответа /deficit из n товаров в форме shape."""
+    return _render(shape, [_row(i) for i in range(n)])
+
+
+def _stock_text(shape: str, i: int) -> str:
+    qty = round((i % 23) * 1.5, 1)
+    if shape == "number":
+        return str(qty)
+    if shape == "plain":
+        return json.dumps({"productID": _row(i)["id"], "stock": qty})
+    if shape == "russian":
+        return json.dumps({"Номенклатура": _row(i)["id"], "Остаток": str(qty)}, ensure_ascii=False)
+    if shape == "xdto":
+        return json.dumps({"#type": "jv8:Structure", "#value": [
+            {"name": {"#value": "Остаток"}, "Value": {"#type": "jxs:decimal", "#value": qty}}
+        ]}, ensure_ascii=False)
+    if shape == "list":
+        return json.dumps([{"stock": qty}])
+    if shape == "kv":
+        return f"productID={_row(i)['id']}, stock={qty}"
+    raise ValueError(f"unknown stock shape: {shape}")
+
+
+@lru_cache(maxsize=8)
+def stock_payloads(shape: str, n: int) -> Tuple[str, ...]:
+    """n отдельных ответов /stock в форме shape — normalize_stock разбирает по одному."""
+    return tuple(_stock_text(shape, i) for i in range(n))
+
+
+def payload_bytes(payload: str | Tuple[str, ...]) -> int:
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return sum(len(p.encode("utf-8")) for p in payload)
+
+
+def benchmark_cases(sizes: Tuple[int, ...]):
+    """
+    (name, n, payload, fn) для матрицы замеров: parse_1c_response и normalize_deficit_payload —
+    по всем формам /deficit, parse_1c_json — по JSON-формам, normalize_stock — по n ответам /stock.
+    fn() выполняет один полный проход по payload.
+    """
+    from app.integrations.onec_json_normalizer import (
+        normalize_deficit_payload,
+        normalize_stock,
+        parse_1c_json,
+        parse_1c_response,
+    )
+
+    for n in sizes:
+        for shape in DEFICIT_SHAPES:
+            text = deficit_payload(shape, n)
+            yield f"parse_1c_response[{shape}]", n, text, lambda t=text: parse_1c_response(t)
+            yield f"normalize_deficit_payload[{shape}]", n, text, lambda t=text: normalize_deficit_payload(t)
+            if shape in JSON_SHAPES:
+                yield f"parse_1c_json[{shape}]", n, text, lambda t=text: parse_1c_json(t)
+        for shape in STOCK_SHAPES:
+            texts = stock_payloads(shape, n)
+            yield f"normalize_stock[{shape}]", n, texts, lambda ts=texts: [normalize_stock(t) for t in ts]
@@ -0,0 +1,49 @@
+"""
+Бенчмарки нормализатора 1С на сгенерированном корпусе (tests/benchmarks/onec_corpus.py).
+
+Запуск: pytest tests/benchmarks --benchmark-only [--benchmark-save=<версия>] [--benchmark-compare]
+Размеры — ONEC_BENCH_SIZES (по умолчанию 1000,10000; полный корпус: 1000,10000,100000,1000000).
+Пиковая память прохода (tracemalloc) и пропускная способность пишутся в extra_info.
+Сохраненный базовый замер и сравнение без pytest-benchmark — scripts/bench_onec_corpus.py.
+"""
+import os
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from tests.benchmarks.onec_corpus import benchmark_cases, payload_bytes
+
+SIZES = tuple(int(s) for s in os.getenv("ONEC_BENCH_SIZES", "1000,10000").split(","))
+CASES = [(name, n) for name, n, _, _ in benchmark_cases(SIZES)]
+
+
+def _case(name: str, n: int):
+    for case_name, case_n, payload, fn in benchmark_cases((n,)):
+        if case_name == name:
+            return payload, fn
+    raise LookupError(name)
+
+
+def _peak_memory(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("name,n", CASES, ids=[f"{name}-{n}" for name, n in CASES])
+def test_normalizer_throughput(benchmark, name, n):
+    payload, fn = _case(name, n)
+    benchmark.group = f"{name.split('[')[0]}-{n}"
+    benchmark.extra_info["items"] = n
+    benchmark.extra_info["bytes"] = payload_bytes(payload)
+    benchmark.extra_info["peak_memory_bytes"] = _peak_memory(fn)
+
+    benchmark.pedantic(fn, rounds=max(1, min(5, 100_000 // n)), iterations=1, warmup_rounds=1 if n <= 10_000 else 0)
+
+    mean = benchmark.stats.stats.mean
+    benchmark.extra_info["items_per_second"] = round(n / mean) if mean else None
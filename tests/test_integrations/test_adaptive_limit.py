@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.integrations import adaptive_limit, circuit_breaker, retry
+from app.integrations.adaptive_limit import AdaptiveConcurrencyLimiter
+from app.integrations.one_s_client import OneSApiClient
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_ATTEMPTS", 1)
+    adaptive_limit.reset_concurrency_limiters()
+    circuit_breaker.reset_circuits()
+    retry.reset_retry_budgets()
+    yield
+    adaptive_limit.reset_concurrency_limiters()
+    circuit_breaker.reset_circuits()
+    retry.reset_retry_budgets()
+
+
+def _limiter(**kwargs) -> AdaptiveConcurrencyLimiter:
+    params = {"initial": 2, "minimum": 1, "maximum": 8, "latency_target": 1.0}
+    params.update(kwargs)
+    return AdaptiveConcurrencyLimiter("test", **params)
+
+
+async def _use(limiter: AdaptiveConcurrencyLimiter, overloaded: bool):
+    async with limiter.slot() as slot:
+        slot.overloaded = overloaded
+
+
+@pytest.mark.asyncio
+async def test_limit_bounds_in_flight_requests():
+    limiter = _limiter(initial=2)
+    peak = []
+    release = asyncio.Event()
+
+    async def worker():
+        async with limiter.slot() as slot:
+            peak.append(limiter.in_flight)
+            await release.wait()
+            slot.overloaded = False
+
+    tasks = [asyncio.create_task(worker()) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert limiter.in_flight == 2 and limiter.stats()["waiting"] == 3
+    release.set()
+    await asyncio.gather(*tasks)
+    assert max(peak) == 2 and limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_additive_increase_when_saturated():
+    limiter = _limiter(initial=1)
+    for _ in range(3):
+        await _use(limiter, overloaded=False)
+    # Лимит 1 выбирался полностью: +1 за окно из `limit` успешных ответов
+    assert limiter.current_limit == 2
+    assert limiter.increases >= 1
+
+
+@pytest.mark.asyncio
+async def test_multiplicative_decrease_once_per_latency_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(adaptive_limit, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    limiter = _limiter(initial=8)
+    await _use(limiter, overloaded=True)
+    assert limiter.current_limit == 4
+    # Второй сбой той же волны (в пределах сглаженной задержки) лимит не трогает
+    await _use(limiter, overloaded=True)
+    assert limiter.current_limit == 4
+    now[0] += 1.0
+    await _use(limiter, overloaded=True)
+    assert limiter.current_limit == 2
+    assert limiter.stats()["overloads"] == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    limiter = _limiter(initial=1, maximum=1)
+    async with limiter.slot():
+        waiter = asyncio.create_task(_use(limiter, overloaded=False))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    assert limiter.in_flight == 0
+    await _use(limiter, overloaded=False)
+
+
+@pytest.mark.asyncio
+async def test_onec_client_feeds_limiter():
+    def handler(request):
+        if request.url.path.endswith("/broken"):
+            return httpx.Response(503)
+        return httpx.Response(200, json={"stock": 3})
+
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(handler))
+    assert await client.get_stock_for_product("p1", "wh") == 3.0
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.get_stock_for_product("broken", "wh")
+    await client.close()
+
+    stats = adaptive_limit.concurrency_stats()["onec"]
+    assert stats["in_flight"] == 0
+    assert stats["overloads"] == 1 and stats["decreases"] == 1
+    assert stats["latency_ewma_ms"] is not None
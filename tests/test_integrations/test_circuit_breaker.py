@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.integrations import base_client, circuit_breaker, retry
+from app.integrations.base_client import BaseApiClient
+from app.integrations.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, route_of
+from app.integrations.onec_json_normalizer import IntegrationError
+
+
+def _client(handler, base_url: str = "http://upstream.test/") -> BaseApiClient:
+    client = BaseApiClient(base_url, client=httpx.AsyncClient(base_url=base_url, transport=httpx.MockTransport(handler)))
+    client._owns_client = True
+    return client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def _breaker_settings(monkeypatch):
+    async def fake_sleep(delay):
+        pass
+
+    transitions = []
+
+    async def fake_log_event(**kwargs):
+        transitions.append(kwargs)
+
+    monkeypatch.setattr(base_client.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(base_client, "log_event", fake_log_event)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_ATTEMPTS", 1)
+    monkeypatch.setattr(retry.settings, "CIRCUIT_BREAKER_ENABLED", True)
+    monkeypatch.setattr(retry.settings, "CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(retry.settings, "CIRCUIT_RESET_TIMEOUT", 30.0)
+    monkeypatch.setattr(retry.settings, "CIRCUIT_HALF_OPEN_MAX_CALLS", 1)
+    circuit_breaker.reset_circuits()
+    retry.reset_retry_budgets()
+    yield transitions
+    circuit_breaker.reset_circuits()
+    retry.reset_retry_budgets()
+
+
+def test_route_of_collapses_identifiers():
+    assert route_of("stock/c7e8e58f-49b7-11e6-8a7c-0025903e6d16/AV-04362") == "stock/{id}/{id}"
+    assert route_of("/stock/wh-1/bulk?x=1") == "stock/{id}/bulk"
+    assert route_of("entity/customerorder") == "entity/customerorder"
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast(_breaker_settings, clock):
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(503)
+
+    client = _client(handler)
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            await client._request("GET", "deficit/wh-1")
+    with pytest.raises(CircuitOpenError) as err:
+        await client._request("GET", "deficit/wh-2")
+    await client.close()
+
+    assert isinstance(err.value, IntegrationError)
+    assert len(calls) == 3
+    assert [t["status"] for t in _breaker_settings] == [OPEN]
+    assert _breaker_settings[0]["step"] == "http.circuit"
+    assert _breaker_settings[0]["details"]["route"] == "deficit/{id}"
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_circuit(_breaker_settings, clock):
+    healthy = [False]
+
+    def handler(request):
+        return httpx.Response(200, json={}) if healthy[0] else httpx.Response(500)
+
+    client = _client(handler)
+    for _ in range(3):
+        await client._send("GET", "orders/transfer")
+
+    clock[0] += 31
+    healthy[0] = True
+    response = await client._send("GET", "orders/transfer")
+    await client.close()
+
+    assert response.status_code == 200
+    assert [t["status"] for t in _breaker_settings] == [OPEN, HALF_OPEN, CLOSED]
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens(_breaker_settings, clock):
+    client = _client(lambda request: httpx.Response(502))
+    for _ in range(3):
+        await client._send("GET", "orders/transfer")
+    clock[0] += 31
+    await client._send("GET", "orders/transfer")
+    with pytest.raises(CircuitOpenError):
+        await client._send("GET", "orders/transfer")
+    await client.close()
+    assert [t["status"] for t in _breaker_settings] == [OPEN, HALF_OPEN, OPEN]
+
+
+def test_half_open_admits_limited_probes(clock):
+    breaker = circuit_breaker.CircuitBreaker("u", "r", failure_threshold=1, reset_timeout=10.0, half_open_max_calls=1)
+    breaker.on_failure()
+    clock[0] += 11
+    assert breaker.before_call() == (OPEN, HALF_OPEN)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release()
+    assert breaker.before_call() is None
+
+
+@pytest.mark.asyncio
+async def test_client_errors_and_other_routes_do_not_trip(_breaker_settings):
+    def handler(request):
+        return httpx.Response(404 if "missing" in request.url.path else 503)
+
+    client = _client(handler)
+    for _ in range(5):
+        await client._send("GET", "missing")
+    for _ in range(3):
+        await client._send("GET", "deficit/wh-1")
+    response = await client._send("GET", "missing")
+    await client.close()
+    assert response.status_code == 404
+    assert circuit_breaker.circuit_stats()["http://upstream.test/ missing"]["state"] == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_stops_retry_loop(monkeypatch):
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_ATTEMPTS", 10)
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(500)
+
+    client = _client(handler)
+    await client._send("GET", "deficit/wh-1")
+    await client.close()
+    assert len(calls) == 3
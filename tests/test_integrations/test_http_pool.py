@@ -0,0 +1,77 @@
+import httpx
+import pytest
+
+from app.integrations.http_pool import HttpClientRegistry, _pool_usage, http_clients
+from app.integrations.one_s_client import OneSApiClient
+
+
+@pytest.mark.asyncio
+async def test_registry_returns_same_client_per_upstream():
+    """Один upstream — один общий клиент с keep-alive пулом."""
+    registry = HttpClientRegistry()
+    registry.open()
+
+    first = registry.get("onec", base_url="https://onec.example.com/")
+    second = registry.get("onec", base_url="https://onec.example.com/")
+    other = registry.get("moysklad", base_url="https://ms.example.com/")
+
+    assert first is second
+    assert first is not other
+
+    stats = registry.stats()
+    assert set(stats) == {"onec", "moysklad"}
+    assert stats["onec"]["connections"] == 0
+    assert stats["onec"]["requests"] == 0
+
+    await registry.aclose()
+    assert first.is_closed
+    assert not registry.is_open
+
+
+@pytest.mark.asyncio
+async def test_pool_usage_tolerates_unknown_transport_internals():
+    """Без ожидаемых внутренностей httpcore поля занятости пула — None, а не исключение."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    assert set(_pool_usage(client).values()) == {None}
+
+    class OddPool:
+        connections = [type("Conn", (), {"is_idle": True})()]
+        _requests = object()  # без len()
+
+    client._transport._pool = OddPool()
+    usage = _pool_usage(client)
+    assert (usage["connections"], usage["idle_connections"], usage["queued_requests"]) == (1, 1, None)
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_registry_http2_falls_back_without_h2(monkeypatch):
+    """HTTP/2 без пакета h2 откатывается на HTTP/1.1, а не падает."""
+    monkeypatch.setattr("app.integrations.http_pool._h2_available", lambda: False)
+    registry = HttpClientRegistry()
+    registry.open()
+
+    registry.get("moysklad", base_url="https://ms.example.com/", http2=True)
+    assert registry.stats()["moysklad"]["http2"] is False
+
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_onec_client_uses_shared_pool_when_registry_open():
+    """Клиент 1С не закрывает общий пул в close()."""
+    http_clients.open()
+    try:
+        client_a = OneSApiClient()
+        client_b = OneSApiClient()
+        assert client_a.client is client_b.client
+
+        await client_a.close()
+        assert not client_b.client.is_closed
+    finally:
+        await http_clients.aclose()
+
+    standalone = OneSApiClient()
+    assert standalone.client is not client_a.client
+    await standalone.close()
+    assert standalone.client.is_closed
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.integrations.one_s_client import OneSApiClient
+
+
+def _client_with_transport(handler) -> OneSApiClient:
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(
+        base_url=client.client.base_url,
+        transport=httpx.MockTransport(handler),
+    )
+    return client
+
+
+@pytest.fixture(autouse=True)
+def _reset_route_support():
+    OneSApiClient._bulk_stock_unsupported.clear()
+    OneSApiClient._warehouse_stock_unsupported.clear()
+    yield
+    OneSApiClient._bulk_stock_unsupported.clear()
+    OneSApiClient._warehouse_stock_unsupported.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_stocks_bulk_uses_batch_route(monkeypatch):
+    """Пакетный маршрут: порции по ONEC_STOCK_BATCH_SIZE, отсутствующие товары — 0."""
+    monkeypatch.setattr("app.integrations.one_s_client.settings.ONEC_STOCK_BATCH_SIZE", 2)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        calls.append((request.method, request.url.path, body["products"]))
+        rows = [{"productID": pid, "stock": 5} for pid in body["products"] if pid != "p3"]
+        return httpx.Response(200, json=rows)
+
+    client = _client_with_transport(handler)
+    result = await client.get_stocks_bulk("wh-1", ["p1", "p2", "p3", "p1"])
+    await client.close()
+
+    assert result == {"p1": 5.0, "p2": 5.0, "p3": 0.0}
+    assert [c[2] for c in calls] == [["p1", "p2"], ["p3"]]
+    assert all(c[0] == "POST" and c[1].endswith("/stock/wh-1/bulk") for c in calls)
+
+
+@pytest.mark.asyncio
+async def test_get_stocks_bulk_falls_back_to_single_calls():
+    """Без пакетного маршрута — поштучные GET stock/{wh}/{pid}, маршрут больше не пробуем."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if request.method == "POST":
+            return httpx.Response(404)
+        pid = request.url.path.rsplit("/", 1)[-1]
+        if pid == "broken":
+            return httpx.Response(400, text="bad")
+        return httpx.Response(200, json={"stock": 3})
+
+    client = _client_with_transport(handler)
+    first = await client.get_stocks_bulk("wh-1", ["p1", "p2", "broken"])
+    second = await client.get_stocks_bulk("wh-1", ["p1"])
+    await client.close()
+
+    assert first == {"p1": 3.0, "p2": 3.0}
+    assert second == {"p1": 3.0}
+    assert sum(1 for m, _ in calls if m == "POST") == 1
+
+
+@pytest.mark.asyncio
+async def test_get_stocks_bulk_chunks_run_in_parallel_under_semaphore(monkeypatch):
+    """Порции после первой идут параллельно, но не больше лимита семафора."""
+    monkeypatch.setattr("app.integrations.one_s_client.settings.ONEC_STOCK_BATCH_SIZE", 1)
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        pid = json.loads(request.content)["products"][0]
+        return httpx.Response(200, json={pid: 1})
+
+    client = _client_with_transport(handler)
+    result = await client.get_stocks_bulk("wh-1", [f"p{i}" for i in range(7)], semaphore=asyncio.Semaphore(3))
+    await client.close()
+
+    assert result == {f"p{i}": 1.0 for i in range(7)}
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_get_warehouse_stock_snapshot_and_missing_route():
+    """Полный снимок склада; без маршрута — None, повторно не запрашиваем."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith("/stock/wh-1"):
+            return httpx.Response(200, json={"#value": [{"productID": "p1", "stock": 2}]})
+        return httpx.Response(404)
+
+    client = _client_with_transport(handler)
+    assert await client.get_warehouse_stock("wh-1") == {"p1": 2.0}
+    assert await client.get_warehouse_stock("wh-2") is None
+    assert await client.get_warehouse_stock("wh-1") is None
+    await client.close()
+
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+import json
+import tracemalloc
+
+import pytest
+
+from app.integrations.onec_deficit_batch import DeficitBatch
+from app.integrations.onec_json_normalizer import normalize_deficit_payload
+from app.integrations.onec_shape_cache import normalize_deficit_learned, shape_cache
+from app.integrations.onec_stream_parser import iter_deficit_payload
+
+
+RAW = json.dumps([
+    {"id": "u1", "name": "A", "sku": "AV-1", "min_stock": 10, "max_stock": 20, "current_stock": 3},
+    {"productID": "u2", "Наименование": "Б", "Остаток": "1"},
+    {"name": "Без ID", "deficit": 4},
+], ensure_ascii=False)
+
+
+def test_batch_rows_match_canonical_dicts():
+    """Строки пакета ведут себя как канонические словари, включая отсутствующие поля."""
+    items = normalize_deficit_payload(RAW)
+    batch = normalize_deficit_payload(RAW, as_batch=True)
+
+    assert isinstance(batch, DeficitBatch)
+    assert len(batch) == len(items)
+    assert list(batch) == items
+    assert batch.to_dicts() == items
+    row = batch[1]
+    assert "min_stock" not in row and row.get("min_stock") is None
+    assert row["current_stock"] == 1.0 and batch[-1]["deficit"] == 4.0
+    with pytest.raises(AttributeError):
+        row.extra = 1  # __slots__
+
+
+def test_batch_take_and_numpy_columns():
+    batch = DeficitBatch.from_items(normalize_deficit_payload(RAW))
+    kept = batch.take([2, 0])
+
+    assert kept.ids[1] == "u1" and kept.to_dicts(0, 1) == [batch[2].to_dict()]
+    assert json.dumps(batch.to_dicts(0, 1), ensure_ascii=False)
+
+    pytest.importorskip("numpy")
+    deficit = batch.as_numpy("deficit")
+    assert deficit.tolist() == list(batch.deficit)
+
+
+def test_learned_and_streaming_paths_produce_batches():
+    shape_cache.clear()
+    expected = normalize_deficit_payload(RAW)
+    for _ in range(2):
+        assert normalize_deficit_learned(RAW, "deficit/{wh}", as_batch=True).to_dicts() == expected
+    chunks = [RAW.encode()[i:i + 16] for i in range(0, len(RAW.encode()), 16)]
+    assert DeficitBatch.from_items(iter_deficit_payload(chunks)).to_dicts() == expected
+    shape_cache.clear()
+
+
+def test_batch_uses_far_less_memory_than_dicts():
+    n = 20_000
+    raw = json.dumps([{"id": f"id-{i}", "name": f"Item {i}", "min_stock": 10, "current_stock": i % 7}
+                      for i in range(n)])
+
+    def retained(as_batch):
+        tracemalloc.start()
+        result = normalize_deficit_payload(raw, as_batch=as_batch)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(result) == n
+        return size
+
+    # Строки ID/наименований одинаковы в обоих представлениях, выигрыш — на контейнерах
+    assert retained(True) * 2 < retained(False)
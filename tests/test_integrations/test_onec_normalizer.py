@@ -192,6 +192,68 @@ class TestParse1CJson:
         assert result["stock"] == Decimal("42")
         assert result["warehouse"] == "main"
 
+    def test_decimal_without_float_round_trip(self):
+        """Тест: дробные значения декодируются сразу в Decimal без потери точности."""
+        response = '{"min_stock": 10.123456789012345678, "price": 1.1, "rows": [{"stock": 0.1}]}'
+
+        result = parse_1c_json(response)
+
+        assert result["min_stock"] == Decimal("10.123456789012345678")
+        assert result["rows"][0]["stock"] == Decimal("0.1")
+        # Прочие дробные поля остаются float
+        assert isinstance(result["price"], float) and result["price"] == 1.1
+
+    def test_xdto_decimal_typed_while_unwrapping(self):
+        """Тест: в XDTO тип значения определяется ключом после разворота, без потери точности."""
+        response = (
+            '{"#type": "jv8:Structure", "#value": ['
+            '{"name": {"#value": "Остаток"}, "Value": {"#type": "jxs:decimal", "#value": 10.123456789012345678}},'
+            '{"name": {"#value": "price"}, "Value": {"#type": "jxs:decimal", "#value": 2.5}},'
+            '{"name": {"#value": "rows"}, "Value": [{"name": "stock", "Value": "3.5"}]}]}'
+        )
+
+        result = parse_1c_json(response)
+
+        assert result == {"Остаток": Decimal("10.123456789012345678"), "price": 2.5, "rows": {"stock": Decimal("3.5")}}
+        assert isinstance(result["price"], float)
+
+    def test_typing_of_nodes_left_wrapped(self):
+        """Тест: списки и XDTO-узлы вне разворачиваемого ответа типизируются при декодировании."""
+        response = '[1.5, {"a": [2.5, {"name": "x", "Value": 0.5, "stock": "4"}], "deficit": 1}]'
+
+        result = parse_1c_json(response)
+
+        assert result == [1.5, {"a": [2.5, {"name": "x", "Value": 0.5, "stock": Decimal("4")}], "deficit": Decimal("1")}]
+        assert isinstance(result[0], float) and isinstance(result[1]["a"][1]["Value"], float)
+
+    @pytest.mark.parametrize("backend", ["json", "orjson", "msgspec"])
+    def test_backends_decode_identically(self, backend, monkeypatch):
+        """Тест: выбор JSON-бэкенда не меняет результат; без пакета — откат к stdlib."""
+        from app.integrations import onec_json_normalizer as normalizer
+
+        monkeypatch.setenv("ONEC_JSON_BACKEND", backend)
+        name, loads = normalizer._select_json_backend()
+        monkeypatch.setattr(normalizer, "JSON_BACKEND", name)
+        monkeypatch.setattr(normalizer, "_fast_loads", loads)
+
+        payload = '[{"id": "u1", "min_stock": 2.5, "big": 123456789012345678901234567890, "x": NaN}]'
+        assert json.dumps(normalizer.parse_1c_response(payload)) == json.dumps(json.loads(payload))
+        assert parse_1c_json('{"stock": 1.25}') == {"stock": Decimal("1.25")}
+
+    @pytest.mark.parametrize("backend", ["json", "orjson", "msgspec"])
+    def test_backends_keep_wide_integers_exact(self, backend, monkeypatch):
+        """Тест: целые шире 64 бит (без NaN в ответе) не превращаются в float ни в одном бэкенде."""
+        from app.integrations import onec_json_normalizer as normalizer
+
+        monkeypatch.setenv("ONEC_JSON_BACKEND", backend)
+        name, loads = normalizer._select_json_backend()
+        monkeypatch.setattr(normalizer, "JSON_BACKEND", name)
+        monkeypatch.setattr(normalizer, "_fast_loads", loads)
+
+        payload = '[{"productID": 20000000000000000001, "name": "Товар", "min_stock": 5, "current_stock": 1}]'
+        assert normalizer.parse_1c_response(payload) == json.loads(payload)
+        assert normalizer.normalize_deficit_payload(payload)[0]["id"] == "20000000000000000001"
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
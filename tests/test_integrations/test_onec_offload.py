@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from app.integrations.onec_json_normalizer import normalize_deficit_payload
+from app.integrations.onec_offload import NormalizationExecutor
+
+
+def _json_payload(n: int) -> str:
+    return json.dumps([{"id": f"id-{i}", "name": f"Товар {i}", "min_stock": 10, "current_stock": i % 11}
+                       for i in range(n)], ensure_ascii=False)
+
+
+def _kv_payload(n: int) -> str:
+    return "\n".join(f"name=Item {i}, min_stock=8, current_stock={i % 9}" for i in range(n))
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_INLINE_MAX_BYTES", 1024)
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_PROCESS_MIN_BYTES", 200_000)
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_PROCESSES", 2)
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_CHUNK_MIN_ITEMS", 500)
+    ex = NormalizationExecutor()
+    yield ex
+    ex.shutdown()
+
+
+def test_mode_selected_by_size(executor, monkeypatch):
+    assert executor.mode_for(100) == "inline"
+    assert executor.mode_for(50_000) == "thread"
+    assert executor.mode_for(500_000) == "process"
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_PROCESSES", 0)
+    assert executor.mode_for(500_000) == "thread"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text", [_json_payload(10), _json_payload(1500), _json_payload(6000),
+                                  _kv_payload(8000), "name=C, min_stock=8, current_stock=1"],
+                         ids=["json-inline", "json-thread", "json-process", "kv-process", "kv-inline"])
+async def test_all_modes_match_tolerant_normalizer(executor, text):
+    assert await executor.normalize_deficit(text, "deficit/{wh}") == normalize_deficit_payload(text)
+
+
+@pytest.mark.asyncio
+async def test_thread_mode_keeps_event_loop_responsive(executor, monkeypatch):
+    """Пока большой ответ разбирается в потоке, другие корутины продолжают выполняться."""
+    monkeypatch.setattr("app.integrations.onec_offload.settings.ONEC_NORMALIZE_PROCESSES", 0)
+    text = _kv_payload(30_000)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    result = await executor.normalize_deficit(text, "deficit/{wh}")
+    task.cancel()
+
+    assert len(result) == 30_000
+    assert ticks > 5
+    stats = executor.stats()
+    assert stats["thread"]["calls"] == 1 and stats["thread"]["items"] == 30_000
+    assert stats["thread"]["seconds"] > 0
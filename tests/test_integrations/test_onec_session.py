@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+
+import httpx
+import pytest
+
+from app.integrations import adaptive_limit, circuit_breaker, onec_session, retry
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.onec_session import OneCSessionPool
+
+
+class FakeOneC:
+    """Веб-сервер 1С с reuseSessions: сеанс открывается по "IBSession: start" и узнается по cookie."""
+
+    def __init__(self):
+        self.sessions: dict[str, int] = {}
+        self.starts = 0
+        self.finished = []
+        self._ids = itertools.count(1)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        cookie = request.headers.get("Cookie", "")
+        session_id = cookie.split("ibsession=", 1)[1] if "ibsession=" in cookie else None
+        if request.headers.get("IBSession") == "finish":
+            self.finished.append(session_id)
+            self.sessions.pop(session_id, None)
+            return httpx.Response(200)
+        headers = {}
+        if request.headers.get("IBSession") == "start":
+            self.starts += 1
+            session_id = f"s{next(self._ids)}"
+            self.sessions[session_id] = 0
+            headers["Set-Cookie"] = f"ibsession={session_id}; path=/"
+        elif session_id not in self.sessions:
+            return httpx.Response(400, text="session not found")
+        self.sessions[session_id] += 1
+        return httpx.Response(200, json={"stock": 7}, headers=headers)
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(retry.settings, "ONEC_SESSION_REUSE", True)
+    monkeypatch.setattr(retry.settings, "ONEC_SESSION_POOL_SIZE", 2)
+    monkeypatch.setattr(retry.settings, "ONEC_SESSION_MAX_IDLE", 15.0)
+    for reset in (onec_session.reset_session_pools, adaptive_limit.reset_concurrency_limiters,
+                  circuit_breaker.reset_circuits, retry.reset_retry_budgets):
+        reset()
+    yield
+    for reset in (onec_session.reset_session_pools, adaptive_limit.reset_concurrency_limiters,
+                  circuit_breaker.reset_circuits, retry.reset_retry_budgets):
+        reset()
+
+
+def _client(server: FakeOneC) -> OneSApiClient:
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(server.handler))
+    return client
+
+
+@pytest.mark.asyncio
+async def test_session_is_started_once_and_reused():
+    server = FakeOneC()
+    client = _client(server)
+    for _ in range(5):
+        assert await client.get_stock_for_product("p1", "wh") == 7.0
+    stats = client._sessions.stats()
+    await client.close()
+
+    assert server.starts == 1
+    assert server.sessions == {"s1": 5}
+    assert stats["started"] == 1 and stats["reused"] == 4
+    # Идентификатор сеанса держит пул, а не общий cookie jar клиента
+    assert "ibsession" not in client.client.cookies
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_use_separate_sessions():
+    server = FakeOneC()
+    client = _client(server)
+    results = await asyncio.gather(*(client.get_stock_for_product(f"p{i}", "wh") for i in range(6)))
+    await client.close()
+    assert results == [7.0] * 6
+    assert server.starts <= 2  # не больше ONEC_SESSION_POOL_SIZE
+    assert sum(server.sessions.values()) == 6
+
+
+@pytest.mark.asyncio
+async def test_lost_session_is_renewed_transparently():
+    server = FakeOneC()
+    client = _client(server)
+    await client.get_stock_for_product("p1", "wh")
+    server.sessions.clear()  # перезапуск веб-сервера / истек sessionMaxAge
+    assert await client.get_stock_for_product("p1", "wh") == 7.0
+    stats = client._sessions.stats()
+    await client.close()
+    assert server.starts == 2
+    assert stats["renewed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_session_is_replaced_before_server_expiry(monkeypatch):
+    server = FakeOneC()
+    client = _client(server)
+    await client.get_stock_for_product("p1", "wh")
+    session = client._sessions._idle[0]
+    session.last_used -= 60
+    await client.get_stock_for_product("p1", "wh")
+    stats = client._sessions.stats()
+    await client.close()
+    assert server.starts == 2 and stats["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_finish_sessions_releases_licenses():
+    server = FakeOneC()
+    client = _client(server)
+    await asyncio.gather(*(client.get_stock_for_product(f"p{i}", "wh") for i in range(4)))
+    await client.finish_sessions()
+    await client.close()
+    assert sorted(server.finished) == sorted(["s1", "s2"][:server.starts])
+    assert server.sessions == {}
+
+
+@pytest.mark.asyncio
+async def test_stateless_mode_sends_no_session_headers(monkeypatch):
+    monkeypatch.setattr(retry.settings, "ONEC_SESSION_REUSE", False)
+    seen = []
+
+    def handler(request):
+        seen.append((request.headers.get("IBSession"), request.headers.get("Cookie")))
+        return httpx.Response(200, json={"stock": 1})
+
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(handler))
+    await client.get_stock_for_product("p1", "wh")
+    await client.close()
+    assert seen == [(None, None)]
+
+
+@pytest.mark.asyncio
+async def test_pool_waits_when_all_sessions_busy():
+    pool = OneCSessionPool(size=1, max_idle=15.0)
+    first = await pool.acquire()
+    first.bind("s1")
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    pool.release(first)
+    assert await waiter is first
+
+
+class StreamingOneC(FakeOneC):
+    """Отдает дефицит потоком, который не заканчивается до release."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.seen: list[tuple[str, str | None]] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        response = super().handler(request)
+        started = response.headers.get("Set-Cookie", "").partition("ibsession=")[2].partition(";")[0]
+        session_id = started or request.headers.get("Cookie", "").partition("ibsession=")[2]
+        self.seen.append((request.url.path.rsplit("/", 2)[-2], session_id))
+        if "/deficit/" not in request.url.path:
+            return response
+
+        async def body():
+            yield b'[{"id": "00000000-0000-4000-8000-000000000001", "name": "A", '
+            await self.release.wait()
+            yield b'"min_stock": 5, "current_stock": 1}]'
+
+        return httpx.Response(200, content=body(), headers=response.headers)
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_holds_its_session_until_closed(monkeypatch):
+    monkeypatch.setattr(retry.settings, "ONEC_STREAM_DEFICIT", True)
+    monkeypatch.setattr(retry.settings, "HTTP_COALESCE_GETS", False)
+    server = StreamingOneC()
+    client = _client(server)
+    await client.get_stock_for_product("p1", "wh")  # сеанс s1 простаивает в пуле
+
+    deficit = asyncio.create_task(client.get_deficit_products("wh"))
+    while len(server.seen) < 2:
+        await asyncio.sleep(0)
+    # Тело дефицита еще читается в s1 — параллельный запрос должен получить другой сеанс
+    await client.get_stock_for_product("p2", "wh")
+    server.release.set()
+    items = await deficit
+    await client.get_stock_for_product("p3", "wh")
+    stats = client._sessions.stats()
+    await client.close()
+
+    assert len(items) == 1
+    assert server.seen[1] == ("deficit", "s1")
+    assert server.seen[2] == ("wh", "s2")
+    assert stats["open"] == 2 and stats["idle"] == 2
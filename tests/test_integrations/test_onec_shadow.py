@@ -0,0 +1,128 @@
+import json
+
+import httpx
+import pytest
+
+from app.integrations import onec_shadow
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.onec_json_normalizer import normalize_deficit_payload
+from app.integrations.onec_shadow import SHADOW_CANDIDATES, ShadowNormalizer, diff_outputs
+
+PAYLOAD = json.dumps([
+    {"id": f"00000000-0000-4000-8000-{i:012d}", "Наименование": f"Товар {i}", "МинимальныйЗапас": "10",
+     "Остаток": str(i % 12)}
+    for i in range(50)
+], ensure_ascii=False)
+
+
+@pytest.fixture
+def events(monkeypatch):
+    recorded = []
+
+    async def fake_log_event(**kwargs):
+        recorded.append(kwargs)
+
+    monkeypatch.setattr(onec_shadow, "log_event", fake_log_event)
+    monkeypatch.setattr("app.integrations.onec_shadow.settings.ONEC_SHADOW_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr("app.integrations.onec_shadow.settings.ONEC_SHADOW_NORMALIZER", "tolerant")
+    return recorded
+
+
+@pytest.mark.parametrize("name", sorted(SHADOW_CANDIDATES))
+def test_candidates_match_current_normalizer(name):
+    assert SHADOW_CANDIDATES[name](PAYLOAD) == normalize_deficit_payload(PAYLOAD)
+
+
+def test_diff_outputs_reports_fields_and_missing_ids():
+    primary = [{"id": "a", "deficit": 1.0}, {"id": "b", "deficit": 2.0}, {"id": "c", "deficit": 3.0}]
+    candidate = [{"id": "a", "deficit": 1.0}, {"id": "b", "deficit": 5.0, "sku": "X"}]
+
+    diff = diff_outputs(primary, candidate, limit=5)
+
+    assert diff["mismatched"] == 2
+    assert diff["examples"] == [{"idx": 1, "id": "b", "fields": {"deficit": [2.0, 5.0], "sku": [None, "X"]}}]
+    assert diff["only_primary_ids"] == ["c"] and diff["only_candidate_ids"] == []
+
+
+@pytest.mark.asyncio
+async def test_shadow_records_match_and_diff(events, monkeypatch):
+    shadow = ShadowNormalizer()
+    primary = normalize_deficit_payload(PAYLOAD)
+
+    shadow.maybe_submit(PAYLOAD, primary, 0.01, "deficit/{wh}")
+    await shadow.drain()
+    tampered = [dict(primary[0], deficit=0.0)] + primary[1:]
+    shadow.maybe_submit(PAYLOAD, tampered, 0.01, "deficit/{wh}")
+    await shadow.drain()
+    shadow.shutdown()
+
+    assert [e["status"] for e in events] == ["MATCH", "DIFF"]
+    assert all(e["step"] == "onec.shadow_normalize" and e["external_system"] == "ONEC" for e in events)
+    match, diff = events[0]["details"], events[1]["details"]
+    assert match["candidate"] == "tolerant" and match["mismatched"] == 0 and match["candidate_ms"] >= 0
+    assert diff["mismatched"] == 1 and diff["examples"][0]["fields"] == {"deficit": [0.0, 10.0]}
+    assert events[0]["payload_hash"] == events[1]["payload_hash"]
+    assert shadow.stats()["matched"] == 1 and shadow.stats()["diverged"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shadow_never_queues_beyond_limit(events, monkeypatch):
+    """Пока идет сравнение, новые выборки пропускаются, а не ждут."""
+    shadow = ShadowNormalizer()
+    primary = normalize_deficit_payload(PAYLOAD)
+
+    for _ in range(5):
+        shadow.maybe_submit(PAYLOAD, primary, 0.01, "deficit/{wh}")
+    await shadow.drain()
+    shadow.shutdown()
+
+    stats = shadow.stats()
+    assert stats["sampled"] == 1 and stats["dropped"] == 4 and len(events) == 1
+
+
+@pytest.mark.asyncio
+async def test_shadow_disabled_or_unsampled(events, monkeypatch):
+    shadow = ShadowNormalizer()
+    monkeypatch.setattr("app.integrations.onec_shadow.settings.ONEC_SHADOW_SAMPLE_RATE", 0.0)
+    shadow.maybe_submit(PAYLOAD, [], 0.01, "deficit/{wh}")
+    monkeypatch.setattr("app.integrations.onec_shadow.settings.ONEC_SHADOW_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr("app.integrations.onec_shadow.settings.ONEC_SHADOW_NORMALIZER", "unknown")
+    shadow.maybe_submit(PAYLOAD, [], 0.01, "deficit/{wh}")
+    await shadow.drain()
+
+    assert events == [] and shadow.stats()["sampled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_shadow_candidate_error_is_logged(events, monkeypatch):
+    def broken(text):
+        raise ValueError("boom")
+
+    monkeypatch.setitem(SHADOW_CANDIDATES, "tolerant", broken)
+    shadow = ShadowNormalizer()
+    shadow.maybe_submit(PAYLOAD, [], 0.01, "deficit/{wh}")
+    await shadow.drain()
+    shadow.shutdown()
+
+    assert events[0]["status"] == "ERROR" and events[0]["details"]["error"] == "ValueError: boom"
+
+
+@pytest.mark.asyncio
+async def test_client_submits_shadow_without_waiting(events, monkeypatch):
+    """get_deficit_products возвращает основной результат сразу, сравнение идет в фоне."""
+    shadow = ShadowNormalizer()
+    monkeypatch.setattr("app.integrations.one_s_client.shadow_normalizer", shadow)
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(
+        base_url=client.client.base_url,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=PAYLOAD)),
+    )
+
+    result = await client.get_deficit_products("wh-1")
+    await client.close()
+
+    assert result == normalize_deficit_payload(PAYLOAD)
+    assert shadow.stats()["pending"] == 1
+    await shadow.drain()
+    shadow.shutdown()
+    assert events[0]["status"] == "MATCH" and events[0]["details"]["endpoint"] == "deficit/{wh}"
@@ -0,0 +1,106 @@
+import json
+import logging
+
+import pytest
+
+from app.integrations.onec_json_normalizer import normalize_deficit_payload, normalize_stock
+from app.integrations.onec_shape_cache import (
+    normalize_deficit_learned,
+    normalize_stock_learned,
+    shape_cache,
+)
+
+
+ITEMS = [
+    {"id": "123e4567-e89b-12d3-a456-426614174000", "name": "Товар 1", "min_stock": 10, "current_stock": 3},
+    {"id": "987fcdeb-51d3-42b4-a567-426614174001", "name": " ", "min_stock": "5", "current_stock": 1.5},
+    {"id": "", "name": "Без ID", "min_stock": 2, "current_stock": 0},
+]
+
+DEFICIT_SHAPES = {
+    "plain": json.dumps(ITEMS, ensure_ascii=False),
+    "container": json.dumps({"total": 3, "items": ITEMS}, ensure_ascii=False),
+    "xdto_array": json.dumps({"#type": "jv8:Array", "#value": ITEMS}, ensure_ascii=False),
+    "numeric_keys": json.dumps({str(i): item for i, item in enumerate(ITEMS)}, ensure_ascii=False),
+    "russian": json.dumps([{"productID": "p1", "Наименование": "А", "Остаток": "1", "МинимальныйЗапас": 4}],
+                          ensure_ascii=False),
+    "xdto_struct": json.dumps({"#value": [{"name": {"#value": "id"}, "Value": {"#value": "x1"}}]}),
+    "kv_text": "name=C, min_stock=8, current_stock=1",
+    "empty": "[]",
+}
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    shape_cache.clear()
+    yield
+    shape_cache.clear()
+
+
+@pytest.mark.parametrize("shape", sorted(DEFICIT_SHAPES))
+def test_learned_deficit_matches_tolerant(shape):
+    """Первый (обучение) и повторный (скомпилированный) разбор совпадают с толерантным."""
+    text = DEFICIT_SHAPES[shape]
+    expected = normalize_deficit_payload(text)
+    assert normalize_deficit_learned(text, "deficit/{wh}") == expected
+    assert normalize_deficit_learned(text, "deficit/{wh}") == expected
+
+
+def test_learned_shape_reused_and_change_logged(caplog):
+    endpoint = "deficit/{wh}"
+    normalize_deficit_learned(DEFICIT_SHAPES["plain"], endpoint)
+    normalize_deficit_learned(DEFICIT_SHAPES["plain"], endpoint)
+    assert shape_cache.stats()["compiled"] == 1
+    assert shape_cache.stats()["hits"] == 1
+
+    with caplog.at_level(logging.WARNING, logger="app.integrations.onec_shape_cache"):
+        out = normalize_deficit_learned(DEFICIT_SHAPES["russian"], endpoint)
+    assert out == normalize_deficit_payload(DEFICIT_SHAPES["russian"])
+    assert shape_cache.stats()["changes"] == 1
+    assert "shape changed" in caplog.text
+
+
+def test_item_deviating_from_learned_layout_falls_back():
+    """Элемент с XDTO-значением в известном поле — толерантный путь для всего ответа."""
+    endpoint = "deficit/{wh}"
+    normalize_deficit_learned(DEFICIT_SHAPES["plain"], endpoint)
+    drifted = json.dumps(ITEMS[:1] + [{"id": "u2", "name": {"#value": "XDTO"}, "min_stock": 3, "current_stock": 1}])
+
+    assert normalize_deficit_learned(drifted, endpoint) == normalize_deficit_payload(drifted)
+    assert shape_cache.stats()["fallbacks"] == 1
+
+
+def test_xdto_typed_fields_learned_once_without_warnings(caplog):
+    """Форма с XDTO-значениями в полях запоминается без извлекателя: одна компиляция, без предупреждений."""
+    deficit = json.dumps([{"id": "u1", "name": "А", "min_stock": {"#type": "jxs:decimal", "#value": 5},
+                           "current_stock": 1}])
+    stock = json.dumps({"productID": "p1", "stock": {"#type": "jxs:decimal", "#value": 5}})
+
+    with caplog.at_level(logging.WARNING, logger="app.integrations.onec_shape_cache"):
+        for _ in range(2):
+            assert normalize_deficit_learned(deficit, "deficit/{wh}") == normalize_deficit_payload(deficit)
+            assert normalize_stock_learned(stock, "stock/{wh}/{pid}") == normalize_stock(stock)
+
+    stats = shape_cache.stats()
+    assert (stats["compiled"], stats["hits"], stats["changes"], stats["fallbacks"]) == (2, 2, 0, 0)
+    assert caplog.records == []
+
+
+@pytest.mark.parametrize("text", [
+    '{"stock": 12.5}',
+    '{"productID": "p1", "Остаток": "4"}',
+    '{"stock": "n/a", "value": 3}',
+    '{"#type": "jxs:number", "#value": "3"}',
+    '[{"stock": 2}]',
+    '7',
+])
+def test_learned_stock_matches_tolerant(text):
+    expected = normalize_stock(text)
+    assert normalize_stock_learned(text, "stock/{wh}/{pid}") == expected
+    assert normalize_stock_learned(text, "stock/{wh}/{pid}") == expected
+
+
+def test_learned_stock_invalid_value_raises_like_tolerant():
+    normalize_stock_learned('{"stock": 1}', "stock/{wh}/{pid}")
+    with pytest.raises(ValueError):
+        normalize_stock_learned('{"stock": "n/a"}', "stock/{wh}/{pid}")
@@ -0,0 +1,91 @@
+import json
+import tracemalloc
+
+import httpx
+import pytest
+
+from app.integrations.onec_json_normalizer import normalize_deficit_payload
+from app.integrations.onec_stream_parser import iter_deficit_payload
+from app.integrations.one_s_client import OneSApiClient
+
+
+def _chunks(text: str, size: int):
+    data = text.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+ITEMS = [
+    {"id": "123e4567-e89b-12d3-a456-426614174000", "name": "Товар 1", "min_stock": 10, "current_stock": 3},
+    {"productID": "987fcdeb-51d3-42b4-a567-426614174001", "Наименование": "Товар 2",
+     "МинимальныйЗапас": "5", "Остаток": 1.5, "sku": "AV-04362"},
+    {"name": "Без ID", "min_stock": 2, "current_stock": 0},
+]
+
+SHAPES = {
+    "plain_array": json.dumps(ITEMS, ensure_ascii=False),
+    "items_container": json.dumps({"total": 3, "items": ITEMS}, ensure_ascii=False),
+    "xdto_array": json.dumps({"#type": "jv8:Array", "#value": [
+        {"#type": "jv8:Structure", "#value": [
+            {"name": {"#value": "id"}, "Value": {"#value": "c7e8e58f-49b7-11e6-8a7c-0025903e6d16"}},
+            {"name": {"#value": "name"}, "Value": {"#value": "XDTO"}},
+            {"name": {"#value": "min_stock"}, "Value": {"#value": 4}},
+            {"name": {"#value": "current_stock"}, "Value": {"#value": 1}},
+        ]},
+    ]}, ensure_ascii=False),
+    "competing_containers": json.dumps({"result": [], "items": ITEMS}, ensure_ascii=False),
+    "rows_container": json.dumps({"rows": ITEMS[:1], "value": ITEMS[1:], "total": 3}, ensure_ascii=False),
+    "numeric_keys": json.dumps({"0": ITEMS[0], "1": ITEMS[1]}, ensure_ascii=False),
+    "single_object": json.dumps(ITEMS[0], ensure_ascii=False),
+    "kv_lines": "name=C, min_stock=8, current_stock=1\nname=D, min_stock=3, current_stock=0",
+    "double_encoded": json.dumps(json.dumps(ITEMS, ensure_ascii=False), ensure_ascii=False),
+    "empty_array": "[]",
+}
+
+
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_stream_matches_tolerant_normalizer(shape, chunk_size):
+    """Потоковый разбор дает тот же результат, что и normalize_deficit_payload."""
+    text = SHAPES[shape]
+    assert list(iter_deficit_payload(_chunks(text, chunk_size))) == normalize_deficit_payload(text)
+
+
+def test_stream_memory_is_flat_in_item_count():
+    """Пиковая память при потоковом разборе не растет с числом элементов."""
+    def body(n):
+        yield b"["
+        for i in range(n):
+            sep = b"," if i else b""
+            yield sep + json.dumps({"id": f"id-{i}", "name": f"Item {i}", "min_stock": 10,
+                                    "current_stock": 1}).encode()
+        yield b"]"
+
+    def peak(n):
+        tracemalloc.start()
+        count = sum(1 for _ in iter_deficit_payload(body(n)))
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert count == n
+        return peak_bytes
+
+    small, large = peak(1_000), peak(20_000)
+    assert large < small * 2
+
+
+@pytest.mark.asyncio
+async def test_client_streams_deficit(monkeypatch):
+    """iter_deficit_products и get_deficit_products в потоковом режиме."""
+    text = SHAPES["items_container"]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=text.encode("utf-8"))
+
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(handler))
+
+    streamed = [item async for item in client.iter_deficit_products("wh-1")]
+    monkeypatch.setattr("app.integrations.one_s_client.settings.ONEC_STREAM_DEFICIT", True)
+    collected = await client.get_deficit_products("wh-1")
+    await client.close()
+
+    assert streamed == collected == normalize_deficit_payload(text)
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.integrations import base_client, circuit_breaker, rate_limit, retry
+from app.integrations.moysklad_client import MoySkladApiClient
+from app.integrations.rate_limit import AsyncTokenBucket, retry_after_seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Общие фиктивные часы: asyncio.sleep в лимитере и клиенте сдвигает их."""
+    now = [1000.0]
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    fake_time = SimpleNamespace(monotonic=lambda: now[0], time=lambda: 1_700_000_000.0 + now[0])
+    monkeypatch.setattr(rate_limit, "time", fake_time)
+    monkeypatch.setattr(base_client.asyncio, "sleep", fake_sleep)
+    return SimpleNamespace(now=now, sleeps=sleeps)
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    rate_limit.reset_rate_limiters()
+    retry.reset_retry_budgets()
+    circuit_breaker.reset_circuits()
+    yield
+    rate_limit.reset_rate_limiters()
+    retry.reset_retry_budgets()
+    circuit_breaker.reset_circuits()
+
+
+def _response(status: int = 200, **headers) -> httpx.Response:
+    return httpx.Response(status, headers={k.replace("_", "-"): v for k, v in headers.items()})
+
+
+@pytest.mark.asyncio
+async def test_bucket_spaces_requests_after_burst(clock):
+    bucket = AsyncTokenBucket(rate=10.0, capacity=2.0)
+    waits = [await bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1)
+    assert waits[3] == pytest.approx(0.1)
+
+
+@pytest.mark.asyncio
+async def test_bucket_refuses_wait_past_deadline(clock):
+    bucket = AsyncTokenBucket(rate=1.0, capacity=1.0)
+    await bucket.acquire()
+    with pytest.raises(TimeoutError):
+        await bucket.acquire(until=clock.now[0] + 0.5)
+    # Жетон возвращен: через секунду он снова доступен без долга
+    clock.now[0] += 1.0
+    assert await bucket.acquire() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_headers_adapt_bucket(clock):
+    bucket = AsyncTokenBucket(rate=10.0, capacity=5.0)
+    bucket.observe(_response(200, X_RateLimit_Remaining="0"))
+    assert await bucket.acquire() == pytest.approx(0.1)
+
+    bucket.observe(_response(429, Retry_After="2"))
+    assert await bucket.acquire() == pytest.approx(2.0)
+    assert bucket.stats()["throttled"] == 1
+
+
+def test_retry_after_formats(clock):
+    assert retry_after_seconds(_response(429, Retry_After="3")) == 3.0
+    assert retry_after_seconds(_response(429, X_Lognex_Retry_After="1500")) == 1.5
+    assert retry_after_seconds(_response(429, Retry_After="soon")) is None
+    assert retry_after_seconds(_response(429)) is None
+
+
+@pytest.mark.asyncio
+async def test_moysklad_retries_429_and_shares_limiter(clock, monkeypatch):
+    monkeypatch.setattr(retry.settings, "MOYSKLAD_RATE_LIMIT_PER_SEC", 10.0)
+    monkeypatch.setattr(retry.settings, "MOYSKLAD_RATE_LIMIT_BURST", 1.0)
+    statuses = iter([429, 200, 200])
+
+    def handler(request):
+        status = next(statuses)
+        if status == 429:
+            return httpx.Response(429, headers={"X-Lognex-Retry-After": "1200"})
+        return httpx.Response(200, json={"rows": [{"stock": 2}]})
+
+    clients = []
+    for _ in range(2):
+        client = MoySkladApiClient()
+        client.client = httpx.AsyncClient(base_url=client.BASE_API_URL, transport=httpx.MockTransport(handler))
+        clients.append(client)
+
+    assert await clients[0].get_stock_by_product_id("p1") == 2
+    assert await clients[1].get_stock_by_product_id("p2") == 2
+    for client in clients:
+        await client.close()
+
+    stats = rate_limit.rate_limit_stats()["moysklad"]
+    assert stats["acquired"] == 3 and stats["throttled"] == 1
+    # Повтор после 429 ждал паузу из X-Lognex-Retry-After, а не джиттер
+    assert pytest.approx(1.2) in clock.sleeps
+    assert circuit_breaker.circuit_stats()[f"{MoySkladApiClient.BASE_API_URL} report/stock/all"]["failures"] == 0
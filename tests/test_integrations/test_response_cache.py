@@ -0,0 +1,159 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.integrations import adaptive_limit, circuit_breaker, response_cache, retry
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.response_cache import ResponseCache
+
+ITEM = {"id": "00000000-0000-4000-8000-000000000001", "name": "Товар", "min_stock": 5, "current_stock": 1}
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    for reset in (adaptive_limit.reset_concurrency_limiters, circuit_breaker.reset_circuits,
+                  retry.reset_retry_budgets, response_cache.reset_response_caches):
+        reset()
+    monkeypatch.setattr(settings, "ONEC_RESPONSE_CACHE", True)
+    monkeypatch.setattr(settings, "ONEC_STREAM_DEFICIT", False)
+    yield
+    response_cache.reset_response_caches()
+
+
+class FakeOneC:
+    """Отдает дефицит и остатки; с etag=... поддерживает If-None-Match."""
+
+    def __init__(self, etag: str | None = None, last_modified: str | None = None, warehouse_status: int = 200):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.warehouse_status = warehouse_status
+        self.calls = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append((request.url.path, request.headers.get("If-None-Match"),
+                           request.headers.get("If-Modified-Since")))
+        headers = {}
+        if self.etag:
+            if request.headers.get("If-None-Match") == self.etag:
+                return httpx.Response(304, headers={"ETag": self.etag})
+            headers["ETag"] = self.etag
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        if request.url.path.endswith("/deficit/wh-1"):
+            return httpx.Response(200, json=[ITEM], headers=headers)
+        if request.url.path.endswith("/stock/wh-1"):
+            return httpx.Response(self.warehouse_status, json={"p1": 3}, headers=headers)
+        return httpx.Response(200, json={"stock": 7}, headers=headers)
+
+
+def _onec(server: FakeOneC) -> OneSApiClient:
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(server.handler))
+    return client
+
+
+def _expire(client: OneSApiClient):
+    for entry in client._cache._entries.values():
+        entry.stored_at -= client._cache.ttl + 1
+
+
+def test_lru_eviction_by_size():
+    cache = ResponseCache(ttl=60, max_bytes=100)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    cache.lookup("a")  # "a" использован позже "b"
+    cache.put("c", 3, 40)
+    assert cache.lookup("b") is None
+    assert cache.lookup("a").value == 1 and cache.lookup("c").value == 3
+    assert cache.stats()["bytes"] == 80 and cache.evictions == 1
+
+    cache.put("huge", 4, 101)
+    assert cache.lookup("huge") is None
+
+
+def test_hit_ratio_counts_revalidations_as_hits():
+    cache = ResponseCache(ttl=60, max_bytes=100)
+    for outcome in ("miss", "hit", "revalidated", "hit"):
+        cache.record("k", outcome)
+    assert cache.stats()["hit_ratio"] == 0.75
+
+
+@pytest.mark.asyncio
+async def test_repeated_deficit_within_ttl_is_served_from_cache():
+    server = FakeOneC()
+    first, second = _onec(server), _onec(server)
+    a = await first.get_deficit_products("wh-1")
+    b = await second.get_deficit_products("wh-1")
+    await first.close()
+    await second.close()
+
+    assert len(server.calls) == 1
+    assert b == a
+    assert first._cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_mutating_a_result_does_not_corrupt_the_cache():
+    server = FakeOneC(etag='"v1"')
+    client = _onec(server)
+    first = await client.get_deficit_products("wh-1")
+    first[0]["deficit"] = 0
+    first.clear()
+    second = await client.get_deficit_products("wh-1")
+    second[0]["name"] = "changed"
+    _expire(client)
+    third = await client.get_deficit_products("wh-1")  # 304
+    await client.close()
+
+    assert third == [{**second[0], "name": ITEM["name"]}]
+    assert third[0]["deficit"] == 4.0
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_revalidated_with_etag():
+    server = FakeOneC(etag='"v1"', last_modified="Sat, 17 Oct 2026 10:00:00 GMT")
+    client = _onec(server)
+    first = await client.get_deficit_products("wh-1")
+    _expire(client)
+    second = await client.get_deficit_products("wh-1")
+    third = await client.get_deficit_products("wh-1")
+    await client.close()
+
+    assert server.calls[1][1:] == ('"v1"', "Sat, 17 Oct 2026 10:00:00 GMT")
+    assert len(server.calls) == 2
+    assert second == first and third == first
+    stats = client._cache.stats()
+    assert (stats["misses"], stats["revalidated"], stats["hits"]) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_without_validators_is_refetched():
+    server = FakeOneC()
+    client = _onec(server)
+    await client.get_stock_for_product("p1", "wh-1")
+    _expire(client)
+    assert await client.get_stock_for_product("p1", "wh-1") == 7
+    await client.close()
+
+    assert [call[1:] for call in server.calls] == [(None, None), (None, None)]
+
+
+@pytest.mark.asyncio
+async def test_missing_warehouse_snapshot_is_not_cached(monkeypatch):
+    monkeypatch.setattr(OneSApiClient, "_warehouse_stock_unsupported", set())
+    client = _onec(FakeOneC(warehouse_status=404))
+    assert await client.get_warehouse_stock("wh-1") is None
+    await client.close()
+    assert client._cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_disabled_always_requests(monkeypatch):
+    monkeypatch.setattr(settings, "ONEC_RESPONSE_CACHE", False)
+    server = FakeOneC(etag='"v1"')
+    client = _onec(server)
+    await client.get_warehouse_stock("wh-1")
+    await client.get_warehouse_stock("wh-1")
+    await client.close()
+
+    assert [call[1:] for call in server.calls] == [(None, None), (None, None)]
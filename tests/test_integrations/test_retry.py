@@ -0,0 +1,211 @@
+import time
+
+import httpx
+import pytest
+
+from app.integrations import base_client, circuit_breaker, retry
+from app.integrations.base_client import BaseApiClient
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.retry import DeadlineExceeded, RetryBudget, RetryPolicy, run_deadline, run_deadline_var
+
+
+def _client(handler, base_url: str = "http://upstream.test/") -> BaseApiClient:
+    client = BaseApiClient(base_url, client=httpx.AsyncClient(base_url=base_url, transport=httpx.MockTransport(handler)))
+    client._owns_client = True
+    return client
+
+
+@pytest.fixture(autouse=True)
+def _fast_retries(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(base_client.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_ATTEMPTS", 4)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_BASE_DELAY", 0.5)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_MAX_DELAY", 10.0)
+    monkeypatch.setattr(retry.settings, "HTTP_CALL_DEADLINE", 60.0)
+    retry.reset_retry_budgets()
+    circuit_breaker.reset_circuits()
+    yield sleeps
+    retry.reset_retry_budgets()
+    circuit_breaker.reset_circuits()
+
+
+@pytest.mark.asyncio
+async def test_retries_5xx_then_succeeds(_fast_retries):
+    statuses = iter([503, 502, 200])
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(next(statuses), json={"ok": True})
+
+    client = _client(handler)
+    assert await client._request("GET", "x") == {"ok": True}
+    await client.close()
+
+    assert len(calls) == 3
+    assert len(_fast_retries) == 2
+    # Полный джиттер: пауза не больше base * 2**(n-1)
+    assert 0 <= _fast_retries[0] <= 0.5 and 0 <= _fast_retries[1] <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_attempts_are_bounded_once():
+    """Один цикл повторов: HTTP_RETRY_ATTEMPTS запросов, а не попытки tenacity x попытки цикла."""
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(500)
+
+    client = _client(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        await client._request("GET", "x")
+    await client.close()
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(404)
+
+    client = _client(handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        await client._request("GET", "x")
+    response = await client._send("GET", "x")
+    await client.close()
+    assert response.status_code == 404
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_connect_errors_are_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json=[])
+
+    client = _client(handler)
+    assert await client._request("GET", "x") == []
+    await client.close()
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_backoff_past_call_deadline_stops_retrying(monkeypatch):
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_BASE_DELAY", 100.0)
+    monkeypatch.setattr(retry.random, "uniform", lambda a, b: b)
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(503)
+
+    client = _client(handler)
+    response = await client._send("GET", "x", deadline=5.0)
+    await client.close()
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_run_deadline_fails_fast():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(200)
+
+    client = _client(handler)
+    with run_deadline(0.0):
+        with pytest.raises(DeadlineExceeded):
+            await client._send("GET", "x")
+    await client.close()
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeout_is_cut_to_remaining_deadline():
+    seen = []
+
+    def handler(request):
+        seen.append(request.extensions["timeout"]["read"])
+        return httpx.Response(200)
+
+    client = _client(handler)
+    await client._send("GET", "x", deadline=2.0)
+    await client._send("GET", "x")
+    await client.close()
+    assert 0 < seen[0] <= 2.0
+    assert seen[1] == 5.0  # срок длиннее таймаута клиента — таймаут не трогаем
+
+
+def test_run_deadline_nests_without_extending():
+    assert run_deadline_var.get() is None
+    with run_deadline(10.0) as outer:
+        with run_deadline(1000.0) as inner:
+            assert inner == outer
+        with run_deadline(1.0) as inner:
+            assert inner < outer
+    assert run_deadline_var.get() is None
+
+    with run_deadline(10.0):
+        assert RetryPolicy(3, 0.1, 1.0, call_deadline=60.0).deadline() <= time.monotonic() + 10.0
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, cap=2.0)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.on_request()
+    budget.on_request()
+    assert budget.try_spend()
+    assert budget.stats()["denied"] == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_is_shared_per_upstream(monkeypatch):
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_BUDGET_CAP", 1.0)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_BUDGET_RATIO", 0.0)
+    monkeypatch.setattr(retry.settings, "HTTP_RETRY_BUDGET_MIN_PER_SEC", 0.0)
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(503)
+
+    first, second = _client(handler), _client(handler)
+    await first._send("GET", "x")
+    await second._send("GET", "x")
+    await first.close()
+    await second.close()
+    # Единственный жетон потратил первый клиент; второй не повторяет
+    assert len(calls) == 3
+    assert retry.retry_budget_stats()["http://upstream.test/"]["denied"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_onec_deficit_stream_retries_before_reading_body():
+    statuses = iter([503, 200])
+
+    def handler(request):
+        return httpx.Response(next(statuses), json=[
+            {"id": "00000000-0000-4000-8000-000000000001", "name": "Товар", "min_stock": 5, "current_stock": 1},
+        ])
+
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(handler))
+    items = [item async for item in client.iter_deficit_products("wh")]
+    await client.close()
+    assert [item["deficit"] for item in items] == [4.0]
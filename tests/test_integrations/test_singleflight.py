@@ -0,0 +1,213 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.logging import job_id_var, run_id_var, set_job_id, set_run_id
+from app.integrations import adaptive_limit, circuit_breaker, retry
+from app.integrations.base_client import BaseApiClient
+from app.integrations.one_s_client import OneSApiClient
+from app.integrations.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    for reset in (adaptive_limit.reset_concurrency_limiters, circuit_breaker.reset_circuits,
+                  retry.reset_retry_budgets):
+        reset()
+    yield
+
+
+class GatedServer:
+    """Отвечает только после release — так запросы гарантированно пересекаются во времени."""
+
+    def __init__(self, body):
+        self.body = body
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append((request.method, request.url.path, request.url.query))
+        await self.release.wait()
+        return httpx.Response(200, json=self.body)
+
+
+def _onec(server: GatedServer) -> OneSApiClient:
+    client = OneSApiClient()
+    client.client = httpx.AsyncClient(base_url=client.client.base_url, transport=httpx.MockTransport(server.handler))
+    return client
+
+
+async def _gather_released(server: GatedServer, *coros):
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    for _ in range(5):
+        await asyncio.sleep(0)
+    server.release.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_deficit_calls_share_one_request():
+    server = GatedServer([{"id": "00000000-0000-4000-8000-000000000001", "name": "Товар",
+                           "min_stock": 5, "current_stock": 1}])
+    first, second = _onec(server), _onec(server)
+    a, b, c = await _gather_released(
+        server,
+        first.get_deficit_products("wh-1"),
+        second.get_deficit_products("wh-1"),
+        first.get_deficit_products("wh-1"),
+    )
+    await first.close()
+    await second.close()
+    assert len(server.calls) == 1
+    assert a == b == c and a is not b and a[0] is not c[0]
+    assert a[0]["deficit"] == 4.0
+
+
+@pytest.mark.asyncio
+async def test_followers_get_independent_copies():
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return {"rows": [{"qty": 1}]}
+
+    group = SingleFlight()
+    leader = asyncio.ensure_future(group.do("k", fetch))
+    follower = asyncio.ensure_future(group.do("k", fetch))
+    await asyncio.sleep(0)
+    release.set()
+    first, second = await asyncio.gather(leader, follower)
+    first["rows"][0]["qty"] = 99
+    assert second == {"rows": [{"qty": 1}]}
+
+
+@pytest.mark.asyncio
+async def test_flight_keeps_leader_trace_ids_but_not_its_run_deadline(monkeypatch):
+    release = asyncio.Event()
+    seen = []
+    rows = []
+
+    async def fake_log_event(**kwargs):
+        rows.append((kwargs["step"], run_id_var.get(), job_id_var.get()))
+
+    monkeypatch.setattr("app.integrations.base_client.log_event", fake_log_event)
+
+    async def fetch():
+        seen.append(retry.run_deadline_var.get())
+        await client._circuit_transition(circuit_breaker.circuit_breaker("http://ms.test/", "k"), ("CLOSED", "OPEN"))
+        await release.wait()
+        return [1]
+
+    client = BaseApiClient("http://ms.test/")
+
+    async def leader():
+        set_run_id("00000000-0000-4000-8000-00000000000a")
+        set_job_id("00000000-0000-4000-8000-00000000000b")
+        with retry.run_deadline(0.01):
+            return await client._coalesce("k", fetch)
+
+    async def follower():
+        set_run_id("00000000-0000-4000-8000-00000000000c")
+        with retry.run_deadline(60):
+            return await client._coalesce("k", fetch)
+
+    tasks = [asyncio.ensure_future(leader()), asyncio.ensure_future(follower())]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    await client.close()
+
+    assert seen == [None]
+    # Строки integration_logs общего вызова несут run_id/job_id того, кто его начал
+    assert rows == [("http.circuit", "00000000-0000-4000-8000-00000000000a", "00000000-0000-4000-8000-00000000000b")]
+    assert isinstance(results[0], retry.DeadlineExceeded)
+    assert results[1] == [1]
+
+
+@pytest.mark.asyncio
+async def test_no_caching_between_flights_and_distinct_keys():
+    server = GatedServer({"stock": 3})
+    server.release.set()
+    client = _onec(server)
+    await client.get_stock_for_product("p1", "wh")
+    await client.get_stock_for_product("p1", "wh")
+    await asyncio.gather(client.get_stock_for_product("p1", "wh"), client.get_stock_for_product("p2", "wh"))
+    await client.close()
+    assert len(server.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_base_client_coalesces_gets_by_params_but_not_posts():
+    server = GatedServer({"rows": []})
+    client = BaseApiClient("http://ms.test/", client=httpx.AsyncClient(
+        base_url="http://ms.test/", transport=httpx.MockTransport(server.handler)))
+    client._owns_client = True
+    await _gather_released(
+        server,
+        client._request("GET", "report/stock/all", params={"filter": "a"}),
+        client._request("GET", "report/stock/all", params={"filter": "a"}),
+        client._request("GET", "report/stock/all", params={"filter": "b"}),
+        client._request("POST", "entity/customerorder", json={"x": 1}),
+        client._request("POST", "entity/customerorder", json={"x": 1}),
+    )
+    await client.close()
+    methods = [c[0] for c in server.calls]
+    assert methods.count("GET") == 2 and methods.count("POST") == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_disabled_flag(monkeypatch):
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    group = SingleFlight()
+    results = await asyncio.gather(group.do("k", failing), group.do("k", failing), return_exceptions=True)
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert len(calls) == 1
+    assert group.stats() == {"in_flight": 0, "calls": 2, "shared": 1}
+
+    monkeypatch.setattr(retry.settings, "HTTP_COALESCE_GETS", False)
+    server = GatedServer({"stock": 1})
+    client = _onec(server)
+    await _gather_released(server, client.get_stock_for_product("p1", "wh"), client.get_stock_for_product("p1", "wh"))
+    await client.close()
+    assert len(server.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_flight_for_others():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await release.wait()
+        return json.loads("[1]")
+
+    group = SingleFlight()
+    leader = asyncio.ensure_future(group.do("k", slow))
+    follower = asyncio.ensure_future(group.do("k", slow))
+    await started.wait()
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await follower == [1]
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+    # Все ожидающие отказались — вызов отменяется
+    release.clear()
+    started.clear()
+    lone = asyncio.ensure_future(group.do("k2", slow))
+    await started.wait()
+    lone.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await lone
+    await asyncio.sleep(0)
+    assert group.stats()["in_flight"] == 0
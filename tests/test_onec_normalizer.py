@@ -1,6 +1,6 @@
 import json
 from app.integrations.onec_json_normalizer import (
-    normalize_deficit_payload, normalize_stock, _UUID_RE
+    normalize_deficit_payload, normalize_stock, normalize_stock_map, parse_1c_json, parse_1c_response, _UUID_RE
 )
 
 def test_deficit_plain_json_has_deficit():
@@ -31,4 +31,93 @@ def test_stock_plain():
 
 def test_stock_xdto_number():
     raw = json.dumps({"#type":"jxs:number","#value": "3"})
-    assert normalize_stock(raw) == 3.0
\ No newline at end of file
+    assert normalize_stock(raw) == 3.0
+
+def test_empty_arrays_stay_lists():
+    # Раньше пустой список сливался как список одноключевых словарей в {}
+    assert parse_1c_response("[]") == []
+    assert parse_1c_response('{"#value": []}') == []
+    assert parse_1c_json('{"#type": "jv8:Array", "#value": []}') == []
+
+def test_double_encoded_body_is_decoded():
+    assert parse_1c_response(json.dumps(json.dumps({"stock": 3}))) == {"stock": 3}
+    assert parse_1c_response(json.dumps(json.dumps([{"a": 1}, {"b": 2}]))) == {"a": 1, "b": 2}
+    assert parse_1c_response('"not json"') == "not json"
+    assert normalize_stock(json.dumps(json.dumps({"stock": 3}))) == 3.0
+
+def test_stock_keys_case_insensitive():
+    assert normalize_stock('{"Остаток": "4"}') == 4.0
+    assert normalize_stock('{"Stock": 5}') == 5.0
+    assert normalize_stock('{"ВНаличииОстаток": 6, "Value": 1}') == 6.0
+
+def test_stock_map_from_rows_and_mapping():
+    rows = json.dumps([{"productID": "p1", "stock": 2}, {"id": "p2", "Остаток": "4.5"}])
+    assert normalize_stock_map(rows) == {"p1": 2.0, "p2": 4.5}
+    assert normalize_stock_map(json.dumps({"items": [{"id": "p3", "stock": 1}]})) == {"p3": 1.0}
+    assert normalize_stock_map(json.dumps({"p4": 7, "p5": {"stock": 0}})) == {"p4": 7.0, "p5": 0.0}
+
+def test_fast_path_matches_tolerant_mapping(monkeypatch):
+    items = [
+        {"id": "u1", "name": "A", "min_stock": 10, "current_stock": 3},
+        {"productID": 7, "Наименование": "Б", "МинимальныйЗапас": "5", "Остаток": "x", "stock": 1.5},
+        {"ID": "u3", "name": "C", "min": "bad", "deficit": "4", "Артикул": 123, "extra": {"a": 1}},
+        {"name": None, "current_stock": True, "max_stock": 20},
+    ]
+    raw = json.dumps(items, ensure_ascii=False)
+    monkeypatch.setenv("ONEC_NORMALIZE_FAST_PATH", "false")
+    tolerant = normalize_deficit_payload(raw)
+    monkeypatch.setenv("ONEC_NORMALIZE_FAST_PATH", "true")
+    assert normalize_deficit_payload(raw) == tolerant
+    assert normalize_deficit_payload(raw) == tolerant  # cached layouts
+
+def test_unwrap_keeps_flat_objects_without_copy():
+    from app.integrations.onec_json_normalizer import _unwrap_xdto
+    flat = {"id": "u1", "min_stock": 1}
+    assert _unwrap_xdto(flat) is flat
+    assert _unwrap_xdto({"id": "u1", "ref": {"#value": "x"}}) == {"id": "u1", "ref": "x"}
+
+def test_uuid_scan_priority_and_depth_bound(monkeypatch):
+    from app.integrations.onec_json_normalizer import _first_uuid_from_value
+    u1, u2 = "c7e8e58f-49b7-11e6-8a7c-0025903e6d16", "987fcdeb-51d3-42b4-a567-426614174001"
+    # Priority keys win over earlier plain values, nested refs are found depth-first
+    assert _first_uuid_from_value({"comment": u2, "Номенклатура": {"ref": u1}}) == u1
+    assert _first_uuid_from_value([{"a": [1, None, {"b": f"ref {u2}"}]}, u1]) == u2
+    deep = u1
+    for _ in range(12):
+        deep = {"x": deep}
+    monkeypatch.setenv("ONEC_SURROGATE_ID_SCHEME", "blake2b")
+    assert _first_uuid_from_value(deep) is None
+    assert _first_uuid_from_value(deep, max_depth=16) == u1
+
+def test_legacy_scheme_keeps_unbounded_uuid_scan(monkeypatch):
+    u1 = "c7e8e58f-49b7-11e6-8a7c-0025903e6d16"
+    deep = {"ref": u1}
+    for _ in range(12):
+        deep = {"Номенклатура": deep}
+    raw = json.dumps([{"name": "X", "min_stock": 5, "current_stock": 1, "extra": deep}], ensure_ascii=False)
+    monkeypatch.delenv("ONEC_SURROGATE_ID_SCHEME", raising=False)
+    assert normalize_deficit_payload(raw)[0]["id"] == u1
+    monkeypatch.setenv("ONEC_SURROGATE_ID_SCHEME", "blake2b")
+    assert normalize_deficit_payload(raw)[0]["id"].startswith("SURR-")
+
+def test_surrogate_id_schemes(monkeypatch):
+    from app.integrations.onec_json_normalizer import _derive_surrogate_id
+    item = {"name": "X", "min_stock": 5, "current_stock": 1}
+    monkeypatch.delenv("ONEC_SURROGATE_ID_SCHEME", raising=False)
+    assert _derive_surrogate_id(item) == "SURR-7ebd788eac0a"  # legacy ids stay as they were
+    monkeypatch.setenv("ONEC_SURROGATE_ID_SCHEME", "blake2b")
+    sid = _derive_surrogate_id(item)
+    assert sid.startswith("SURR-") and len(sid) == len("SURR-7ebd788eac0a") and sid != "SURR-7ebd788eac0a"
+    # Identifying fields only: the id does not change with stock numbers
+    assert _derive_surrogate_id({**item, "current_stock": 4}) == sid
+    assert _derive_surrogate_id({"name": "Y", "min_stock": 5}) != sid
+
+def test_benchmark_corpus_shapes_normalize_identically():
+    from tests.benchmarks.onec_corpus import DEFICIT_SHAPES, STOCK_SHAPES, deficit_payload, stock_payloads
+    expected = normalize_deficit_payload(deficit_payload("plain", 200))
+    assert len(expected) == 200
+    for shape in DEFICIT_SHAPES:
+        assert normalize_deficit_payload(deficit_payload(shape, 200)) == expected, shape
+    stocks = [normalize_stock(t) for t in stock_payloads("plain", 50)]
+    for shape in STOCK_SHAPES:
+        assert [normalize_stock(t) for t in stock_payloads(shape, 50)] == stocks, shape
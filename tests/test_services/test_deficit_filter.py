@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.integrations.onec_deficit_batch import DeficitBatch
+from app.services import deficit_filter
+from app.services.deficit_filter import REJECTION_REASONS, filter_deficit
+from app.services.replenishment_service import ReplenishmentService
+
+
+ITEMS = [
+    {"id": "p1", "name": "A", "min_stock": 5, "current_stock": 1, "deficit": 4},
+    {"id": 42, "name": "B", "min_stock": 5, "current_stock": 1, "deficit": 4},
+    {"id": "p3", "name": "C", "min_stock": 5, "current_stock": 1, "deficit": "4"},
+    {"id": "p4", "name": "D", "min_stock": 5, "current_stock": 5, "deficit": 0.5},
+    {"id": "p5", "name": "", "min_stock": 5, "current_stock": 1, "deficit": 4},
+    {"id": "p6", "name": "F", "current_stock": 1, "deficit": 4},
+    {"id": "p7", "name": "G", "min_stock": 5, "deficit": 4},
+    {"id": "", "deficit": None},
+    {"id": "p9", "name": "I", "min_stock": 9, "current_stock": 0, "deficit": 9.0},
+]
+
+
+def _reference(items, min_deficit):
+    """Прежний построчный фильтр из ReplenishmentService."""
+    kept, rejections = [], []
+    for idx, it in enumerate(items):
+        reason = None
+        pid, deficit = it.get("id"), it.get("deficit")
+        if not pid or not isinstance(pid, str):
+            reason = "missing_or_non_string_id"
+        elif not isinstance(deficit, (int, float)):
+            reason = "deficit_not_number"
+        elif deficit < min_deficit:
+            reason = "deficit_below_threshold"
+        elif not it.get("name"):
+            reason = "missing_name"
+        elif "min_stock" not in it:
+            reason = "missing_min_stock"
+        elif "current_stock" not in it:
+            reason = "missing_current_stock"
+        if reason:
+            rejections.append({"idx": idx, "id": pid, "reason": reason})
+        else:
+            kept.append(idx)
+    return kept, rejections
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(deficit_filter, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("min_deficit", [1, 5])
+def test_filter_matches_row_by_row_rules(engine, min_deficit):
+    kept, rejections = _reference(ITEMS, min_deficit)
+    result = filter_deficit(ITEMS, min_deficit)
+
+    assert result.kept == kept
+    assert result.rejections_sample() == rejections[:20]
+    assert result.rejected == len(rejections)
+    assert sum(result.histogram.values()) == len(rejections)
+    assert set(result.histogram) <= set(REJECTION_REASONS)
+
+
+def test_filter_on_deficit_batch(engine):
+    batch = DeficitBatch.from_items([
+        {"id": "p1", "name": "A", "min_stock": 5.0, "current_stock": 1.0, "deficit": 4.0},
+        {"id": "p2", "name": "B", "current_stock": 1.0, "deficit": 4.0},
+        {"id": "p3", "name": "C", "min_stock": 5.0, "current_stock": 4.5, "deficit": 0.5},
+    ])
+    result = filter_deficit(batch, 1)
+
+    assert result.kept == [0]
+    assert result.histogram == {"missing_min_stock": 1, "deficit_below_threshold": 1}
+
+
+@pytest.mark.asyncio
+async def test_service_filter_summary_keeps_log_semantics(monkeypatch):
+    """filter_summary: прежние поля, rejections_sample и полная гистограмма причин."""
+    monkeypatch.setattr("app.services.replenishment_service.settings.MIN_DEFICIT", 1)
+    with patch('app.services.replenishment_service.OneSApiClient') as mock_onec, \
+         patch('app.services.replenishment_service.MoySkladApiClient') as mock_ms, \
+         patch('app.services.replenishment_service.log_event', new=AsyncMock()) as log_event:
+        mock_onec.return_value = AsyncMock()
+        mock_ms.return_value = AsyncMock()
+        service = ReplenishmentService(session=AsyncMock())
+        service.one_s_client.get_deficit_products.return_value = ITEMS
+
+        kept = await service._fetch_and_filter_deficit("wh-1")
+
+    expected_kept, expected_rejections = _reference(ITEMS, 1)
+    assert kept == [ITEMS[i] for i in expected_kept]
+    summary = next(c.kwargs["details"] for c in log_event.await_args_list
+                   if c.kwargs["step"] == "replenishment.filter_summary")
+    assert summary["total"] == len(ITEMS)
+    assert summary["kept"] == len(expected_kept)
+    assert summary["rejected"] == len(expected_rejections)
+    assert summary["rejections_sample"] == expected_rejections
+    assert summary["rejections_by_reason"]["missing_or_non_string_id"] == 2
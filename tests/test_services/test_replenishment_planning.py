@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.replenishment_service import ReplenishmentService
+from app.services.stock_snapshot import DonorStockSnapshot, ReservationLedger
+
+
+BESTUZHEVYKH = ReplenishmentService.DONOR_WAREHOUSES["Бестужевых"]
+SVAO = ReplenishmentService.DONOR_WAREHOUSES["СВАО Контейнер"]
+
+
+@pytest.fixture
+def service():
+    with patch('app.services.replenishment_service.OneSApiClient') as mock_onec, \
+         patch('app.services.replenishment_service.MoySkladApiClient') as mock_ms, \
+         patch('app.services.replenishment_service.log_event', new=AsyncMock()):
+        mock_onec.return_value = AsyncMock()
+        mock_ms.return_value = AsyncMock()
+        svc = ReplenishmentService(session=AsyncMock())
+        svc._enqueue_transfer_order = AsyncMock()
+        svc._enqueue_moysklad_order = AsyncMock()
+        yield svc
+
+
+@pytest.mark.asyncio
+async def test_plan_uses_bulk_stock_and_donor_priority(service):
+    """Остатки доноров запрашиваются пакетом; Бестужевых приоритетнее СВАО Контейнер."""
+    stocks = {
+        BESTUZHEVYKH: {"p1": 10.0, "p2": 1.0, "p3": 0.0},
+        SVAO: {"p1": 10.0, "p2": 5.0, "p3": 0.0},
+    }
+    service.one_s_client.get_stocks_bulk.side_effect = lambda wh, ids, semaphore=None: stocks[wh]
+
+    items = [{"id": "p1", "deficit": 3}, {"id": "p2", "deficit": 3}, {"id": "p3", "deficit": 3}]
+    await service._plan_transfers_or_orders("target", items)
+
+    assert service.one_s_client.get_stocks_bulk.await_count == 2
+    service.one_s_client.get_stock_for_product.assert_not_called()
+
+    transfers = [c.args for c in service._enqueue_transfer_order.await_args_list]
+    assert transfers == [
+        ("target", "p1", [("Бестужевых", BESTUZHEVYKH)], 3.0),
+        ("target", "p2", [("СВАО Контейнер", SVAO)], 3.0),
+    ]
+    service._enqueue_moysklad_order.assert_awaited_once_with("p3", 3.0)
+
+
+@pytest.mark.asyncio
+async def test_donors_probed_concurrently_and_result_deterministic(service, monkeypatch):
+    """Склады опрашиваются параллельно, но приоритет не зависит от порядка ответов."""
+    monkeypatch.setattr("app.services.replenishment_service.settings.REPLENISH_CONCURRENCY", 4)
+    in_flight = 0
+    peak = 0
+
+    async def get_stocks_bulk(wh, ids, semaphore=None):
+        nonlocal in_flight, peak
+        async with semaphore:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            # Приоритетный склад отвечает последним
+            await asyncio.sleep(0.02 if wh == BESTUZHEVYKH else 0)
+            in_flight -= 1
+        return {pid: 10.0 for pid in ids}
+
+    service.one_s_client.get_stocks_bulk.side_effect = get_stocks_bulk
+
+    await service._plan_transfers_or_orders("target", [{"id": "p1", "deficit": 2}])
+
+    assert peak == 2
+    service._enqueue_transfer_order.assert_awaited_once_with(
+        "target", "p1", [("Бестужевых", BESTUZHEVYKH)], 2.0
+    )
+
+
+@pytest.mark.asyncio
+async def test_plan_uses_run_snapshot_without_per_item_calls(service):
+    """Полный снимок доноров: планирование — локальный поиск, без запросов к 1С."""
+    snapshots = {BESTUZHEVYKH: {"p1": 1.0}, SVAO: {"p1": 4.0, "p2": 8.0}}
+    service.one_s_client.get_warehouse_stock.side_effect = lambda wh: snapshots[wh]
+
+    service._donor_snapshot = await service._load_donor_snapshot()
+    items = [{"id": "p1", "deficit": 3}, {"id": "p2", "deficit": 3}, {"id": "p9", "deficit": 1}]
+    await service._plan_transfers_or_orders("target", items)
+
+    assert service.one_s_client.get_warehouse_stock.await_count == 2
+    service.one_s_client.get_stocks_bulk.assert_not_called()
+    service.one_s_client.get_stock_for_product.assert_not_called()
+    assert [c.args[1] for c in service._enqueue_transfer_order.await_args_list] == ["p1", "p2"]
+    service._enqueue_moysklad_order.assert_awaited_once_with("p9", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_falls_back_to_bulk_for_missing_warehouse(service):
+    """Склад без выгрузки полного остатка дозапрашивается пакетом по списку дефицита."""
+    service.one_s_client.get_warehouse_stock.side_effect = (
+        lambda wh: {"p1": 0.0} if wh == BESTUZHEVYKH else None
+    )
+    service.one_s_client.get_stocks_bulk.side_effect = lambda wh, ids, semaphore=None: {"p1": 5.0}
+
+    service._donor_snapshot = await service._load_donor_snapshot()
+    assert service._donor_snapshot.missing() == [("СВАО Контейнер", SVAO)]
+
+    await service._plan_transfers_or_orders("target", [{"id": "p1", "deficit": 2}])
+
+    assert [c.args[0] for c in service.one_s_client.get_stocks_bulk.await_args_list] == [SVAO]
+    service._enqueue_transfer_order.assert_awaited_once_with(
+        "target", "p1", [("СВАО Контейнер", SVAO)], 2.0
+    )
+
+
+def test_donor_snapshot_index_semantics():
+    snapshot = DonorStockSnapshot(ReplenishmentService.DONOR_WAREHOUSES)
+    snapshot.load("Бестужевых", {"p1": 2}, complete=True)
+    snapshot.load("СВАО Контейнер", {"p2": 3})
+
+    assert snapshot.stock("p1", "Бестужевых") == 2.0
+    assert snapshot.stock("p2", "Бестужевых") == 0.0  # полный снимок: нет в выгрузке — нет на складе
+    assert snapshot.stock("p2", "СВАО Контейнер") == 3.0
+    assert snapshot.stock("p1", "СВАО Контейнер") is None  # частичная загрузка: неизвестно
+    assert len(snapshot) == 2
+
+
+@pytest.mark.asyncio
+async def test_ledger_changes_donor_choice_for_repeated_product(service):
+    """Товар, встречающийся в дефиците несколько раз, не получает одну единицу донора дважды."""
+    service._fetch_and_filter_deficit = AsyncMock(return_value=[
+        {"id": "p1", "deficit": 6}, {"id": "p1", "deficit": 6}, {"id": "p1", "deficit": 6},
+        {"id": "p2", "deficit": 3},
+    ])
+    service._load_pending_product_ids = AsyncMock(return_value=set())
+    snapshots = {BESTUZHEVYKH: {"p1": 10.0, "p2": 10.0}, SVAO: {"p1": 10.0, "p2": 10.0}}
+    service.one_s_client.get_warehouse_stock.side_effect = lambda wh: snapshots[wh]
+    del service._enqueue_transfer_order  # реальный метод резервирует количество
+    service._write_transfer_batch = AsyncMock()
+
+    result = await service.run_internal_replenishment()
+
+    assert result["status"] == "success"
+    batch = service._write_transfer_batch.await_args.args[0]
+    # Без резерва все три позиции p1 ушли бы с Бестужевых (остаток 10 >= 6)
+    assert [(e["product"]["id"], e["source_warehouse_name"]) for e in batch] == [
+        ("p1", "Бестужевых"), ("p1", "СВАО Контейнер"), ("p2", "Бестужевых"),
+    ]
+    service._enqueue_moysklad_order.assert_awaited_once_with("p1", 6.0)
+
+
+def test_ledger_reduces_available_stock():
+    ledger = ReservationLedger()
+    ledger.reserve(SVAO, "p1", 1.5)
+    ledger.reserve(SVAO, "p1", 1)
+    assert ledger.available(10.0, SVAO, "p1") == 7.5
+    assert ledger.available(10.0, BESTUZHEVYKH, "p1") == 10.0
+    assert len(ledger) == 1 and ledger.total() == 2.5
+
+
+@pytest.mark.asyncio
+async def test_pending_products_loaded_with_single_query(service):
+    """Товары в пути загружаются одним запросом на запуск."""
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = ["p1", "p2"]
+    service.session = MagicMock()
+    service.session.begin.return_value = AsyncMock()
+    service.session.execute = AsyncMock(return_value=result)
+
+    pending_ids = await service._load_pending_product_ids()
+
+    service.session.execute.assert_awaited_once()
+    assert pending_ids == {"p1", "p2"}
+
+
+@pytest.mark.asyncio
+async def test_run_skips_items_already_in_transit(service):
+    """Товары с активным перемещением отсекаются до опроса доноров."""
+    service._fetch_and_filter_deficit = AsyncMock(return_value=[
+        {"id": "p1", "deficit": 2}, {"id": "p2", "deficit": 2},
+    ])
+    service._load_pending_product_ids = AsyncMock(return_value={"p1"})
+    service.one_s_client.get_warehouse_stock.side_effect = lambda wh: {"p2": 5.0}
+
+    result = await service.run_internal_replenishment()
+
+    assert result["status"] == "success"
+    assert [c.args[1] for c in service._enqueue_transfer_order.await_args_list] == ["p2"]
+    service._enqueue_moysklad_order.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_writes_multi_row_batches(service, monkeypatch):
+    """Перемещения и заказы пишутся пачками по REPLENISH_ENQUEUE_BATCH_SIZE с клиентскими ID."""
+    monkeypatch.setattr("app.services.replenishment_service.settings.REPLENISH_ENQUEUE_BATCH_SIZE", 2)
+    service.session = MagicMock()
+    service.session.begin.return_value = AsyncMock()
+    service.session.execute = AsyncMock()
+    service.one_s_client.get_moysklad_id_for_product.side_effect = lambda pid: pid
+    del service._enqueue_transfer_order
+    del service._enqueue_moysklad_order
+
+    snapshot = service._donor_snapshot = DonorStockSnapshot(ReplenishmentService.DONOR_WAREHOUSES)
+    snapshot.load("Бестужевых", {f"p{i}": 100.0 for i in range(3)}, complete=True)
+    snapshot.load("СВАО Контейнер", {}, complete=True)
+
+    items = [{"id": f"p{i}", "deficit": 1} for i in range(3)] + [{"id": "x1", "deficit": 4}]
+    await service._plan_transfers_or_orders("target", items)
+
+    calls = service.session.execute.await_args_list
+    tables = [(c.args[0].table.name, len(c.args[1])) for c in calls]
+    assert tables == [
+        ("pending_transfers", 2), ("outbox_events", 2),
+        ("pending_transfers", 1), ("outbox_events", 1),
+        ("outbox_events", 1),
+    ]
+    transfers, events = calls[0].args[1], calls[1].args[1]
+    assert [e["related_entity_id"] for e in events] == [str(t["id"]) for t in transfers]
+    assert events[0]["payload"]["products"] == [{"productID": "p0", "quantity": 1.0}]
+    assert calls[4].args[1][0]["event_type"] == "CREATE_MS_CUSTOMER_ORDER"
+    assert service.session.begin.call_count == 3